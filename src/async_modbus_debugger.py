@@ -0,0 +1,261 @@
+#大牛大巨婴
+import asyncio
+import logging
+from pymodbus.client import AsyncModbusTcpClient, AsyncModbusSerialClient
+from pymodbus.exceptions import ModbusIOException
+from pymodbus.pdu import ExceptionResponse
+from modbus_debugger import ModbusDebugger, load_pymodbus
+from packet_capture import LINK_TYPES, LINK_UNKNOWN
+
+
+class ProtocolWrapper:
+    """ Hooks an asyncio Modbus protocol to intercept send/data_received calls. """
+    def __init__(self, protocol, debugger):
+        self._protocol = protocol
+        self._debugger = debugger
+        self._send = protocol.send
+        self._data_received = protocol.data_received
+        # asyncio 的 transport 每次都通过实例属性查找回调，所以直接替换实例上的方法即可
+        protocol.send = self.send
+        protocol.data_received = self.data_received
+
+    def send(self, data, addr=None):
+        self._debugger.last_sent_packet += data
+        self._debugger._on_send()
+        return self._send(data, addr)
+
+    def data_received(self, data):
+        self._debugger.last_received_packet += data
+        self._debugger._on_receive(data)
+        return self._data_received(data)
+
+
+class AsyncModbusDebugger(ModbusDebugger):
+    """ ModbusDebugger 的 asyncio 版本，读写接口相同但都是协程，一个事件循环可以同时服务多台设备。 """
+    def __init__(self, config):
+        super().__init__(config)
+        self.logger = logging.getLogger(__name__)
+        # 延迟统计沿用 ModbusDebugger._record_latency，它用到的异常类型在这里加载
+        load_pymodbus()
+        # 同一台设备上的请求必须串行，否则抓到的报文会混在一起
+        self._lock = asyncio.Lock()
+
+    def _wrap_client_socket(self):
+        """ Wraps the client's protocol to intercept packets. """
+        if self.client:
+            ProtocolWrapper(self.client.ctx, self)
+
+    async def _reconnect(self):
+        self.logger.info("尝试重新连接 Modbus 设备...")
+        self.disconnect(clear_params=False)
+        await asyncio.sleep(1)  # 只挂起当前设备，不影响事件循环里的其他设备
+
+        if not self._connection_type:
+            self.logger.warning("没有可用的连接参数，无法重连。")
+            return False
+
+        if self._connection_type == "tcp":
+            return await self.connect_tcp(
+                self._connection_params['host'],
+                self._connection_params['port'],
+                self._slave_id
+            )
+        elif self._connection_type == "rtu":
+            return await self.connect_rtu(
+                self._connection_params['port'],
+                self._connection_params['baud_rate'],
+                self._connection_params['data_bits'],
+                self._connection_params['stop_bits'],
+                self._connection_params['parity'],
+                self._slave_id
+            )
+        return False
+
+    async def connect_tcp(self, host, port, slave_id):
+        try:
+            # reconnect_delay=0: 由 _reconnect 负责重连，避免和 pymodbus 的自动重连抢连接
+            self.client = AsyncModbusTcpClient(host=host, port=port, reconnect_delay=0)
+            self._slave_id = slave_id
+            self._connection_type = "tcp"
+            self._connection_params = {'host': host, 'port': port}
+            self._wrap_client_socket()
+            return await self.client.connect()
+        except Exception as e:
+            self.logger.error(f"TCP 连接失败: {str(e)}")
+            return False
+
+    async def connect_rtu(self, port, baud_rate, data_bits, stop_bits, parity, slave_id):
+        try:
+            self.client = AsyncModbusSerialClient(
+                port=port,
+                baudrate=baud_rate,
+                bytesize=data_bits,
+                parity=parity[0].upper(),
+                stopbits=stop_bits,
+                reconnect_delay=0
+            )
+            self._slave_id = slave_id
+            self._connection_type = "rtu"
+            self._connection_params = {
+                'port': port,
+                'baud_rate': baud_rate,
+                'data_bits': data_bits,
+                'stop_bits': stop_bits,
+                'parity': parity
+            }
+            self._wrap_client_socket()
+            return await self.client.connect()
+        except Exception as e:
+            self.logger.error(f"RTU 连接失败: {str(e)}")
+            return False
+
+    def disconnect(self, clear_params=True):
+        if self.client:
+            self.client.close()
+        return super().disconnect(clear_params)
+
+    async def _execute(self, call):
+        """ 执行一次请求并返回 (结果, 发送报文, 接收报文)，报文为原始 bytes。 """
+        async with self._lock:
+            self.last_sent_packet = b''
+            self.last_received_packet = b''
+            self._sends = 0
+            self._sent_ns = self._received_ns = None
+            result = None
+            try:
+                result = await call()
+            except ModbusIOException as e:
+                result = e
+            finally:
+                if self.capture:
+                    self.capture.write(self.last_sent_packet, self.last_received_packet,
+                                       LINK_TYPES.get(self._connection_type, LINK_UNKNOWN))
+                self._record_latency(result)
+            return result, self.last_sent_packet, self.last_received_packet
+
+    async def write_coils(self, address, values, slave_id=None):
+        if not self.client:
+            self.logger.error("未连接到设备")
+            return False, "未连接", (b'', b'')
+        for attempt in range(2): # Allow one retry
+            try:
+                result, sent, received = await self._execute(
+                    lambda: self.client.write_coils(address, values, slave=slave_id or self._slave_id))
+                if isinstance(result, (ModbusIOException, ExceptionResponse)):
+                    self.logger.error(f"写入多个线圈失败: {result}")
+                    # 异常响应说明链路正常，只有 I/O 失败才重连后重发
+                    if isinstance(result, ModbusIOException) and attempt == 0 and await self._reconnect():
+                        continue # Retry after successful reconnect
+                    return False, str(result), (sent, received)
+                return True, "写入成功", (sent, received)
+            except Exception as e:
+                self.logger.error(f"写入多个线圈时发生错误: {str(e)}")
+                return False, str(e), (self.last_sent_packet, self.last_received_packet)
+
+    async def write_registers(self, address, values, slave_id=None, data_type='UINT16', byte_order='big', word_order='big'):
+        if not self.client:
+            self.logger.error("未连接到设备")
+            return False, "未连接", (b'', b'')
+
+        registers_to_write = self.build_registers(values, data_type, byte_order, word_order)
+
+        for attempt in range(2): # Allow one retry
+            try:
+                result, sent, received = await self._execute(
+                    lambda: self.client.write_registers(address, registers_to_write, slave=slave_id or self._slave_id))
+                if isinstance(result, (ExceptionResponse, ModbusIOException)):
+                    self.logger.error(f"写入寄存器失败: {result}")
+                    if isinstance(result, ModbusIOException) and attempt == 0 and await self._reconnect():
+                        continue # Retry after successful reconnect
+                    return False, str(result), (sent, received)
+                return True, "写入成功", (sent, received)
+            except Exception as e:
+                self.logger.error(f"写入寄存器时发生错误: {str(e)}")
+                return False, str(e), (self.last_sent_packet, self.last_received_packet)
+
+    async def _read_registers(self, address, count, slave_id, data_type, read_name, byte_order, word_order):
+        if not self.client: return None, b'', b''
+        for attempt in range(2): # Allow one retry
+            try:
+                read_func = getattr(self.client, read_name)
+                result, sent, received = await self._execute(
+                    lambda: read_func(address=address, count=count, slave=slave_id or self._slave_id))
+                if isinstance(result, (ModbusIOException, ExceptionResponse)):
+                    self.logger.error(f"读取寄存器失败: {result}")
+                    if isinstance(result, ModbusIOException) and attempt == 0 and await self._reconnect():
+                        continue # Retry after successful reconnect
+                    return None, sent, received
+
+                processed_result = self.process_data(result.registers, data_type, byte_order, word_order)
+                return processed_result, sent, received
+            except Exception as e:
+                self.logger.error(f"读取寄存器时发生错误: {str(e)}")
+                return None, self.last_sent_packet, self.last_received_packet
+
+    async def _read_bits(self, address, count, slave_id, read_name):
+        if not self.client: return None, b'', b''
+        try:
+            read_func = getattr(self.client, read_name)
+            result, sent, received = await self._execute(
+                lambda: read_func(address=address, count=count, slave=slave_id or self._slave_id))
+            if isinstance(result, (ModbusIOException, ExceptionResponse)):
+                return None, sent, received
+            return result.bits[:count], sent, received
+        except Exception as e:
+            self.logger.error(f"读取位时发生错误: {str(e)}")
+            return None, self.last_sent_packet, self.last_received_packet
+
+    async def read_holding_registers(self, address, count, slave_id=None, data_type='UINT16', byte_order='big', word_order='big'):
+        return await self._read_registers(address, count, slave_id, data_type, 'read_holding_registers', byte_order, word_order)
+
+    async def read_input_registers(self, address, count, slave_id=None, data_type='UINT16', byte_order='big', word_order='big'):
+        return await self._read_registers(address, count, slave_id, data_type, 'read_input_registers', byte_order, word_order)
+
+    async def read_coils(self, address, count, slave_id=None):
+        return await self._read_bits(address, count, slave_id, 'read_coils')
+
+    async def read_discrete_inputs(self, address, count, slave_id=None):
+        return await self._read_bits(address, count, slave_id, 'read_discrete_inputs')
+
+    async def report_slave_id(self, slave_id=None):
+        if not self.client:
+            return None, b'', b''
+        try:
+            result, sent, received_raw = await self._execute(
+                lambda: self.client.report_slave_id(slave=slave_id or self._slave_id))
+            if isinstance(result, (ModbusIOException, ExceptionResponse)):
+                self.logger.error(f"FC11H Modbus error: {result}")
+                return None, sent, received_raw
+            info_list = self.parse_report_slave_id(received_raw)
+            return info_list, sent, received_raw
+        except Exception as e:
+            self.logger.error(f"FC11H (report_slave_id) operation failed: {str(e)}")
+            return None, self.last_sent_packet, self.last_received_packet
+
+    async def read_write_multiple_registers(self, read_address, read_count, write_address, write_registers, slave_id=None, data_type='UINT16', byte_order='big', word_order='big'):
+        if not self.client:
+            return None, b'', b''
+        try:
+            result, sent, received = await self._execute(
+                lambda: self.client.readwrite_registers(
+                    read_address=read_address,
+                    read_count=read_count,
+                    write_address=write_address,
+                    values=write_registers,
+                    slave=slave_id or self._slave_id
+                ))
+            if isinstance(result, (ModbusIOException, ExceptionResponse)):
+                return None, sent, received
+            processed_result = self.process_data(result.registers, data_type, byte_order, word_order)
+            return processed_result, sent, received
+        except Exception as e:
+            self.logger.error(f"FC23 (read_write_multiple_registers) 操作时发生错误: {str(e)}")
+            return None, self.last_sent_packet, self.last_received_packet
+
+
+async def poll_devices(debuggers, address, count, data_type='UINT16', byte_order='big', word_order='big'):
+    """ 在同一个事件循环里并发读取多台设备的保持寄存器，返回值顺序与 debuggers 一致。 """
+    return await asyncio.gather(*(
+        debugger.read_holding_registers(address, count, None, data_type, byte_order, word_order)
+        for debugger in debuggers
+    ))
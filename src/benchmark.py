@@ -0,0 +1,193 @@
+#大牛大巨婴
+# 基准测试: 在本机回环地址上启动 modbus_server.py，测量读写吞吐、延迟和解码耗时
+# 用法: python benchmark.py [--output 结果.json] [--compare 上次结果.json] [--iterations N]
+#       python benchmark.py --host 192.168.1.10 --port 502   测试已有的设备或服务器
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from codec import STRUCT_CODES, RAW_TYPES
+from latency import LatencyHistogram
+from modbus_debugger import ModbusDebugger
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modbus_server.py')
+DECODE_REGISTERS = 120
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, timeout=10.0):
+    """ 在子进程中启动 modbus_server.py，端口可以连接后返回进程 """
+    process = subprocess.Popen([sys.executable, SERVER_SCRIPT, str(port), '127.0.0.1'],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"modbus_server.py 启动失败，退出码 {process.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("等待 modbus_server.py 启动超时")
+
+
+def measure(name, operation, iterations, warmup, values_per_op=1, **info):
+    """ 逐次计时执行 operation，返回一条结果记录 """
+    for _ in range(warmup):
+        operation()
+    histogram = LatencyHistogram()
+    failures = 0
+    started = time.perf_counter_ns()
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        if operation() is False:
+            failures += 1
+        histogram.record(time.perf_counter_ns() - start)
+    elapsed = (time.perf_counter_ns() - started) / 1e9
+    to_us = lambda value: round(value / 1e3, 2)
+    result = dict(
+        name=name,
+        iterations=iterations,
+        failures=failures,
+        ops_per_sec=round(iterations / elapsed, 1),
+        values_per_sec=round(iterations * values_per_op / elapsed, 1),
+        p50_us=to_us(histogram.percentile(50)),
+        p95_us=to_us(histogram.percentile(95)),
+        p99_us=to_us(histogram.percentile(99)),
+        mean_us=to_us(histogram.mean),
+        **info
+    )
+    print(f"{name:<36} {result['ops_per_sec']:>12.1f} ops/s   p50 {result['p50_us']:>9.2f}us   "
+          f"p99 {result['p99_us']:>9.2f}us" + (f"   失败 {failures}" if failures else ""))
+    return result
+
+
+def io_benchmarks(debugger, iterations, warmup):
+    ok = lambda read: read[0] is not None
+    results = []
+    for count in (1, 10, 125):
+        results.append(measure(
+            f"FC03 read {count} registers", lambda: ok(debugger.read_holding_registers(0, count)),
+            iterations, warmup, count, function_code=3, count=count))
+    for count in (1, 10, 123):
+        values = list(range(count))
+        results.append(measure(
+            f"FC16 write {count} registers", lambda: debugger.write_registers(0, values)[0],
+            iterations, warmup, count, function_code=16, count=count))
+    for count in (1, 2000):
+        results.append(measure(
+            f"FC01 read {count} coils", lambda: ok(debugger.read_coils(0, count)),
+            iterations, warmup, count, function_code=1, count=count))
+    for count in (1, 1968):
+        values = [bool(i % 2) for i in range(count)]
+        results.append(measure(
+            f"FC15 write {count} coils", lambda: debugger.write_coils(0, values)[0],
+            iterations, warmup, count, function_code=15, count=count))
+    return results
+
+
+def decode_benchmarks(debugger, iterations, warmup):
+    random.seed(0)
+    registers = [random.randint(0, 0xFFFF) for _ in range(DECODE_REGISTERS)]
+    results = []
+    for data_type in list(STRUCT_CODES) + list(RAW_TYPES):
+        for byte_order, word_order in (('big', 'big'), ('little', 'little')):
+            values = len(debugger.process_data(registers, data_type, byte_order, word_order))
+            results.append(measure(
+                f"decode {data_type} {byte_order}/{word_order}",
+                lambda: debugger.process_data(registers, data_type, byte_order, word_order),
+                iterations, warmup, values, data_type=data_type, byte_order=byte_order,
+                word_order=word_order, count=DECODE_REGISTERS))
+    return results
+
+
+def compare(results, baseline_path):
+    """ 和之前保存的结果对比每秒操作数 """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {result['name']: result for result in json.load(f)['results']}
+    print(f"\n与 {baseline_path} 对比 (ops/s 变化):")
+    for result in results:
+        old = baseline.get(result['name'])
+        if old and old['ops_per_sec']:
+            change = (result['ops_per_sec'] / old['ops_per_sec'] - 1) * 100
+            print(f"{result['name']:<36} {old['ops_per_sec']:>12.1f} -> {result['ops_per_sec']:>12.1f}  {change:+7.1f}%")
+
+
+def metadata(args):
+    try:
+        from pymodbus import __version__ as pymodbus_version
+    except ImportError:
+        pymodbus_version = None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(SERVER_SCRIPT),
+                                capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'pymodbus': pymodbus_version,
+        'platform': platform.platform(),
+        'target': f"{args.host}:{args.port}" if args.host else 'modbus_server.py (loopback)',
+        'iterations': args.iterations,
+        'decode_iterations': args.decode_iterations,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ModbusBaby 基准测试")
+    parser.add_argument('--output', help="结果 JSON 文件，默认 benchmark_<时间>.json")
+    parser.add_argument('--compare', help="与之前的结果 JSON 对比")
+    parser.add_argument('--iterations', type=int, default=2000, help="每个读写用例的请求次数")
+    parser.add_argument('--decode-iterations', type=int, default=20000, help="每个解码用例的次数")
+    parser.add_argument('--warmup', type=int, default=100)
+    parser.add_argument('--host', help="测试已有的服务器，不启动 modbus_server.py")
+    parser.add_argument('--port', type=int, default=502)
+    parser.add_argument('--slave-id', type=int, default=1)
+    parser.add_argument('--skip-io', action='store_true', help="只测解码")
+    args = parser.parse_args(argv)
+
+    # 基准测试不需要抓包，日志目录放到临时目录，避免在当前目录留下文件
+    debugger = ModbusDebugger({'packet_capture': {'enabled': False, 'log_dir': tempfile.gettempdir()}})
+    server = None
+    results = []
+    try:
+        if not args.skip_io:
+            host, port = args.host, args.port
+            if not host:
+                host, port = '127.0.0.1', free_port()
+                server = start_server(port)
+            if not debugger.connect_tcp(host, port, args.slave_id):
+                raise RuntimeError(f"无法连接到 {host}:{port}")
+            results.extend(io_benchmarks(debugger, args.iterations, args.warmup))
+            debugger.disconnect()
+        results.extend(decode_benchmarks(debugger, args.decode_iterations, args.warmup))
+    finally:
+        if server is not None:
+            server.kill()
+            server.wait()
+
+    output = args.output or f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'meta': metadata(args), 'results': results}, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
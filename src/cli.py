@@ -0,0 +1,337 @@
+#大牛大巨婴
+# 无界面命令行: 只用 ModbusDebugger，不导入 PyQt，结果以 CSV/JSON 输出到 stdout，便于脚本和 cron 调用
+# 用法: python cli.py read hr 0 10 --host 192.168.1.10
+#       python cli.py write hr 100 1.5 2.5 --type FLOAT32 --serial /dev/ttyUSB0 --baud 19200
+#       python cli.py poll --tags 点表.csv --interval 5 --format json
+#       python cli.py recipe 配方.csv --host 192.168.1.10
+#       python cli.py scan --start 1 --end 32
+#       python cli.py bus 任务.csv --serial /dev/ttyUSB0 --baud 19200 --mode priority
+import argparse
+import csv
+import json
+import logging
+import sys
+import time
+from datetime import datetime
+
+REGISTER_TYPES = {
+    'hr': 'Holding Register', 'holding': 'Holding Register',
+    'ir': 'Input Register', 'input': 'Input Register',
+    'co': 'Coil', 'coil': 'Coil', 'coils': 'Coil',
+    'di': 'Discrete Input', 'discrete': 'Discrete Input',
+}
+WRITE_TYPES = {'hr': 'Holding Register', 'holding': 'Holding Register', 'co': 'Coil', 'coil': 'Coil', 'coils': 'Coil'}
+DATA_TYPES = ('INT16', 'UINT16', 'INT32', 'UINT32', 'INT64', 'UINT64', 'FLOAT32', 'FLOAT64',
+              'BOOL', 'BYTE', 'ASCII', 'UNIX_TIMESTAMP')
+
+
+def load_config(path=None):
+    """ 与图形界面共用 config.json，只取连接参数的默认值 """
+    if path is None:
+        from utils import resource_path
+        path = resource_path('config.json')
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+class Output:
+    """ 按 --format 把结果行写到 stdout，CSV 每行一条，JSON 整体输出一次，jsonl 每行一个对象 """
+    def __init__(self, fmt, fields, stream=None):
+        self.fmt = fmt
+        self.fields = fields
+        self.stream = stream or sys.stdout
+        self.rows = []
+        if fmt == 'csv':
+            self.writer = csv.writer(self.stream, lineterminator='\n')
+            self.writer.writerow(fields)
+
+    def write(self, *values):
+        if self.fmt == 'csv':
+            self.writer.writerow(' '.join(map(str, value)) if isinstance(value, list) else value for value in values)
+        elif self.fmt == 'jsonl':
+            self.stream.write(json.dumps(dict(zip(self.fields, values)), ensure_ascii=False) + '\n')
+        else:
+            self.rows.append(dict(zip(self.fields, values)))
+            return
+        self.stream.flush()
+
+    def close(self):
+        if self.fmt == 'json':
+            json.dump(self.rows, self.stream, ensure_ascii=False, indent=2)
+            self.stream.write('\n')
+
+
+def connect(args, config):
+    from modbus_debugger import ModbusDebugger
+    capture = {'enabled': bool(args.capture), 'log_dir': args.capture or 'logs'}
+    debugger = ModbusDebugger(dict(config, packet_capture=capture))
+    if args.serial:
+        rtu = config.get('rtu', {})
+        slave_id = args.slave_id or rtu.get('slave_id', 1)
+        connected = debugger.connect_rtu(args.serial, args.baud or rtu.get('baud_rate', 9600),
+                                         args.data_bits or rtu.get('data_bits', 8),
+                                         args.stop_bits or rtu.get('stop_bits', 1),
+                                         args.parity or rtu.get('parity', 'None'), slave_id)
+        target = args.serial
+    else:
+        tcp = config.get('tcp', {})
+        host = args.host or tcp.get('ip') or 'localhost'
+        port = args.port or tcp.get('port', 502)
+        slave_id = args.slave_id or tcp.get('slave_id', 1)
+        connected = debugger.connect_tcp(host, port, slave_id)
+        target = f"{host}:{port}"
+    if not connected:
+        raise ConnectionError(f"无法连接到 {target}")
+    if args.timeout:
+        debugger.set_timeout(args.timeout)
+    return debugger
+
+
+def build_tags(args):
+    """ 把 read/poll 的地址参数转换成点位，交给 TagDatabase 合并成块读取(超过 125 个寄存器会自动分块) """
+    from read_planner import range_tags
+    from tag_database import TagDatabase
+    if args.tags:
+        return TagDatabase.from_file(args.tags)
+    if args.register_type is None or args.address is None:
+        raise ValueError("需要指定寄存器类型和地址，或者用 --tags 指定点表")
+    return TagDatabase(range_tags(REGISTER_TYPES[args.register_type], args.address, args.count, args.data_type,
+                                  args.byte_order, args.word_order))
+
+
+def plain(value):
+    """ 位点位解码为单元素列表，命令行输出时展开 """
+    if isinstance(value, list) and len(value) == 1:
+        return value[0]
+    return value
+
+
+def cmd_read(args, debugger, output):
+    database = build_tags(args)
+    values, _ = database.poll(debugger)
+    failed = 0
+    for tag in database:
+        value = values.get(tag.name)
+        failed += value is None
+        output.write(tag.name if args.tags else tag.address, plain(value))
+    return 1 if failed else 0
+
+
+def cmd_poll(args, debugger, output):
+    if args.groups:
+        return poll_groups(args, debugger, output)
+    database = build_tags(args)
+    database.compile()
+    samples = 0
+    failed = 0
+    next_poll = time.monotonic()
+    while not args.samples or samples < args.samples:
+        values, _ = database.poll(debugger)
+        timestamp = datetime.now().isoformat(timespec='milliseconds')
+        for tag in database:
+            value = values.get(tag.name)
+            failed += value is None
+            output.write(timestamp, tag.name, plain(value))
+        samples += 1
+        if args.samples and samples >= args.samples:
+            break
+        # 按固定节拍轮询，请求耗时不会累积成漂移
+        next_poll += args.interval
+        time.sleep(max(0, next_poll - time.monotonic()))
+    return 1 if failed else 0
+
+
+def poll_groups(args, debugger, output):
+    """ 多速率轮询: 每个组按自己的周期读取，同时到期的组在一个总线窗口里合并读取；--samples 限制窗口数 """
+    from poll_scheduler import PollScheduler, load_poll_groups
+    scheduler = PollScheduler(load_poll_groups(args.groups))
+    windows = 0
+    failed = 0
+    try:
+        while not args.samples or windows < args.samples:
+            time.sleep(max(0, scheduler.next_due() - time.monotonic()))
+            values, _ = scheduler.poll(debugger)
+            if not values:
+                continue
+            timestamp = datetime.now().isoformat(timespec='milliseconds')
+            for name, value in values.items():
+                failed += value is None
+                output.write(timestamp, name, plain(value))
+            windows += 1
+    finally:
+        for line in scheduler.summary():
+            logging.getLogger(__name__).info(line)
+    return 1 if failed else 0
+
+
+def cmd_write(args, debugger, output):
+    from write_queue import parse_write_value
+    register_type = WRITE_TYPES[args.register_type]
+    values = [parse_write_value(value, register_type, args.data_type) for value in args.values]
+    if register_type == 'Coil':
+        success, message, _ = debugger.write_coils(args.address, values)
+    else:
+        success, message, _ = debugger.write_registers(args.address, values, data_type=args.data_type,
+                                                        byte_order=args.byte_order, word_order=args.word_order)
+    output.write(args.address, len(values), success, message)
+    return 0 if success else 1
+
+
+def cmd_recipe(args, debugger, output):
+    """ 配方下载: 相邻地址合并成尽量少的 FC16/FC15 请求 """
+    from write_queue import WriteQueue
+    queue = WriteQueue()
+    queue.load_recipe(args.recipe)
+    for block, success, message, _ in queue.flush(debugger):
+        output.write(block.slave_id or debugger._slave_id, block.function_code, block.start, block.count,
+                     success, message)
+    return 1 if len(queue) else 0
+
+
+def cmd_scan(args, debugger, output):
+    from slave_scanner import SlaveScanner
+    scanner = SlaveScanner(debugger, probe=args.probe, address=args.probe_address, concurrency=args.concurrency)
+    for result in scanner.scan(range(args.start, args.end + 1)):
+        output.write(result.slave_id, round(result.latency * 1000, 3), result.exception_code)
+    return 0
+
+
+def cmd_bus(args, debugger, output):
+    """ RTU 总线调度: 在一条串口总线上轮流读取多个从站，帧间隔和超时按串口参数计算 """
+    from rtu_bus import RtuBusScheduler, load_bus_jobs
+    scheduler = RtuBusScheduler(debugger, load_bus_jobs(args.jobs), args.mode)
+    failed = 0
+
+    def write(job, values, sent, received):
+        nonlocal failed
+        failed += values is None
+        output.write(datetime.now().isoformat(timespec='milliseconds'), job.slave_id, job.name, values)
+
+    started = time.perf_counter()
+    try:
+        if args.cycles:
+            for _ in range(args.cycles):
+                scheduler.run_cycle(write)
+        else:
+            scheduler.run(duration=args.duration or None, callback=write)
+    finally:
+        elapsed = time.perf_counter() - started
+        logging.getLogger(__name__).info(
+            f"总线调度: {scheduler.requests} 个请求，失败 {scheduler.failures} 个，"
+            f"{scheduler.requests / elapsed if elapsed else 0:.1f} 次/秒，理论上限 {scheduler.theoretical_rate():.1f} 次/秒")
+    return 1 if failed else 0
+
+
+def read_fields(args):
+    # 按点表读取时第一列是点位名称，按地址读取时是地址
+    return ['name', 'value'] if args.tags else ['address', 'value']
+
+
+# 命令 -> (函数, 输出列名)，列名也可以是根据参数决定列名的函数
+COMMANDS = {
+    'read': (cmd_read, read_fields),
+    'poll': (cmd_poll, ['timestamp', 'name', 'value']),
+    'write': (cmd_write, ['address', 'count', 'success', 'message']),
+    'recipe': (cmd_recipe, ['slave_id', 'function_code', 'address', 'count', 'success', 'message']),
+    'scan': (cmd_scan, ['slave_id', 'latency_ms', 'exception_code']),
+    'bus': (cmd_bus, ['timestamp', 'slave_id', 'name', 'value']),
+}
+
+
+def build_parser():
+    connection = argparse.ArgumentParser(add_help=False)
+    group = connection.add_argument_group("连接")
+    group.add_argument('--host', help="Modbus TCP 地址，默认取 config.json 的 tcp.ip")
+    group.add_argument('--port', type=int, help="TCP 端口，默认 502")
+    group.add_argument('--serial', metavar='PORT', help="使用 Modbus RTU，例如 /dev/ttyUSB0 或 COM3")
+    group.add_argument('--baud', type=int)
+    group.add_argument('--data-bits', type=int)
+    group.add_argument('--stop-bits', type=int)
+    group.add_argument('--parity', choices=['None', 'Even', 'Odd'])
+    group.add_argument('-s', '--slave-id', type=int)
+    group.add_argument('--timeout', type=float, help="响应超时(秒)")
+    group.add_argument('--config', help="配置文件，默认为程序目录下的 config.json")
+    group.add_argument('--capture', metavar='DIR', help="把收发报文写入 DIR 下的抓包文件")
+    group.add_argument('--format', choices=['csv', 'json', 'jsonl'], default='csv')
+    group.add_argument('-v', '--verbose', action='store_true', help="把调试日志输出到 stderr")
+
+    decoding = argparse.ArgumentParser(add_help=False)
+    group = decoding.add_argument_group("数据类型")
+    group.add_argument('-t', '--type', dest='data_type', type=str.upper, choices=DATA_TYPES, default='UINT16')
+    group.add_argument('--byte-order', choices=['big', 'little'], default='big')
+    group.add_argument('--word-order', choices=['big', 'little'], default='big')
+
+    parser = argparse.ArgumentParser(prog='modbusbaby', description="ModbusBaby 命令行模式")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    read = commands.add_parser('read', parents=[connection, decoding], help="读取一次")
+    read.add_argument('register_type', nargs='?', choices=sorted(REGISTER_TYPES))
+    read.add_argument('address', type=int, nargs='?')
+    read.add_argument('count', type=int, nargs='?', default=1,
+                      help="值的个数；BOOL/BYTE/ASCII 为寄存器个数")
+    read.add_argument('--tags', help="按点表(CSV/JSON)读取，代替地址参数")
+
+    poll = commands.add_parser('poll', parents=[connection, decoding], help="按固定间隔轮询")
+    poll.add_argument('register_type', nargs='?', choices=sorted(REGISTER_TYPES))
+    poll.add_argument('address', type=int, nargs='?')
+    poll.add_argument('count', type=int, nargs='?', default=1)
+    poll.add_argument('--tags', help="按点表(CSV/JSON)轮询，代替地址参数")
+    poll.add_argument('--groups', help="按轮询组文件(CSV/JSON)多速率轮询，每个组使用自己的周期，忽略 --interval")
+    poll.add_argument('-i', '--interval', type=float, default=1.0, help="轮询间隔(秒)")
+    poll.add_argument('-n', '--samples', type=int, default=0, help="轮询次数，0 表示一直轮询")
+
+    write = commands.add_parser('write', parents=[connection, decoding], help="写保持寄存器或线圈")
+    write.add_argument('register_type', choices=sorted(WRITE_TYPES))
+    write.add_argument('address', type=int)
+    write.add_argument('values', nargs='+', help="数值；线圈用 1/0、true/false 或 on/off")
+
+    recipe = commands.add_parser('recipe', parents=[connection], help="下载配方文件中的写入值")
+    recipe.add_argument('recipe', help="CSV/JSON 配方，列名与点表相同，另加\"值\"列")
+
+    scan = commands.add_parser('scan', parents=[connection], help="扫描有应答的从站地址")
+    scan.add_argument('--start', type=int, default=1)
+    scan.add_argument('--end', type=int, default=247)
+    scan.add_argument('--probe', choices=['read', 'report_slave_id'], default='read')
+    scan.add_argument('--probe-address', type=int, default=0, help="read 探测读取的寄存器地址")
+    scan.add_argument('--concurrency', type=int, default=8, help="TCP 网关上的并发连接数")
+
+    bus = commands.add_parser('bus', parents=[connection], help="RTU 总线上按任务文件轮流读取多个从站")
+    bus.add_argument('jobs', help="CSV/JSON 任务文件: 从站地址、寄存器类型、地址、数量、数据类型、优先级")
+    bus.add_argument('--mode', choices=['round_robin', 'priority'], default='round_robin',
+                     help="round_robin 逐个执行；priority 按优先级加权")
+    bus.add_argument('--duration', type=float, default=0, help="运行秒数，0 表示一直运行")
+    bus.add_argument('-n', '--cycles', type=int, default=0, help="执行的轮数，优先于 --duration")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    command, fields = COMMANDS[args.command]
+    if callable(fields):
+        fields = fields(args)
+    debugger = output = None
+    try:
+        config = load_config(args.config)
+        debugger = connect(args, config)
+        output = Output(args.format, fields)
+        return command(args, debugger, output)
+    except KeyboardInterrupt:
+        return 130
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+    finally:
+        if output:
+            output.close()
+        if debugger:
+            debugger.stop_capture()
+            debugger.disconnect()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#大牛大巨婴
+import struct
+from datetime import datetime
+from functools import lru_cache
+
+# 数值类型 -> (struct 格式字符, 每个值占用的寄存器数)
+STRUCT_CODES = {
+    'INT16': ('h', 1),
+    'UINT16': ('H', 1),
+    'INT32': ('i', 2),
+    'UINT32': ('I', 2),
+    'INT64': ('q', 4),
+    'UINT64': ('Q', 4),
+    'FLOAT32': ('f', 2),
+    'FLOAT64': ('d', 4),
+}
+# 这些类型按寄存器/字节直接处理，不走 struct 数值解码
+RAW_TYPES = ('BOOL', 'BYTE', 'ASCII', 'UNIX_TIMESTAMP')
+
+
+@lru_cache(maxsize=256)
+def struct_for(fmt):
+    """ 预编译并缓存 struct 格式，同样长度的块在轮询中反复出现 """
+    return struct.Struct(fmt)
+
+
+class RegisterCodec:
+    """ 某个 (数据类型, 字节序, 字序) 组合的寄存器编解码器。
+
+    字节序 big 为 AB、little 为 BA；字序 little 表示多寄存器数值的低位字在前。
+    数值类型与 pymodbus BinaryPayloadBuilder/Decoder 的约定一致。
+    """
+    def __init__(self, data_type, byte_order='big', word_order='big'):
+        if data_type not in STRUCT_CODES and data_type not in RAW_TYPES:
+            raise ValueError(f"未知的数据类型: {data_type}")
+        if byte_order not in ('big', 'little') or word_order not in ('big', 'little'):
+            raise ValueError(f"无效的字节序/字序: {byte_order}/{word_order}")
+        self.data_type = data_type
+        self.byte_order = byte_order
+        self.word_order = word_order
+        self.code, self.width = STRUCT_CODES.get(data_type, (None, 1))
+        self._register_prefix = '>' if byte_order == 'big' else '<'
+        # 整体反转寄存器顺序 = 每个值内部反转字序 + 值的顺序反转
+        self._reverse_words = word_order == 'little' and self.width > 1
+
+    def pack_registers(self, registers):
+        """ 把寄存器列表按字节序打包成连续的字节串 """
+        return struct_for(f'{self._register_prefix}{len(registers)}H').pack(*registers)
+
+    def unpack_registers(self, raw):
+        if len(raw) % 2:
+            raw += b'\x00'
+        return list(struct_for(f'{self._register_prefix}{len(raw) // 2}H').unpack(raw))
+
+    def decode(self, registers):
+        if not registers:
+            return []
+        if self.code:
+            count = len(registers) // self.width
+            registers = registers[:count * self.width]
+            value_struct = struct_for(f'>{count}{self.code}')
+            if self._reverse_words:
+                values = list(value_struct.unpack(self.pack_registers(registers[::-1])))
+                values.reverse()
+                return values
+            return list(value_struct.unpack(self.pack_registers(registers)))
+
+        if self.data_type == 'BOOL':
+            return [bool(register & (1 << i)) for register in registers for i in range(16)]
+        raw = self.pack_registers(registers)
+        if self.data_type == 'BYTE':
+            return list(raw)
+        elif self.data_type == 'ASCII':
+            return [raw.decode('latin-1').rstrip('\x00')]
+        # UNIX_TIMESTAMP
+        if len(registers) < 2:
+            return ["时间戳数据不足"]
+        timestamp = struct_for('>I').unpack_from(raw)[0]
+        try:
+            return [datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')]
+        except (ValueError, OSError):
+            return [f"无效时间戳: {timestamp}"]
+
+    def encode(self, values):
+        if self.code:
+            if self._reverse_words:
+                registers = self.unpack_registers(struct_for(f'>{len(values)}{self.code}').pack(*values[::-1]))
+                registers.reverse()
+                return registers
+            return self.unpack_registers(struct_for(f'>{len(values)}{self.code}').pack(*values))
+
+        if self.data_type == 'BYTE':
+            return self.unpack_registers(bytes(int(v) & 0xFF for v in values))
+        elif self.data_type == 'ASCII' and isinstance(values, str):
+            # 字符串同样按字节序排列，与 decode 对称: BA 字节序下写入的字符串按 BA 读回来不变。
+            # BinaryPayloadBuilder 写字符串时忽略字节序，这里有意不沿用
+            return self.unpack_registers(values.encode('latin-1'))
+        # BOOL / UNIX_TIMESTAMP / 已经拆分好的 ASCII: 调用方给出的就是寄存器值
+        return [int(v) & 0xFFFF for v in values]
+
+
+@lru_cache(maxsize=None)
+def get_codec(data_type, byte_order='big', word_order='big'):
+    """ 每个 (数据类型, 字节序, 字序) 组合只编译一次编解码器 """
+    return RegisterCodec(data_type, byte_order, word_order)
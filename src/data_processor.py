@@ -1,6 +1,7 @@
 import struct
 import logging
 from enum import Enum
+from codec import get_codec
 
 class DataType(Enum):
     INT16 = 'INT16'
@@ -98,35 +99,21 @@ class DataProcessor:
 
     def value_to_registers(self, value, data_type, byte_order=ByteOrder.BIG_ENDIAN, word_order=WordOrder.BIG_ENDIAN):
         try:
-            if data_type == DataType.FLOAT32.value:
-                return self._float_to_registers(value, '>f', byte_order, word_order)
-            elif data_type == DataType.FLOAT64.value:
-                return self._float_to_registers(value, '>d', byte_order, word_order)
+            if data_type == DataType.BOOL.value:
+                return [1 if value else 0]
             elif data_type in [DataType.INT16.value, DataType.UINT16.value]:
-                return [int(value) & 0xFFFF]
+                value, data_type = int(value) & 0xFFFF, DataType.UINT16.value
             elif data_type in [DataType.INT32.value, DataType.UINT32.value]:
-                return self._int32_to_registers(int(value), byte_order)
-            elif data_type == DataType.BOOL.value:
-                return [1 if value else 0]
-            else:
+                value = int(value)
+            elif data_type not in [DataType.FLOAT32.value, DataType.FLOAT64.value]:
                 raise ValueError(f"不支持的数据类型: {data_type}")
+            # 与 ModbusDebugger.write_registers 共用同一个编码器缓存
+            codec = get_codec(data_type, ByteOrder(byte_order).value, WordOrder(word_order).value)
+            return codec.encode([value])
         except Exception as e:
             self.logger.error(f"转换值到寄存器时发生错误: {e}")
             raise
 
-    def _float_to_registers(self, value, pack_format, byte_order, word_order):
-        pack_format = pack_format if byte_order == ByteOrder.BIG_ENDIAN else pack_format.lower()
-        bytes_value = struct.pack(pack_format, value)
-        
-        if word_order == WordOrder.LITTLE_ENDIAN:
-            bytes_value = b''.join(reversed([bytes_value[i:i+2] for i in range(0, len(bytes_value), 2)]))
-        
-        return [int.from_bytes(bytes_value[i:i+2], byteorder='big') for i in range(0, len(bytes_value), 2)]
-
-    def _int32_to_registers(self, value, byte_order):
-        bytes_value = value.to_bytes(4, byteorder='big' if byte_order == ByteOrder.BIG_ENDIAN else 'little', signed=value < 0)
-        return [int.from_bytes(bytes_value[i:i+2], byteorder='big') for i in range(0, 4, 2)]
-
 
 
 
@@ -0,0 +1,62 @@
+#大牛大巨婴
+import logging
+
+
+class DeadbandFilter:
+    """ 按例外报告: 只放行相对上次报告值超出死区的点位。
+
+    deadband 是绝对死区，deadband_percent 是相对上次报告值的百分比死区，两者取较大者；
+    都为 0 时就是仅变化模式。比较的基准是上次放行的值而不是上次读到的值，
+    缓慢漂移累计超过死区后同样会被报告。
+    """
+    def __init__(self, deadband=0, deadband_percent=0):
+        self.logger = logging.getLogger(__name__)
+        self.deadband = deadband
+        self.deadband_percent = deadband_percent
+        self.passed = 0
+        self.dropped = 0
+        self._limits = {}
+        self._last = {}
+
+    def set_deadband(self, name, deadband=None, deadband_percent=None):
+        """ 单个点位的死区，None 表示使用默认值 """
+        self._limits[name] = (self.deadband if deadband is None else deadband,
+                              self.deadband_percent if deadband_percent is None else deadband_percent)
+
+    def configure(self, tags):
+        for tag in tags:
+            if tag.deadband is not None or tag.deadband_percent is not None:
+                self.set_deadband(tag.name, tag.deadband, tag.deadband_percent)
+
+    def reset(self):
+        """ 清除基准值，下一次所有点位都会被报告 """
+        self._last.clear()
+
+    def changed(self, name, value):
+        missing = object()
+        last = self._last.get(name, missing)
+        if last is not missing:
+            deadband, deadband_percent = self._limits.get(name, (self.deadband, self.deadband_percent))
+            if not self._exceeds(last, value, deadband, deadband_percent):
+                self.dropped += 1
+                return False
+        self._last[name] = value
+        self.passed += 1
+        return True
+
+    def filter(self, values):
+        """ {名称: 值} -> 只包含需要报告的点位 """
+        return {name: value for name, value in values.items() if self.changed(name, value)}
+
+    @classmethod
+    def _exceeds(cls, old, new, deadband, deadband_percent):
+        if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+            return any(cls._exceeds(a, b, deadband, deadband_percent) for a, b in zip(old, new))
+        if (isinstance(old, (int, float)) and isinstance(new, (int, float))
+                and not isinstance(old, bool) and not isinstance(new, bool)):
+            if old != old and new != new:
+                return False  # 两次都是 NaN
+            limit = max(deadband, abs(old) * deadband_percent / 100)
+            if limit > 0:
+                return not abs(new - old) <= limit
+        return new != old
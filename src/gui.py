@@ -3,17 +3,36 @@ import os
 import sys
 import logging
 import datetime
+import threading
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QPushButton, QLineEdit, QTextEdit, QLabel, QSplitter,QGroupBox,
-                             QTableWidgetItem, QSizePolicy,QStackedWidget, QComboBox)
-from PyQt6.QtCore import Qt, QEvent,QSettings,QTimer
-from modbus_debugger import ModbusDebugger
+                             QTableWidget, QTableWidgetItem, QSizePolicy,QStackedWidget, QComboBox,
+                             QFileDialog, QHeaderView, QCheckBox)
+from PyQt6.QtCore import Qt, QSettings,QTimer,QThread,pyqtSignal
+from modbus_debugger import ModbusDebugger, load_pymodbus
 from data_processor import DataProcessor
-from pymodbus.exceptions import ModbusIOException
-from PyQt6.QtGui import  QIcon,QPixmap,QFont, QIntValidator,QColor, QTextCharFormat,QPalette
+from read_planner import registers_per_value
+from tag_database import TagDatabase
+from poll_scheduler import PollScheduler, load_poll_groups, parse_poll_groups
+from write_queue import WriteQueue
+from historian import Historian
+from deadband import DeadbandFilter
+from polling_worker import PollingWorker
+from scan_worker import ScanWorker, SubnetScanWorker, ExploreWorker, SerialPortWorker
+from packet_view import PacketView
+from packet_history import PacketHistory
+from PyQt6.QtGui import  QIcon,QPixmap,QFont, QIntValidator
+from startup_profiler import phase
 from utils import resource_path as get_resource_path # Use centralized resource_path
 
 class ModbusBabyGUI(QMainWindow):
+    poll_requested = pyqtSignal(dict)
+    scan_requested = pyqtSignal(dict)
+    subnet_scan_requested = pyqtSignal(dict)
+    explore_requested = pyqtSignal(dict)
+    serial_ports_requested = pyqtSignal()
+    write_flush_requested = pyqtSignal(dict)
+
     def __init__(self, config=None):
         super().__init__()
         self.setAttribute(Qt.WidgetAttribute.WA_StyleSheetTarget, True)
@@ -32,7 +51,8 @@ class ModbusBabyGUI(QMainWindow):
         self.setWindowTitle("ModbusBaby - by Daniel BigGiantBaby")
         self.setGeometry(100, 100, 866, 600)
         self.set_window_icon()
-        self.create_ui_elements() # Create UI elements once
+        with phase("创建控件"):
+            self.create_ui_elements() # Create UI elements once
         self.restore_window_state()
 
 
@@ -40,12 +60,85 @@ class ModbusBabyGUI(QMainWindow):
         self.word_order = 'big'
         self.data_processor = DataProcessor()
         self.slave_id = self.config.get('default_slave_id', 1)
-        self.sent_packets = []
-        self.received_packets = []
+        # 报文历史有条数和字节数上限，长时间轮询也不会无限增长
+        history_config = self.config.get('packet_history', {})
+        self.packet_history = PacketHistory(
+            max_entries=history_config.get('max_entries', 10000),
+            max_bytes=history_config.get('max_bytes', 16 * 1024 * 1024),
+            spill_file=history_config.get('spill_file')
+        )
+        # 写队列: 配方下载等批量写入合并成尽量少的请求
+        write_config = self.config.get('write_queue', {})
+        self.write_queue = WriteQueue(
+            max_registers=write_config.get('max_registers', 123),
+            max_coils=write_config.get('max_coils', 1968)
+        )
         self.polling_timer = QTimer(self)
         self.polling_timer.timeout.connect(self.poll_register)
+        # 轮询 I/O 在独立线程中执行，定时器只负责调度
+        self.polling_thread = QThread(self)
+        # 历史库默认关闭，打开后轮询结果会写入 data_dir 下的段文件
+        historian_config = self.config.get('historian', {})
+        self.historian = None
+        if historian_config.get('enabled', False):
+            try:
+                self.historian = Historian(
+                    historian_config.get('data_dir', 'history'),
+                    segment_capacity=historian_config.get('segment_capacity', 65536),
+                    rollups=historian_config.get('rollups', (1, 60)),
+                    max_age=historian_config.get('max_age'),
+                    max_bytes=historian_config.get('max_bytes'),
+                    rollup_max_age=historian_config.get('rollup_max_age')
+                )
+            except (OSError, ValueError) as e:
+                self.logger.error(f"打开历史库时发生错误: {str(e)}")
+        self.polling_worker = PollingWorker(self.modbus_debugger, self.historian)
+        self.polling_worker.moveToThread(self.polling_thread)
+        self.poll_requested.connect(self.polling_worker.poll)
+        self.polling_worker.poll_finished.connect(self.on_poll_finished)
+        self.write_flush_requested.connect(self.polling_worker.flush_writes)
+        self.polling_worker.writes_finished.connect(self.on_write_queue_flushed)
+        # 从站扫描也在轮询线程里执行，扫描前会先停止轮询
+        self.scan_worker = ScanWorker(self.modbus_debugger)
+        self.scan_worker.moveToThread(self.polling_thread)
+        self.scan_requested.connect(self.scan_worker.scan)
+        self.scan_worker.scan_progress.connect(self.on_scan_progress)
+        self.scan_worker.scan_finished.connect(self.on_scan_finished)
+        self.subnet_scan_worker = SubnetScanWorker()
+        self.subnet_scan_worker.moveToThread(self.polling_thread)
+        self.subnet_scan_requested.connect(self.subnet_scan_worker.scan)
+        self.subnet_scan_worker.scan_progress.connect(self.on_subnet_scan_progress)
+        self.subnet_scan_worker.scan_finished.connect(self.on_subnet_scan_finished)
+        self.explore_worker = ExploreWorker(self.modbus_debugger)
+        self.explore_worker.moveToThread(self.polling_thread)
+        self.explore_requested.connect(self.explore_worker.explore)
+        self.explore_worker.explore_progress.connect(self.on_explore_progress)
+        self.explore_worker.explore_finished.connect(self.on_explore_finished)
+        # 串口枚举在部分系统上要几百毫秒，放到后台线程，切换到 RTU 时界面不卡顿
+        self.serial_port_worker = SerialPortWorker(self.modbus_debugger)
+        self.serial_port_worker.moveToThread(self.polling_thread)
+        self.serial_ports_requested.connect(self.serial_port_worker.refresh)
+        self.serial_port_worker.ports_found.connect(self.on_serial_ports_found)
+        self.serial_port_default = None
+        self.polling_thread.start()
+        self.poll_in_flight = False
+        self.is_scanning = False
+        self.is_subnet_scanning = False
+        self.is_exploring = False
+        self.register_map = None
+        self.tag_database = None
+        self.poll_scheduler = None
+        self.tag_rows = {}
         self.show_packets = False
-        self.init_ui()
+        with phase("布局界面"):
+            self.init_ui()
+        if self.config.get('poll_groups'):
+            self.load_poll_scheduler("config.json", self.config['poll_groups'])
+        QTimer.singleShot(0, self.preload_modules)
+
+    def preload_modules(self):
+        """ 窗口显示后在后台导入 pymodbus，第一次连接时不用再等 """
+        threading.Thread(target=load_pymodbus, name="preload-pymodbus", daemon=True).start()
 
     def set_window_icon(self):
         try:
@@ -60,8 +153,9 @@ class ModbusBabyGUI(QMainWindow):
         self.setup_validators()
         self.connect_button.clicked.disconnect()  # 断开所有之前的连接
         self.connect_button.clicked.connect(self.toggle_connection)
-        buttons = [self.connect_button, self.read_button, self.write_button,
-               self.start_polling_button, self.stop_polling_button]
+        buttons = [self.connect_button, self.scan_button, self.explore_button, self.read_button, self.write_button,
+               self.start_polling_button, self.stop_polling_button, self.import_tags_button,
+               self.import_groups_button]
         for button in buttons:
             button.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
             button.setMinimumSize(80, 32)
@@ -84,6 +178,10 @@ class ModbusBabyGUI(QMainWindow):
         # 4. Polling settings
         self.add_polling_settings(main_layout)
 
+        # 设置默认连接类型，要等 TCP/RTU 设置页都创建好之后
+        default_connection_type = self.config.get('default_connection_type', 'TCP')
+        self.connection_type.setCurrentText(f"Modbus {default_connection_type}")
+
     def setup_validators(self):
         # 为从站地址添加验证器
         slave_validator = QIntValidator(0, 247, self)
@@ -119,6 +217,7 @@ class ModbusBabyGUI(QMainWindow):
         connection_layout.addWidget(QLabel("连接类型:"))
         connection_layout.addWidget(self.connection_type)
         connection_layout.addStretch(1)
+        connection_layout.addWidget(self.scan_button)
         connection_layout.addWidget(self.connect_button)
         settings_layout.addLayout(connection_layout)
         # 2. Settings stack (TCP/RTU 设置)
@@ -143,6 +242,7 @@ class ModbusBabyGUI(QMainWindow):
         register_layout.addWidget(QLabel("字序:"))
         register_layout.addWidget(self.word_order_combo)
         register_layout.addStretch(1)
+        register_layout.addWidget(self.explore_button)
         register_layout.addWidget(self.read_button)
         settings_layout.addLayout(register_layout)
 
@@ -151,6 +251,10 @@ class ModbusBabyGUI(QMainWindow):
         value_layout.addWidget(QLabel("数值:"))
         value_layout.addWidget(self.value_input)
         value_layout.addWidget(self.write_button)
+        value_layout.addWidget(self.queue_writes_checkbox)
+        value_layout.addWidget(self.flush_writes_button)
+        value_layout.addWidget(self.import_recipe_button)
+        value_layout.addWidget(self.clear_writes_button)
         settings_layout.addLayout(value_layout)
 
         # 确保设置区域不会过度扩展
@@ -178,6 +282,8 @@ class ModbusBabyGUI(QMainWindow):
         default_slave_id = str(self.config.get('tcp', {}).get('slave_id', 1))
         self.slave_id_tcp = QLineEdit(default_slave_id)
         tcp_layout.addWidget(self.slave_id_tcp)
+        tcp_layout.addWidget(self.subnet_scan_button)
+        tcp_layout.addWidget(self.device_list)
         tcp_layout.addStretch(1)
         self.settings_stack.addWidget(tcp_widget)
 
@@ -211,6 +317,7 @@ class ModbusBabyGUI(QMainWindow):
         info_layout.setContentsMargins(10, 0, 10, 0)
         info_header.addWidget(QLabel("信息:"))
         info_header.addStretch(1)
+        info_header.addWidget(self.latency_button)
         info_header.addWidget(self.clear_info_button)
         info_layout.addLayout(info_header)
         info_layout.setContentsMargins(10, 0, 10, 0)
@@ -233,6 +340,9 @@ class ModbusBabyGUI(QMainWindow):
         sent_header = QHBoxLayout()
         #sent_header.setContentsMargins(0, 0, 0, 0)
         sent_header.addWidget(QLabel("发送的报文:"))
+        sent_header.addStretch(1)
+        sent_header.addWidget(self.copy_packets_button)
+        sent_header.addWidget(self.export_packets_button)
 
         sent_layout.addLayout(sent_header)
         sent_layout.addWidget(self.sent_packet_display)
@@ -254,6 +364,22 @@ class ModbusBabyGUI(QMainWindow):
 
         main_splitter.addWidget(packet_widget)
 
+        # 点表区域，导入点表后才显示
+        main_splitter.addWidget(self.address_table)
+        self.address_table.hide()
+
+        # 延迟统计区域
+        latency_layout = QVBoxLayout(self.latency_panel)
+        latency_layout.setContentsMargins(10, 0, 10, 0)
+        latency_header = QHBoxLayout()
+        latency_header.addWidget(QLabel("延迟统计:"))
+        latency_header.addStretch(1)
+        latency_header.addWidget(self.reset_latency_button)
+        latency_header.addWidget(self.export_latency_button)
+        latency_layout.addLayout(latency_header)
+        latency_layout.addWidget(self.latency_table)
+        main_splitter.addWidget(self.latency_panel)
+        self.latency_panel.hide()
 
         # 将主分割器添加到父布局
         parent_splitter.addWidget(main_splitter)
@@ -268,6 +394,9 @@ class ModbusBabyGUI(QMainWindow):
         polling_layout.addStretch(1)
         polling_layout.addWidget(self.start_polling_button)
         polling_layout.addWidget(self.stop_polling_button)
+        polling_layout.addWidget(self.report_by_exception_checkbox)
+        polling_layout.addWidget(self.import_tags_button)
+        polling_layout.addWidget(self.import_groups_button)
         polling_layout.addStretch(1)
         parent_layout.addLayout(polling_layout)
 
@@ -283,6 +412,17 @@ class ModbusBabyGUI(QMainWindow):
 
     def closeEvent(self, event):
         self.save_window_state()
+        self.polling_timer.stop()
+        self.scan_worker.stop()
+        self.subnet_scan_worker.stop()
+        self.explore_worker.stop()
+        self.polling_thread.quit()
+        self.polling_thread.wait()
+        self.packet_history.close()
+        if self.historian is not None:
+            self.historian.close()
+        if self.modbus_debugger:
+            self.modbus_debugger.stop_capture()
         super().closeEvent(event)
 
     def save_window_state(self):
@@ -319,13 +459,14 @@ class ModbusBabyGUI(QMainWindow):
         self.connection_type.setMaximumWidth(140)
         self.connection_type.currentIndexChanged.connect(self.on_connection_type_changed)
 
-        # 设置默认连接类型
-        default_connection_type = self.config.get('default_connection_type', 'TCP')
-        self.connection_type.setCurrentText(f"Modbus {default_connection_type}")
-
         self.connect_button = QPushButton("连接")
         self.connect_button.clicked.connect(self.toggle_connection)
 
+        self.scan_button = QPushButton("扫描从站")
+        self.scan_button.setToolTip("探测 1-247 中哪些从站地址有应答")
+        self.scan_button.setEnabled(False)
+        self.scan_button.clicked.connect(self.toggle_scan)
+
 
         # 修改 settings_stack 的创建和设置
         self.settings_stack = QStackedWidget()
@@ -343,6 +484,15 @@ class ModbusBabyGUI(QMainWindow):
         self.slave_id_tcp.setFixedWidth(90)
         self.slave_id_tcp.setFixedHeight(default_height)
 
+        # 网段扫描: IP 地址栏填 192.168.1.0/24 这样的网段，端口栏可以填 502,5020-5022
+        self.subnet_scan_button = QPushButton("扫描网段")
+        self.subnet_scan_button.setToolTip("扫描 IP 地址栏中的网段(如 192.168.1.0/24)，端口可填多个，如 502,5020-5022")
+        self.subnet_scan_button.clicked.connect(self.toggle_subnet_scan)
+        self.device_list = QComboBox()
+        self.device_list.setMinimumWidth(180)
+        self.device_list.setPlaceholderText("扫描到的设备")
+        self.device_list.currentIndexChanged.connect(self.on_device_selected)
+
         # RTU 设置元素
         self.serial_port = QComboBox()
         self.serial_port.setFixedWidth(250)
@@ -414,6 +564,11 @@ class ModbusBabyGUI(QMainWindow):
         self.read_button.setEnabled(False)
         self.read_button.clicked.connect(self.read_register)
 
+        self.explore_button = QPushButton("探测地址")
+        self.explore_button.setToolTip("根据异常码 02 查找当前寄存器类型的有效地址区间")
+        self.explore_button.setEnabled(False)
+        self.explore_button.clicked.connect(self.toggle_explore)
+
         self.value_input = QLineEdit()
         self.value_input.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
         self.value_input.setFixedHeight(default_height)
@@ -421,16 +576,29 @@ class ModbusBabyGUI(QMainWindow):
         self.write_button = QPushButton("写入")
         self.write_button.setEnabled(False)
         self.write_button.clicked.connect(self.write_register)
+        self.queue_writes_checkbox = QCheckBox("加入写队列")
+        self.queue_writes_checkbox.setToolTip("写入先放进队列，执行时相邻地址合并成尽量少的 FC16/FC15 请求，同一地址以最后一次为准")
+        self.flush_writes_button = QPushButton("执行写队列")
+        self.flush_writes_button.clicked.connect(self.flush_write_queue)
+        self.import_recipe_button = QPushButton("导入配方")
+        self.import_recipe_button.setToolTip("从 CSV/JSON 配方文件把写入值加入写队列")
+        self.import_recipe_button.clicked.connect(self.import_recipe)
+        self.clear_writes_button = QPushButton("清空队列")
+        self.clear_writes_button.clicked.connect(self.clear_write_queue)
 
         # 报文显示区域
 
-        self.sent_packet_display = QTextEdit()
-        self.sent_packet_display.setReadOnly(True)
-        self.received_packet_display = QTextEdit()
-        self.received_packet_display.setReadOnly(True)
+        max_packet_entries = self.config.get('packet_view_max_entries', 1000)
+        self.sent_packet_display = PacketView(max_packet_entries)
+        self.received_packet_display = PacketView(max_packet_entries)
         # 设置两个文本框的高度相同
         self.sent_packet_display.setMinimumHeight(150)  # 设置最小高度
         self.received_packet_display.setMinimumHeight(150)  # 设置最小高度
+        self.copy_packets_button = QPushButton("复制报文")
+        self.copy_packets_button.setToolTip("复制报文历史中的全部记录，包括显示区已经滚动出去的部分")
+        self.copy_packets_button.clicked.connect(self.copy_packets)
+        self.export_packets_button = QPushButton("导出报文")
+        self.export_packets_button.clicked.connect(self.export_packets)
         # 日志输出
         self.log_output = QTextEdit()
         self.log_output.setReadOnly(True)
@@ -441,6 +609,22 @@ class ModbusBabyGUI(QMainWindow):
         self.clear_info_button = QPushButton("清空")
         self.clear_info_button.clicked.connect(self.clear_all)
 
+        # 延迟统计: 每个 (设备, 功能码) 的分位数、超时和重试次数
+        self.latency_button = QPushButton("延迟统计")
+        self.latency_button.clicked.connect(self.toggle_latency_panel)
+        self.latency_panel = QWidget()
+        self.latency_table = QTableWidget(0, 10)
+        self.latency_table.setHorizontalHeaderLabels(
+            ["设备", "功能码", "请求数", "p50(ms)", "p95(ms)", "p99(ms)", "最大(ms)", "超时", "异常", "重试"])
+        self.latency_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.latency_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.reset_latency_button = QPushButton("重置")
+        self.reset_latency_button.clicked.connect(self.reset_latency)
+        self.export_latency_button = QPushButton("导出")
+        self.export_latency_button.clicked.connect(self.export_latency)
+        self.latency_timer = QTimer(self)
+        self.latency_timer.timeout.connect(self.update_latency_table)
+
         # 轮询设置
         self.polling_interval_input = QLineEdit(str(self.config.get('polling_interval', 1000)))
         self.polling_interval_input.setFixedHeight(default_height)
@@ -450,6 +634,23 @@ class ModbusBabyGUI(QMainWindow):
         self.stop_polling_button = QPushButton("停止轮询")
         self.stop_polling_button.setEnabled(False)
         self.stop_polling_button.clicked.connect(self.stop_polling)
+        report_config = self.config.get('report_by_exception', {})
+        self.report_by_exception_checkbox = QCheckBox("仅报告变化")
+        self.report_by_exception_checkbox.setToolTip("轮询值未超出死区时不刷新界面、不记录日志和历史")
+        self.report_by_exception_checkbox.setChecked(report_config.get('enabled', False))
+        self.report_by_exception_checkbox.toggled.connect(self.update_deadband_filter)
+        self.import_tags_button = QPushButton("导入点表")
+        self.import_tags_button.setToolTip("从 CSV/JSON 文件导入点表，轮询时按合并后的读计划读取全部点位")
+        self.import_tags_button.clicked.connect(self.toggle_tag_database)
+        self.import_groups_button = QPushButton("导入轮询组")
+        self.import_groups_button.setToolTip("从 CSV/JSON 文件导入轮询组，每个组按自己的周期轮询，同时到期的组合并读取")
+        self.import_groups_button.clicked.connect(self.toggle_poll_scheduler)
+
+        # 点表
+        self.address_table = QTableWidget(0, 6)
+        self.address_table.setHorizontalHeaderLabels(["名称", "地址", "描述", "数据类型", "单位", "值"])
+        self.address_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.address_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
 
         self.stop_polling_button.setEnabled(False)
 
@@ -510,6 +711,8 @@ class ModbusBabyGUI(QMainWindow):
                 self.read_button.setEnabled(True)
                 self.write_button.setEnabled(True)
                 self.start_polling_button.setEnabled(True)
+                self.scan_button.setEnabled(True)
+                self.explore_button.setEnabled(True)
             else:
                 self.log_output.append(f"{self.connection_type.currentText()} 连接失败")
         except Exception as e:
@@ -522,7 +725,13 @@ class ModbusBabyGUI(QMainWindow):
             return
         if self.modbus_debugger and self.modbus_debugger.client:
             try:
-                self.modbus_debugger.client.close()
+                # 确保先停止轮询，再关闭轮询线程可能正在使用的连接
+                is_polling = self.polling_timer.isActive()
+                if is_polling:
+                    self.stop_polling()
+                self.scan_worker.stop()
+                self.explore_worker.stop()
+                self.modbus_debugger.disconnect()
                 self.is_connected = False
                 self.connect_button.setText("连接")
                 self.log_output.append("已断开连接")
@@ -531,11 +740,8 @@ class ModbusBabyGUI(QMainWindow):
                 self.write_button.setEnabled(False)
                 self.start_polling_button.setEnabled(False)
                 self.stop_polling_button.setEnabled(False)
-                # 确保停止轮询
-                is_polling = self.polling_timer.isActive()
-                if is_polling:
-                    self.stop_polling()
-                    self.log_output.append("停止轮询")
+                self.scan_button.setEnabled(False)
+                self.explore_button.setEnabled(False)
 
             except Exception as e:
                 self.logger.error(f"断开连接时发生错误: {str(e)}")
@@ -544,13 +750,100 @@ class ModbusBabyGUI(QMainWindow):
             self.logger.warning("尝试断开连接，但客户端不存在")
             self.log_output.append("无法断开连接：客户端不存在")
 
-    def update_address_table(self, df):
-        self.address_table.setRowCount(len(df))
-        for i, row in df.iterrows():
-            self.address_table.setItem(i, 0, QTableWidgetItem(str(row['地址'])))
-            self.address_table.setItem(i, 1, QTableWidgetItem(row['描述']))
-            self.address_table.setItem(i, 2, QTableWidgetItem(row['数据类型']))
-            self.address_table.setItem(i, 3, QTableWidgetItem(row['单位']))
+    def update_address_table(self, tags):
+        self.address_table.setRowCount(len(tags))
+        self.tag_rows = {}
+        for i, tag in enumerate(tags):
+            self.tag_rows[tag.name] = i
+            self.address_table.setItem(i, 0, QTableWidgetItem(tag.name))
+            self.address_table.setItem(i, 1, QTableWidgetItem(str(tag.address)))
+            self.address_table.setItem(i, 2, QTableWidgetItem(tag.description))
+            self.address_table.setItem(i, 3, QTableWidgetItem(tag.data_type))
+            self.address_table.setItem(i, 4, QTableWidgetItem(tag.unit))
+            self.address_table.setItem(i, 5, QTableWidgetItem(""))
+
+    def update_deadband_filter(self):
+        """ 按当前设置和点表重建死区过滤器，交给轮询线程使用 """
+        if not self.report_by_exception_checkbox.isChecked():
+            self.polling_worker.deadband_filter = None
+            return
+        report_config = self.config.get('report_by_exception', {})
+        deadband_filter = DeadbandFilter(report_config.get('deadband', 0), report_config.get('deadband_percent', 0))
+        if self.poll_plan() is not None:
+            deadband_filter.configure(self.poll_plan())
+        self.polling_worker.deadband_filter = deadband_filter
+
+    def poll_plan(self):
+        """ 当前轮询的对象: 轮询组优先，其次是点表，都没有时返回 None(轮询当前地址范围) """
+        return self.poll_scheduler if self.poll_scheduler is not None else self.tag_database
+
+    def toggle_tag_database(self):
+        if self.tag_database is not None:
+            self.tag_database = None
+            self.address_table.hide()
+            self.address_table.setRowCount(0)
+            self.import_tags_button.setText("导入点表")
+            self.update_deadband_filter()
+            self.log_output.append("已清除点表，轮询恢复为读取当前地址范围")
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "导入点表", "", "点表 (*.csv *.json);;所有文件 (*)")
+        if path:
+            self.load_tag_database(path)
+
+    def load_tag_database(self, path):
+        if self.polling_timer.isActive():
+            self.stop_polling()
+        if self.poll_scheduler is not None:
+            self.toggle_poll_scheduler()
+        try:
+            tag_database = TagDatabase.from_file(path)
+            blocks = tag_database.compile()
+        except Exception as e:
+            self.logger.error(f"导入点表时发生错误: {str(e)}")
+            self.log_output.append(f"导入点表失败: {str(e)}")
+            return
+        self.tag_database = tag_database
+        self.update_address_table(tag_database.tags)
+        self.address_table.show()
+        self.import_tags_button.setText("清除点表")
+        self.update_deadband_filter()
+        self.log_output.append(f"已导入点表 {os.path.basename(path)}: {len(tag_database)} 个点位，"
+                               f"每次轮询 {len(blocks)} 个读请求")
+
+    def toggle_poll_scheduler(self):
+        if self.poll_scheduler is not None:
+            if self.polling_timer.isActive():
+                self.stop_polling()
+            self.poll_scheduler = None
+            self.address_table.hide()
+            self.address_table.setRowCount(0)
+            self.import_groups_button.setText("导入轮询组")
+            self.update_deadband_filter()
+            self.log_output.append("已清除轮询组，轮询恢复为读取当前地址范围")
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "导入轮询组", "", "轮询组 (*.csv *.json);;所有文件 (*)")
+        if path:
+            self.load_poll_scheduler(path)
+
+    def load_poll_scheduler(self, path, rows=None):
+        """ 从文件导入轮询组；rows 是 config.json 里的 poll_groups 时不读文件 """
+        if self.polling_timer.isActive():
+            self.stop_polling()
+        if self.tag_database is not None:
+            self.toggle_tag_database()
+        try:
+            scheduler = PollScheduler(parse_poll_groups(rows) if rows is not None else load_poll_groups(path))
+        except Exception as e:
+            self.logger.error(f"导入轮询组时发生错误: {str(e)}")
+            self.log_output.append(f"导入轮询组失败: {str(e)}")
+            return
+        self.poll_scheduler = scheduler
+        self.update_address_table(scheduler.tags)
+        self.address_table.show()
+        self.import_groups_button.setText("清除轮询组")
+        self.update_deadband_filter()
+        self.log_output.append(f"已导入轮询组 {os.path.basename(path)}: {len(scheduler)} 个组，{len(scheduler.tags)} 个点位，"
+                               f"节拍 {scheduler.tick} ms")
 
     def toggle_packet_display(self):
         self.show_packets = not self.show_packets
@@ -561,18 +854,70 @@ class ModbusBabyGUI(QMainWindow):
             self.packet_display.hide()
             self.toggle_packet_button.setText("显示报文")
 
-    def clear_packets(self):
-        self.sent_packets.clear()
-        self.received_packets.clear()
+    def toggle_latency_panel(self):
+        if self.latency_panel.isHidden():
+            self.latency_panel.show()
+            self.latency_button.setText("隐藏统计")
+            self.update_latency_table()
+            self.latency_timer.start(1000)
+        else:
+            self.latency_timer.stop()
+            self.latency_panel.hide()
+            self.latency_button.setText("延迟统计")
+
+    def update_latency_table(self):
+        if not self.modbus_debugger:
+            return
+        rows = self.modbus_debugger.latency.summary()
+        self.latency_table.setRowCount(len(rows))
+        keys = ['device', 'function_code', 'count', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms',
+                'timeouts', 'exceptions', 'retries']
+        for i, row in enumerate(rows):
+            for j, key in enumerate(keys):
+                value = row[key]
+                if key == 'function_code':
+                    text = f"{value:02X}"
+                else:
+                    text = "-" if value is None else str(value)
+                self.latency_table.setItem(i, j, QTableWidgetItem(text))
+
+    def reset_latency(self):
+        if self.modbus_debugger:
+            self.modbus_debugger.latency.reset()
+        self.update_latency_table()
+
+    def export_latency(self):
+        if not self.modbus_debugger:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "导出延迟统计", "latency.csv", "CSV (*.csv);;JSON (*.json)")
+        if not path:
+            return
+        try:
+            count = self.modbus_debugger.latency.export(path)
+            self.log_output.append(f"已导出 {count} 条延迟统计到 {path}")
+        except OSError as e:
+            self.logger.error(f"导出延迟统计时发生错误: {str(e)}")
+            self.log_output.append(f"导出延迟统计失败: {str(e)}")
 
     def clear_all(self):
         self.clear_info()
         self.clear_packets()
 
     def copy_packets(self):
-        clipboard = QApplication.clipboard()
-        text = f"发送的报文:\n{self.sent_packets.toPlainText()}\n\n接收的报文:\n{self.received_packets.toPlainText()}"
-        clipboard.setText(text)
+        # 显示区只保留最近的记录，复制和导出使用完整的报文历史
+        QApplication.clipboard().setText(self.packet_history.to_text())
+        self.log_output.append(f"已复制 {len(self.packet_history)} 条报文")
+
+    def export_packets(self):
+        path, _ = QFileDialog.getSaveFileName(self, "导出报文", "packets.tsv", "文本 (*.tsv *.txt)")
+        if not path:
+            return
+        try:
+            count = self.packet_history.export(path)
+            self.log_output.append(f"已导出 {count} 条报文到 {path}")
+        except OSError as e:
+            self.logger.error(f"导出报文时发生错误: {str(e)}")
+            self.log_output.append(f"导出报文失败: {str(e)}")
 
     def read_register(self):
         if not self.is_connected:
@@ -594,16 +939,12 @@ class ModbusBabyGUI(QMainWindow):
 
                 count = end_address - start_address + 1
                 # 根据数据类型调整读取的寄存器数量
-                registers_per_value = 1
-                if data_type in ['INT32', 'UINT32', 'FLOAT32']:
-                    registers_per_value = 2
-                elif data_type in ['INT64', 'UINT64', 'FLOAT64']:
-                    registers_per_value = 4
+                value_width = registers_per_value(data_type)
 
                 # 确保读取的寄存器数量是正确的倍数
-                count = max(count, registers_per_value)
-                if count % registers_per_value != 0:
-                    count = (count // registers_per_value + 1) * registers_per_value
+                count = max(count, value_width)
+                if count % value_width != 0:
+                    count = (count // value_width + 1) * value_width
 
                 self.logger.debug(f"尝试读取 - 类型: {register_type}, 起始地址: {start_address}, 数量: {count}, 数据类型: {data_type}")
 
@@ -633,16 +974,7 @@ class ModbusBabyGUI(QMainWindow):
                     return
 
                 # 处理报文显示
-                send_time = self.get_timestamp_with_operation(": READ")
-                receive_time = self.get_timestamp_with_operation(": READ")
-
-                formatted_sent = self.modbus_debugger.format_packet(sent_packet)
-                formatted_received = self.modbus_debugger.format_packet(received_packet)
-
-                self.sent_packets.append(f"{send_time}\n{formatted_sent}")
-                self.received_packets.append(f"{receive_time}\n{formatted_received}")
-
-                self.update_packet_display()
+                self.add_packets(": READ", sent_packet, received_packet)
 
                 if result is not None:
                     self.logger.debug(f"读取成功 - 结果: {result}")
@@ -699,6 +1031,10 @@ class ModbusBabyGUI(QMainWindow):
             # 根据数据类型处理输入值
             if register_type == 'Coil':
                 values = [bool(int(v.strip())) for v in value.split(',')]
+                if self.queue_writes_checkbox.isChecked():
+                    self.write_queue.add_coils(start_address, values, slave_id)
+                    self.on_write_queued(register_type, start_address, value)
+                    return
                 success, message, result = self.modbus_debugger.write_coils(
                     start_address, values, slave_id
                 )
@@ -719,18 +1055,8 @@ class ModbusBabyGUI(QMainWindow):
                 elif data_type == 'BOOL':
                     values = [bool(int(v.strip())) for v in value.split(',')]
                 elif data_type == 'ASCII':
-                    # ASCII字符串转换为寄存器值
-                    ascii_str = value.strip()
-                    values = []
-                    # 每两个字符组成一个寄存器
-                    for i in range(0, len(ascii_str), 2):
-                        if i + 1 < len(ascii_str):
-                            high_byte = ord(ascii_str[i])
-                            low_byte = ord(ascii_str[i + 1])
-                            values.append((high_byte << 8) | low_byte)
-                        else:
-                            # 奇数个字符，最后一个字符放在高字节
-                            values.append(ord(ascii_str[i]) << 8)
+                    # 直接传字符串，由编码器按字节序拆分成寄存器，与读取和配方写入一致
+                    values = value.strip()
                 elif data_type == 'UNIX_TIMESTAMP':
                     if value.strip().lower() == 'now':
                         # 使用当前系统时间
@@ -744,6 +1070,11 @@ class ModbusBabyGUI(QMainWindow):
                 else:
                     self.log_output.append(f"错误：不支持的数据类型 {data_type}")
                     return
+                if self.queue_writes_checkbox.isChecked():
+                    self.write_queue.add_values(start_address, values, data_type, self.byte_order,
+                                                self.word_order, slave_id)
+                    self.on_write_queued(register_type, start_address, value)
+                    return
                 success, message, result = self.modbus_debugger.write_registers(
                     start_address, values, slave_id, data_type,
                     byte_order=self.byte_order, word_order=self.word_order
@@ -772,15 +1103,7 @@ class ModbusBabyGUI(QMainWindow):
             # 处理报文显示
             if result and isinstance(result, tuple) and len(result) == 2:
                 sent_packet, received_packet = result
-                send_time = self.get_timestamp_with_operation(": WRITE")
-                receive_time = self.get_timestamp_with_operation(": WRITE")
-
-                formatted_sent = self.modbus_debugger.format_packet(sent_packet)
-                formatted_received = self.modbus_debugger.format_packet(received_packet)
-
-                self.sent_packets.append(f"[{send_time}]\n{formatted_sent}")
-                self.received_packets.append(f"{receive_time}\n{formatted_received}")
-                self.update_packet_display()
+                self.add_packets(": WRITE", sent_packet, received_packet)
                 self.logger.debug("报文已添加到显示列表")
             else:
                 self.logger.warning(f"无法获取发送或接收的报文，result类型: {type(result)}, 内容: {result}")
@@ -789,6 +1112,64 @@ class ModbusBabyGUI(QMainWindow):
         except Exception as e:
             self.log_output.append(f"写入操作发生错误: {str(e)}")
 
+    def on_write_queued(self, register_type, start_address, value):
+        self.log_output.append(f"已加入写队列 {register_type} {start_address}: {value}")
+        self.update_write_queue_button()
+
+    def update_write_queue_button(self):
+        count = len(self.write_queue)
+        self.flush_writes_button.setText(f"执行写队列 ({count})" if count else "执行写队列")
+
+    def flush_write_queue(self):
+        if not self.is_connected or not self.modbus_debugger or not self.modbus_debugger.client:
+            self.log_output.append("错误：未连接到设备")
+            return
+        if not len(self.write_queue):
+            self.log_output.append("写队列为空")
+            return
+        # 写请求在轮询线程里执行，慢速 RTU 上一次写几十个块时界面也不会卡住
+        self.flush_writes_button.setEnabled(False)
+        self.polling_worker.modbus_debugger = self.modbus_debugger
+        self.write_flush_requested.emit({'queue': self.write_queue, 'queued': len(self.write_queue)})
+
+    def on_write_queue_flushed(self, response):
+        self.flush_writes_button.setEnabled(True)
+        if 'error' in response:
+            self.log_output.append(f"执行写队列时发生错误: {response['error']}")
+            self.update_write_queue_button()
+            return
+        results = response['results']
+        for block, success, message, (sent_packet, received_packet) in results:
+            end_address = block.start + block.count - 1
+            if success:
+                self.log_output.append(f"成功写入 {block.register_type} {block.start}-{end_address} "
+                                       f"(FC{block.function_code:02d}, {block.count} 个值)")
+            else:
+                self.log_output.append(f"写入 {block.register_type} {block.start}-{end_address} 失败: {message}")
+            self.add_packets(": WRITE", sent_packet, received_packet)
+        self.log_output.append(f"写队列: {response['queued']} 个值用 {len(results)} 个请求写入，"
+                               f"队列中剩余 {len(self.write_queue)} 个值")
+        self.update_write_queue_button()
+
+    def import_recipe(self):
+        path, _ = QFileDialog.getOpenFileName(self, "导入配方", "", "配方 (*.csv *.json);;所有文件 (*)")
+        if not path:
+            return
+        try:
+            rows = self.write_queue.load_recipe(path)
+        except Exception as e:
+            self.logger.error(f"导入配方时发生错误: {str(e)}")
+            self.log_output.append(f"导入配方失败: {str(e)}")
+            return
+        self.log_output.append(f"已导入配方 {os.path.basename(path)}: {rows} 行，写队列中共 {len(self.write_queue)} "
+                               f"个值，将合并为 {len(self.write_queue.plan())} 个写请求")
+        self.update_write_queue_button()
+
+    def clear_write_queue(self):
+        self.write_queue.clear()
+        self.log_output.append("已清空写队列")
+        self.update_write_queue_button()
+
     def update_data_type_visibility(self):
         register_type = self.register_type_combo.currentText()
         if register_type in ['Discrete Input', 'Coil']:
@@ -802,7 +1183,14 @@ class ModbusBabyGUI(QMainWindow):
             self.logger.error("未连接到设备，无法开始轮询")
             self.log_output.append("错误：未连接到设备，无法开始轮询")
             return
-        interval = int(self.polling_interval_input.text())
+        if self.poll_scheduler is not None:
+            # 多速率轮询: 定时器按各组周期的公约数触发，每次只读取到期的组
+            self.poll_scheduler.reset()
+            interval = self.poll_scheduler.tick
+        else:
+            interval = int(self.polling_interval_input.text())
+        self.polling_worker.modbus_debugger = self.modbus_debugger
+        self.update_deadband_filter()  # 每次开始轮询都先完整显示一次
         self.polling_timer.start(interval)
         self.start_polling_button.setEnabled(False)
         self.stop_polling_button.setEnabled(True)
@@ -816,6 +1204,9 @@ class ModbusBabyGUI(QMainWindow):
         else:
             self.start_polling_button.setEnabled(False)
         self.log_output.append("停止轮询")
+        if self.poll_scheduler is not None:
+            for line in self.poll_scheduler.summary():
+                self.log_output.append(f"  {line}")
     def poll_register(self):
         if not self.is_connected:
             self.logger.error("未连接到设备")
@@ -823,6 +1214,13 @@ class ModbusBabyGUI(QMainWindow):
             self.stop_polling()  # 停止轮询
             return
         if self.modbus_debugger:
+            if self.poll_in_flight:
+                # 上一次轮询还没有返回，跳过本次，避免请求在轮询线程里堆积
+                return
+            if self.poll_plan() is not None:
+                self.poll_in_flight = True
+                self.poll_requested.emit({'plan': self.poll_plan()})
+                return
             try:
                 start_address = int(self.start_address_input.text())
                 end_address = int(self.end_address_input.text())
@@ -831,66 +1229,240 @@ class ModbusBabyGUI(QMainWindow):
                 slave_id = int(self.slave_id_tcp.text() if self.connection_type.currentText() == "Modbus TCP" else self.slave_id_rtu.text())
                 count = end_address - start_address + 1
 
-                # 根据数据类型调整读取的寄存器数量
-                registers_per_value = 1
-                if data_type in ['INT32', 'UINT32', 'FLOAT32', 'UNIX_TIMESTAMP']:
-                    registers_per_value = 2
-                elif data_type in ['INT64', 'UINT64','FLOAT64']:
-                    registers_per_value = 4
-                elif data_type == 'ASCII':
-                    # ASCII类型保持用户指定的寄存器数量
-                    registers_per_value = 1
+                # 根据数据类型调整读取的寄存器数量，ASCII类型保持用户指定的寄存器数量
+                value_width = registers_per_value(data_type)
 
                 # 确保读取的寄存器数量是正确的倍数
-                count = max(count, registers_per_value)
-                if count % registers_per_value != 0:
-                    count = (count // registers_per_value + 1) * registers_per_value
-           
-                if register_type == 'Holding Register':
-                    result, sent_packet, received_packet = self.modbus_debugger.read_holding_registers(start_address, count, slave_id)
-                elif register_type == 'Input Register':
-                    result, sent_packet, received_packet = self.modbus_debugger.read_input_registers(start_address, count, slave_id)
-                elif register_type == 'Discrete Input':
-                    result, sent_packet, received_packet = self.modbus_debugger.read_discrete_inputs(start_address, count, slave_id)
-                elif register_type == 'Coil':
-                    result, sent_packet, received_packet = self.modbus_debugger.read_coils(start_address, count, slave_id)
-
-                # 添加时间戳
-                send_time = self.get_timestamp_with_operation(": POLLING")
-                receive_time = self.get_timestamp_with_operation(": POLLING")
-                formatted_sent = self.modbus_debugger.format_packet(sent_packet)
-                formatted_received = self.modbus_debugger.format_packet(received_packet)
-
-                self.sent_packets.append(f"{send_time}\n{formatted_sent}")
-                self.received_packets.append(f"{receive_time}\n{formatted_received}")
-
-                self.update_packet_display()
-
-                if result is not None:
-                    if register_type in ['Holding Register', 'Input Register']:
-                        processed_values = []
-                        for i in range(0, len(result), registers_per_value):
-                            value = self.modbus_debugger.process_data(result[i:i+registers_per_value], data_type)
-                            # 如果 process_data 返回的是列表，我们只取第一个元素
-                            processed_values.append(value[0] if isinstance(value, list) else value)
-                    else:
-                        processed_values = result
-
-                    # 将处理后的值转换为字符串
-                    values_str = ', '.join(map(str, processed_values))
-                    self.value_input.setText(values_str)
-                    self.log_output.append(f"轮询 {register_type} {start_address}-{end_address}: {values_str}")
-                else:
-                    self.log_output.append(f"轮询 {register_type} {start_address}-{end_address} 失败")
+                count = max(count, value_width)
+                if count % value_width != 0:
+                    count = (count // value_width + 1) * value_width
             except Exception as e:
                 self.logger.error(f"轮询操作发生错误: {str(e)}")
                 self.log_output.append(f"轮询操作发生错误: {str(e)}")
                 self.stop_polling()  # 如果发生错误，也停止轮询
+                return
+
+            self.poll_in_flight = True
+            self.poll_requested.emit({
+                'start_address': start_address,
+                'end_address': end_address,
+                'count': count,
+                'register_type': register_type,
+                'data_type': data_type,
+                'slave_id': slave_id,
+                'byte_order': self.byte_order,
+                'word_order': self.word_order,
+            })
         else:
             self.logger.error("ModbusDebugger 实例不存在")
             self.log_output.append("错误：ModbusDebugger 实例不存在")
             self.stop_polling()  # 如果 ModbusDebugger 不存在，停止轮询
 
+    def on_poll_finished(self, response):
+        self.poll_in_flight = False
+        if not self.polling_timer.isActive():
+            # 停止轮询后才返回的结果直接丢弃
+            return
+        if 'error' in response:
+            self.log_output.append(f"轮询操作发生错误: {response['error']}")
+            self.stop_polling()  # 如果发生错误，也停止轮询
+            return
+        if 'plan' in response:
+            self.on_tag_poll_finished(response)
+            return
+        if response.get('unchanged'):
+            return  # 按例外报告: 值没有超出死区
+        register_type = response['register_type']
+        start_address = response['start_address']
+        end_address = response['end_address']
+
+        self.add_packets(": POLLING", response['sent_packet'], response['received_packet'])
+
+        result = response['result']
+        if result is not None:
+            # 将处理后的值转换为字符串
+            values_str = ', '.join(map(str, result))
+            self.value_input.setText(values_str)
+            self.log_output.append(f"轮询 {register_type} {start_address}-{end_address}: {values_str}")
+        else:
+            self.log_output.append(f"轮询 {register_type} {start_address}-{end_address} 失败")
+
+
+    def on_tag_poll_finished(self, response):
+        if response['plan'] is not self.poll_plan():
+            return  # 轮询期间点表或轮询组已被清除或替换
+        for sent_packet, received_packet in response['packets']:
+            self.add_packets(": POLLING", sent_packet, received_packet)
+        failed = 0
+        for name, value in response['values'].items():
+            if value is None:
+                failed += 1
+                text = "读取失败"
+            elif isinstance(value, list):
+                text = ', '.join(map(str, value))
+            else:
+                text = str(value)
+            self.address_table.item(self.tag_rows[name], 5).setText(text)
+        if failed:
+            self.log_output.append(f"轮询点表: {failed} 个点位读取失败")
+
+    def toggle_scan(self):
+        if self.is_scanning:
+            self.scan_worker.stop()
+            self.scan_button.setEnabled(False)  # 等当前探测返回后再恢复
+        else:
+            self.start_scan()
+
+    def start_scan(self):
+        if not self.is_connected:
+            self.log_output.append("错误：未连接到设备，无法扫描")
+            return
+        if self.polling_timer.isActive():
+            self.stop_polling()
+        try:
+            address = int(self.start_address_input.text())
+        except ValueError:
+            address = 0
+        self.is_scanning = True
+        self.scan_button.setText("停止扫描")
+        for button in (self.read_button, self.write_button, self.start_polling_button):
+            button.setEnabled(False)
+        self.log_output.append(f"开始扫描从站地址 1-247 (读保持寄存器 {address})")
+        self.scan_worker.modbus_debugger = self.modbus_debugger
+        self.scan_requested.emit({'probe': 'read', 'address': address})
+
+    def on_scan_progress(self, probed, total):
+        self.scan_button.setText(f"停止扫描 {probed}/{total}")
+
+    def on_scan_finished(self, response):
+        self.is_scanning = False
+        self.scan_button.setText("扫描从站")
+        self.scan_button.setEnabled(self.is_connected)
+        for button in (self.read_button, self.write_button, self.start_polling_button):
+            button.setEnabled(self.is_connected)
+        if 'error' in response:
+            self.log_output.append(f"扫描从站时发生错误: {response['error']}")
+            return
+        results = response['results']
+        status = "扫描已停止" if response['stopped'] else "扫描完成"
+        if not results:
+            self.log_output.append(f"{status}，没有从站应答")
+            return
+        self.log_output.append(f"{status}，{len(results)} 个从站有应答: "
+                               f"{', '.join(str(r.slave_id) for r in results)}")
+        for result in results:
+            note = f"，异常码 {result.exception_code:02X}" if result.exception_code is not None else ""
+            self.log_output.append(f"  从站 {result.slave_id}: {result.latency * 1000:.1f} ms{note}")
+        # 把第一个有应答的地址填入当前连接的从站地址
+        if self.connection_type.currentText() == "Modbus TCP":
+            self.slave_id_tcp.setText(str(results[0].slave_id))
+        else:
+            self.slave_id_rtu.setText(str(results[0].slave_id))
+
+    def toggle_explore(self):
+        if self.is_exploring:
+            self.explore_worker.stop()
+            self.explore_button.setEnabled(False)
+            return
+        register_type = self.register_type_combo.currentText()
+        if register_type == 'Report Slave ID (FC11H)':
+            self.log_output.append("请选择要探测的寄存器类型")
+            return
+        if self.is_scanning:
+            self.log_output.append("正在扫描从站，请稍后再探测地址")
+            return
+        if self.polling_timer.isActive():
+            self.stop_polling()
+        slave_id = int(self.slave_id_tcp.text() if self.connection_type.currentText() == "Modbus TCP" else self.slave_id_rtu.text())
+        self.is_exploring = True
+        self.explore_button.setText("停止探测")
+        for button in (self.read_button, self.write_button, self.start_polling_button, self.scan_button):
+            button.setEnabled(False)
+        self.log_output.append(f"开始探测从站 {slave_id} 的 {register_type} 地址区间")
+        self.explore_worker.modbus_debugger = self.modbus_debugger
+        self.explore_requested.emit({'register_types': [register_type], 'slave_id': slave_id})
+
+    def on_explore_progress(self, register_type, address):
+        self.explore_button.setText(f"停止探测 {address}")
+
+    def on_explore_finished(self, response):
+        self.is_exploring = False
+        self.explore_button.setText("探测地址")
+        for button in (self.explore_button, self.read_button, self.write_button, self.start_polling_button, self.scan_button):
+            button.setEnabled(self.is_connected)
+        if 'error' in response:
+            self.log_output.append(f"探测地址时发生错误: {response['error']}")
+            return
+        register_map = response['map']
+        status = "探测已停止" if response['stopped'] else "探测完成"
+        self.log_output.append(f"{status}，{response['requests']} 次请求\n{register_map.format()}")
+        self.register_map = register_map
+        # 用第一个有效区间填充起止地址，单次读取超过上限时只填一段
+        for register_type in response['register_types']:
+            ranges = register_map.ranges.get(register_type)
+            if ranges:
+                start, end = ranges[0]
+                self.start_address_input.setText(str(start))
+                self.end_address_input.setText(str(min(end, start + 124)))
+                break
+
+    def toggle_subnet_scan(self):
+        if self.is_subnet_scanning:
+            self.subnet_scan_worker.stop()
+            self.subnet_scan_button.setEnabled(False)
+            return
+        if self.is_scanning:
+            self.log_output.append("正在扫描从站，请稍后再扫描网段")
+            return
+        try:
+            address = self.ip_address.text().strip()
+            # 只填了一个 IP 时扫描它所在的 /24 网段
+            cidr = address if '/' in address else f"{address}/24"
+            # subnet_scanner 依赖 asyncio，第一次扫描网段时才导入
+            from subnet_scanner import parse_ports
+            ports = parse_ports(self.port.text())
+            slave_id = int(self.slave_id_tcp.text() or 1)
+            if not ports:
+                raise ValueError("请至少填写一个端口")
+        except ValueError as e:
+            self.log_output.append(f"网段扫描参数错误: {str(e)}")
+            return
+        if self.polling_timer.isActive():
+            self.stop_polling()
+        self.is_subnet_scanning = True
+        self.subnet_scan_button.setText("停止扫描")
+        self.log_output.append(f"开始扫描网段 {cidr}，端口 {self.port.text()}")
+        self.subnet_scan_requested.emit({'cidr': cidr, 'ports': ports, 'slave_id': slave_id})
+
+    def on_subnet_scan_progress(self, probed, total):
+        self.subnet_scan_button.setText(f"停止扫描 {probed}/{total}")
+
+    def on_subnet_scan_finished(self, response):
+        self.is_subnet_scanning = False
+        self.subnet_scan_button.setText("扫描网段")
+        self.subnet_scan_button.setEnabled(True)
+        if 'error' in response:
+            self.log_output.append(f"扫描网段时发生错误: {response['error']}")
+            return
+        results = response['results']
+        status = "网段扫描已停止" if response['stopped'] else "网段扫描完成"
+        self.log_output.append(f"{status}，发现 {len(results)} 个 Modbus TCP 设备")
+        self.device_list.clear()
+        for result in results:
+            self.log_output.append(f"  {result.host}:{result.port} FC{result.function_code:02X} "
+                                   f"连接 {result.connect_time * 1000:.1f} ms，应答 {result.latency * 1000:.1f} ms")
+            self.device_list.addItem(f"{result.host}:{result.port}", (result.host, result.port, result.slave_id))
+        if results:
+            self.device_list.setCurrentIndex(0)
+
+    def on_device_selected(self, index):
+        device = self.device_list.itemData(index)
+        if not device:
+            return
+        host, port, slave_id = device
+        self.ip_address.setText(host)
+        self.port.setText(str(port))
+        self.slave_id_tcp.setText(str(slave_id))
 
     def format_result(self, result, data_type):
 
@@ -908,70 +1480,12 @@ class ModbusBabyGUI(QMainWindow):
             return str(result[0]) if result else ""
         else:
             return str(result)
-    def changeEvent(self, event):
-        if event.type() == QEvent.Type.PaletteChange:
-            self.update_packet_display()
-        super().changeEvent(event)
-
-    def append_colored_text(self, text_edit, text):
-        try:
-            cursor = text_edit.textCursor()
-            palette = QApplication.palette()
-            is_dark_mode = palette.color(QPalette.ColorRole.Window).lightness() < 128
-            default_color = palette.color(QPalette.ColorRole.Text)
-
-            format_time = QTextCharFormat()
-            if is_dark_mode:
-                format_time.setForeground(QColor(0, 255, 255))  # 深色模式使用青色
-            else:
-                format_time.setForeground(QColor("blue"))  # 浅色模式使用蓝色
-
-            format_data = QTextCharFormat()
-            format_data.setForeground(default_color)
-
-            lines = text.split('\n', 1)
-            if len(lines) > 0:
-                cursor.insertText(lines[0] + '\n', format_time)
-                if len(lines) > 1:
-                    cursor.insertText(lines[1], format_data)
-            text_edit.append("")
-        except Exception as e:
-            # 如果彩色文本失败，使用简单的文本追加
-            text_edit.append(text)
-
-    def update_packet_display(self):
-
-       # print(f"开始更新报文显示: 发送 {len(self.sent_packets)}, 接收 {len(self.received_packets)}")
-
-        self.sent_packet_display.clear()
-        self.received_packet_display.clear()
-
-        #self.sent_packet_display.append("发送：")
-        for packet in self.sent_packets:
-
-            self.append_colored_text(self.sent_packet_display,  packet)
-        #self.received_packet_display.append("接收：")
-        for packet in self.received_packets:
-
-            self.append_colored_text(self.received_packet_display, packet)
-
-
-
-        # 滚动到底部
-        self.sent_packet_display.verticalScrollBar().setValue(
-            self.sent_packet_display.verticalScrollBar().maximum()
-        )
-        self.received_packet_display.verticalScrollBar().setValue(
-            self.received_packet_display.verticalScrollBar().maximum()
-        )
-
-        # 安全地更新显示
-        try:
-            self.sent_packet_display.update()
-            self.received_packet_display.update()
-        except Exception as e:
-            self.logger.debug(f"更新显示时出现错误: {e}")
-
+    def add_packets(self, operation, sent_packet, received_packet):
+        """ 把一对收发报文存入报文历史，再把这一条渲染到报文显示区 """
+        record = self.packet_history.append(operation, sent_packet, received_packet)
+        header = self.packet_history.header(record)
+        self.sent_packet_display.append_packet(header, self.modbus_debugger.format_packet(record.sent))
+        self.received_packet_display.append_packet(header, self.modbus_debugger.format_packet(record.received))
 
     def clear_info(self):
         self.log_output.clear()
@@ -980,8 +1494,7 @@ class ModbusBabyGUI(QMainWindow):
     def clear_packets(self):
         self.sent_packet_display.clear()
         self.received_packet_display.clear()
-        self.sent_packets.clear()
-        self.received_packets.clear()
+        self.packet_history.clear()
 
     def load_tcp_settings(self):
         tcp_config = self.config.get('tcp', {})
@@ -1001,11 +1514,14 @@ class ModbusBabyGUI(QMainWindow):
 
     #def update_serial_ports(self,default_port=None):
     def update_serial_ports(self, default_port=None):
+        """ 在后台线程枚举串口，结果由 on_serial_ports_found 填入下拉框 """
         self.logger.info("开始更新串口列表")
-        self.serial_port.clear()
-
-        system_ports = self.get_system_serial_ports()
+        self.serial_port_default = default_port
+        self.serial_ports_requested.emit()
 
+    def on_serial_ports_found(self, system_ports):
+        self.serial_port.clear()
+        default_port = self.serial_port_default
         if system_ports:
             self.serial_port.addItems(system_ports)
             if default_port and default_port in system_ports:
@@ -1017,19 +1533,6 @@ class ModbusBabyGUI(QMainWindow):
             self.logger.info("未检测到可用串口")
             self.log_output.append("未检测到可用串口")
 
-    def get_system_serial_ports(self):
-        try:
-            if self.modbus_debugger is None:
-                self.logger.info("初始化 ModbusDebugger 实例")
-                self.modbus_debugger = ModbusDebugger(self.config)
-            ports = self.modbus_debugger.get_available_serial_ports()
-            self.logger.info(f"系统检测到的串口: {ports}")
-            return ports
-        except Exception as e:
-            self.logger.error(f"获取系统串口列表时出错: {str(e)}")
-            return []
-
-
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -0,0 +1,515 @@
+#大牛大巨婴
+import json
+import logging
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+
+# 段文件: 64 字节文件头 + 按列连续存放的定长数组，数值按本机字节序存储
+# 文件头: 魔数, 容量(行), 已提交行数, 水位线(降采样段用)
+SEGMENT_MAGIC = b'MBHIST\x00\x01'
+SEGMENT_HEADER = struct.Struct('=8sIIq')
+HEADER_SIZE = 64
+SEGMENT_SUFFIX = '.seg'
+
+# 原始样本: 时间戳 ns, 点位编号, 值
+RAW_COLUMNS = 'qId'
+# 降采样桶: 桶起始时间 ns, 点位编号, 最小值, 最大值, 累加和, 样本数
+ROLLUP_COLUMNS = 'qIdddI'
+
+# 写线程一次最多合并处理的队列条目数
+WRITE_BATCH = 1024
+
+
+def _samples(values):
+    """ {名称: 值} 展开成 (名称, 数值)；多值点位按下标展开，非数值直接跳过 """
+    for name, value in values.items():
+        if isinstance(value, (list, tuple)):
+            if len(value) == 1:
+                value = value[0]
+            else:
+                for i, item in enumerate(value):
+                    if isinstance(item, (bool, int, float)):
+                        yield f"{name}[{i}]", float(item)
+                continue
+        if isinstance(value, (bool, int, float)):
+            yield name, float(value)
+
+
+class Segment:
+    """ 一个定长的列式段文件，通过 mmap 读写。
+
+    只追加: 先写各列数据，再更新文件头里的行数，读到的行数以内的数据总是完整的。
+    """
+    def __init__(self, path, columns, capacity=None):
+        self.path = path
+        self.columns = columns
+        if capacity is not None:
+            # 容量取 8 的倍数，保证每一列都按 8 字节对齐
+            capacity = (capacity + 7) // 8 * 8
+            size = HEADER_SIZE + capacity * struct.calcsize('=' + columns)
+            with open(path, 'wb') as f:
+                f.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, capacity, 0, 0))
+                f.truncate(size)
+        self._file = open(path, 'r+b')
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        magic, self.capacity, _, _ = SEGMENT_HEADER.unpack_from(self._mmap)
+        if magic != SEGMENT_MAGIC:
+            self.close()
+            raise ValueError(f"不是有效的历史数据段: {path}")
+        self._offsets = []
+        offset = HEADER_SIZE
+        for code in columns:
+            self._offsets.append(offset)
+            offset += self.capacity * struct.calcsize(code)
+
+    @property
+    def count(self):
+        return SEGMENT_HEADER.unpack_from(self._mmap)[2]
+
+    @property
+    def watermark(self):
+        return SEGMENT_HEADER.unpack_from(self._mmap)[3]
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+    def append(self, columns, start=0):
+        """ 从每列的 start 处开始写入，返回写入的行数(段满时可能少于剩余行数) """
+        count = self.count
+        n = min(len(columns[0]) - start, self.capacity - count)
+        if n <= 0:
+            return 0
+        for code, offset, values in zip(self.columns, self._offsets, columns):
+            struct.pack_into(f'={n}{code}', self._mmap, offset + count * struct.calcsize(code),
+                             *values[start:start + n])
+        self._set_header(count=count + n)
+        return n
+
+    def set_watermark(self, watermark):
+        self._set_header(watermark=watermark)
+
+    def _set_header(self, count=None, watermark=None):
+        _, capacity, old_count, old_watermark = SEGMENT_HEADER.unpack_from(self._mmap)
+        SEGMENT_HEADER.pack_into(self._mmap, 0, SEGMENT_MAGIC, capacity,
+                                 old_count if count is None else count,
+                                 old_watermark if watermark is None else watermark)
+
+    def timestamp(self, row):
+        return struct.unpack_from('=q', self._mmap, self._offsets[0] + row * 8)[0]
+
+    def search(self, timestamp, count):
+        """ 第一列(时间)中第一个 >= timestamp 的行号 """
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamp(middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def read(self, low, high):
+        """ 返回 [low, high) 行的各列数据 """
+        n = high - low
+        return [struct.unpack_from(f'={n}{code}', self._mmap, offset + low * struct.calcsize(code))
+                for code, offset in zip(self.columns, self._offsets)]
+
+    def flush(self):
+        self._mmap.flush()
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+
+class SealedSegment:
+    """ 已写满并关闭的段: 只保留路径和时间范围，查询时才打开 """
+    def __init__(self, path, count, first, last, size):
+        self.path = path
+        self.count = count
+        self.first = first
+        self.last = last
+        self.size = size
+
+    @classmethod
+    def describe(cls, segment):
+        count = segment.count
+        first = segment.timestamp(0) if count else None
+        last = segment.timestamp(count - 1) if count else None
+        return cls(segment.path, count, first, last, os.path.getsize(segment.path))
+
+
+class SegmentSeries:
+    """ 一个目录下按序号排列的段文件，按时间顺序追加。
+
+    只有正在写入的尾段保持打开和映射，写满的段关闭后只记录时间范围，查询时临时打开，
+    长时间运行时打开的文件数不随段数增长。prune() 按时间或总大小删除最旧的段。
+    """
+    def __init__(self, directory, columns, capacity):
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory
+        self.columns = columns
+        self.capacity = capacity
+        os.makedirs(directory, exist_ok=True)
+        names = sorted((name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX)),
+                       key=lambda name: int(name[:-len(SEGMENT_SUFFIX)]))
+        self._next_number = int(names[-1][:-len(SEGMENT_SUFFIX)]) + 1 if names else 1
+        # 尾段被写线程关闭时，查询线程不能正在读它
+        self._lock = threading.Lock()
+        self.sealed = []
+        for name in names[:-1]:
+            segment = Segment(os.path.join(directory, name), columns)
+            self.sealed.append(SealedSegment.describe(segment))
+            segment.close()
+        self.tail = Segment(os.path.join(directory, names[-1]), columns) if names else None
+
+    @property
+    def watermark(self):
+        return self.tail.watermark if self.tail else 0
+
+    @property
+    def size(self):
+        """ 全部段文件的字节数 """
+        tail = os.path.getsize(self.tail.path) if self.tail else 0
+        return tail + sum(sealed.size for sealed in self.sealed)
+
+    def append(self, columns):
+        written = 0
+        while written < len(columns[0]):
+            if self.tail is None or self.tail.full:
+                self._new_segment()
+            written += self.tail.append(columns, written)
+
+    def set_watermark(self, watermark):
+        if self.tail is None:
+            self._new_segment()
+        self.tail.set_watermark(watermark)
+
+    def _new_segment(self):
+        watermark = self.watermark
+        path = os.path.join(self.directory, f"{self._next_number:06d}{SEGMENT_SUFFIX}")
+        segment = Segment(path, self.columns, self.capacity)
+        segment.set_watermark(watermark)
+        self._next_number += 1
+        with self._lock:
+            if self.tail is not None:
+                self.sealed.append(SealedSegment.describe(self.tail))
+                self.tail.close()
+            self.tail = segment
+
+    def prune(self, before=None, max_bytes=None):
+        """ 删除最后一个样本早于 before 的段，以及总大小超过 max_bytes 时最旧的段；尾段不删除。返回删除的段数 """
+        removed = 0
+        size = self.size if max_bytes is not None else 0
+        while self.sealed:
+            oldest = self.sealed[0]
+            expired = before is not None and (oldest.last is None or oldest.last < before)
+            if not expired and not (max_bytes is not None and size > max_bytes):
+                break
+            try:
+                os.remove(oldest.path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                # Windows 上查询正打开着这个段，下次再删
+                self.logger.debug(f"暂时无法删除 {oldest.path}: {str(e)}")
+                break
+            with self._lock:
+                self.sealed.pop(0)
+            size -= oldest.size
+            removed += 1
+        return removed
+
+    @staticmethod
+    def _rows(segment, count, start, end):
+        low = segment.search(start, count) if start is not None else 0
+        high = segment.search(end, count) if end is not None else count
+        return segment.read(low, high) if low < high else None
+
+    def read(self, start=None, end=None):
+        """ 逐段产出时间在 [start, end) 内的各列数据 """
+        done = set()
+        while True:
+            with self._lock:
+                pending = [sealed for sealed in self.sealed if sealed.path not in done]
+                if not pending:
+                    # 尾段在锁内读完，读的过程中写线程不会关闭它
+                    rows = None
+                    tail = self.tail
+                    count = tail.count if tail else 0
+                    if count and (start is None or tail.timestamp(count - 1) >= start) \
+                            and (end is None or tail.timestamp(0) < end):
+                        rows = self._rows(tail, count, start, end)
+                    break
+            for sealed in pending:
+                done.add(sealed.path)
+                if not sealed.count or (start is not None and sealed.last < start):
+                    continue
+                if end is not None and sealed.first >= end:
+                    return
+                try:
+                    segment = Segment(sealed.path, self.columns)
+                except FileNotFoundError:
+                    continue  # 刚被 prune() 删除
+                try:
+                    rows = self._rows(segment, sealed.count, start, end)
+                finally:
+                    segment.close()
+                if rows:
+                    yield rows
+        if rows:
+            yield rows
+
+    def last_timestamp(self):
+        if self.tail is not None and self.tail.count:
+            return self.tail.timestamp(self.tail.count - 1)
+        for sealed in reversed(self.sealed):
+            if sealed.count:
+                return sealed.last
+        return 0
+
+    def flush(self):
+        if self.tail is not None:
+            self.tail.flush()
+
+    def close(self):
+        with self._lock:
+            if self.tail is not None:
+                self.tail.close()
+                self.tail = None
+
+
+class RollupTier:
+    """ 一个降采样周期: 落盘的桶、水位线和尚未结束的桶 """
+    def __init__(self, period, series):
+        self.period = period
+        self.series = series
+        self.watermark = series.watermark
+        self.buckets = {}  # {点位编号: [桶起始, 最小, 最大, 和, 个数]}
+        self.closed = []
+
+
+class Historian:
+    """ 嵌入式时序历史库: 记录轮询得到的 (时间戳, 点位, 值)。
+
+    record() 只做一次入队，写盘在后台线程完成，队列满时丢弃并计入 dropped，不会阻塞轮询。
+    原始样本追加写入 raw/ 下的列式段文件；rollups 中的每个周期(秒)各有一组降采样段，
+    在写入时增量累计，桶结束后才落盘，水位线之前的桶都是完整的。
+    时间戳统一为 time.time_ns()。
+    max_age(秒) 和 max_bytes 限制原始样本的保留时间和占用空间，rollup_max_age(秒) 限制降采样数据，
+    超出的旧段在写入后删除；默认不删除。
+    """
+    def __init__(self, data_dir, segment_capacity=65536, rollups=(1, 60), queue_size=100000,
+                 max_age=None, max_bytes=None, rollup_max_age=None):
+        self.logger = logging.getLogger(__name__)
+        self.data_dir = data_dir
+        self.dropped = 0
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.rollup_max_age = rollup_max_age
+        os.makedirs(data_dir, exist_ok=True)
+        self._tags_path = os.path.join(data_dir, 'tags.json')
+        self._tag_ids = {}
+        if os.path.exists(self._tags_path):
+            with open(self._tags_path, 'r', encoding='utf-8') as f:
+                self._tag_ids = json.load(f)
+        self._raw = SegmentSeries(os.path.join(data_dir, 'raw'), RAW_COLUMNS, segment_capacity)
+        self._tiers = []
+        for seconds in sorted(rollups):
+            series = SegmentSeries(os.path.join(data_dir, f'rollup_{seconds}s'), ROLLUP_COLUMNS,
+                                   max(1024, segment_capacity // 4))
+            self._tiers.append(RollupTier(int(seconds * 1e9), series))
+        self._last_timestamp = 0
+        self._replay()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="historian", daemon=True)
+        self._thread.start()
+
+    def _replay(self):
+        """ 重启后从原始样本恢复水位线之后尚未落盘的降采样桶 """
+        if not self._tiers:
+            return
+        start = min(tier.watermark for tier in self._tiers)
+        for timestamps, tag_ids, values in self._raw.read(start):
+            for timestamp, tag_id, value in zip(timestamps, tag_ids, values):
+                self._accumulate(tag_id, timestamp, value)
+            self._last_timestamp = timestamps[-1]
+        if not self._last_timestamp:
+            self._last_timestamp = self._raw.last_timestamp()
+
+    def record(self, values, timestamp=None):
+        """ 记录一个轮询周期的 {点位名称: 值}，可以在任何线程调用 """
+        try:
+            self._queue.put_nowait((timestamp or time.time_ns(), values))
+        except queue.Full:
+            self.dropped += 1
+
+    def append(self, tag, value, timestamp=None):
+        self.record({tag: value}, timestamp)
+
+    def flush(self, timeout=None):
+        """ 等待已入队的样本全部写入 """
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._raw.close()
+        for tier in self._tiers:
+            tier.series.close()
+
+    def tags(self):
+        return list(self._tag_ids)
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = [item]
+            while len(batch) < WRITE_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [item for item in batch if isinstance(item, tuple)]
+            try:
+                if records:
+                    self._write(records)
+            except OSError as e:
+                self.logger.error(f"写入历史数据失败: {str(e)}")
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if None in batch:
+                break
+
+    def _write(self, records):
+        timestamps, tag_ids, values = [], [], []
+        last = self._last_timestamp
+        new_tags = False
+        for timestamp, record in records:
+            # 系统对时回拨时保持时间单调，段内才能二分查找
+            last = max(timestamp, last)
+            for name, value in _samples(record):
+                tag_id = self._tag_ids.get(name)
+                if tag_id is None:
+                    tag_id = self._tag_ids[name] = len(self._tag_ids)
+                    new_tags = True
+                timestamps.append(last)
+                tag_ids.append(tag_id)
+                values.append(value)
+                self._accumulate(tag_id, last, value)
+        self._last_timestamp = last
+        if new_tags:
+            # 每批只写一次映射表，并且先于样本落盘，段文件里不会出现映射表中没有的编号
+            self._save_tags()
+        if timestamps:
+            self._raw.append((timestamps, tag_ids, values))
+        self._close_buckets(last)
+        self._prune(last)
+
+    def _prune(self, now):
+        """ 按保留策略删除旧段，以最新样本的时间为准，回放历史数据时不会误删 """
+        if self.max_age is not None or self.max_bytes is not None:
+            before = now - int(self.max_age * 1e9) if self.max_age is not None else None
+            self._raw.prune(before, self.max_bytes)
+        if self.rollup_max_age is not None:
+            before = now - int(self.rollup_max_age * 1e9)
+            for tier in self._tiers:
+                tier.series.prune(before)
+
+    def _save_tags(self):
+        path = self._tags_path + '.tmp'
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self._tag_ids, f, ensure_ascii=False)
+        os.replace(path, self._tags_path)
+
+    def _accumulate(self, tag_id, timestamp, value):
+        for tier in self._tiers:
+            if timestamp < tier.watermark:
+                continue
+            bucket_start = timestamp - timestamp % tier.period
+            bucket = tier.buckets.get(tag_id)
+            if bucket is None or bucket[0] != bucket_start:
+                if bucket is not None:
+                    tier.closed.append((tag_id, bucket))  # 同一批内跨桶，等 _close_buckets 一并落盘
+                tier.buckets[tag_id] = [bucket_start, value, value, value, 1]
+            else:
+                if value < bucket[1]:
+                    bucket[1] = value
+                if value > bucket[2]:
+                    bucket[2] = value
+                bucket[3] += value
+                bucket[4] += 1
+
+    def _close_buckets(self, timestamp):
+        """ 起始时间早于当前周期的桶都不会再有新样本，落盘并推进水位线 """
+        for tier in self._tiers:
+            watermark = timestamp - timestamp % tier.period
+            closed, tier.closed = tier.closed, []
+            for tag_id, bucket in list(tier.buckets.items()):
+                if bucket[0] < watermark:
+                    closed.append((tag_id, tier.buckets.pop(tag_id)))
+            if closed:
+                closed.sort(key=lambda item: item[1][0])
+                tier.series.append(tuple(zip(*((b[0], tag_id, b[1], b[2], b[3], b[4]) for tag_id, b in closed))))
+            if watermark > tier.watermark:
+                tier.series.set_watermark(watermark)
+                tier.watermark = watermark
+
+    def query(self, tag, start=None, end=None):
+        """ 返回 [start, end) 内某个点位的 [(时间戳 ns, 值)] """
+        tag_id = self._tag_ids.get(tag)
+        if tag_id is None:
+            return []
+        samples = []
+        for timestamps, tag_ids, values in self._raw.read(start, end):
+            samples.extend((t, v) for t, i, v in zip(timestamps, tag_ids, values) if i == tag_id)
+        return samples
+
+    def downsample(self, tag, start, end, interval):
+        """ 按 interval 秒分桶，返回 [(桶起始 ns, 最小, 最大, 平均, 个数)]。
+
+        interval 是某个降采样周期的整数倍时，水位线之前直接读降采样段，之后的部分读原始样本。
+        """
+        tag_id = self._tag_ids.get(tag)
+        if tag_id is None:
+            return []
+        interval = int(interval * 1e9)
+        start -= start % interval
+        buckets = {}
+
+        def merge(timestamp, minimum, maximum, total, count):
+            key = timestamp - timestamp % interval
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [minimum, maximum, total, count]
+            else:
+                bucket[0] = min(bucket[0], minimum)
+                bucket[1] = max(bucket[1], maximum)
+                bucket[2] += total
+                bucket[3] += count
+
+        raw_start = start
+        tiers = [tier for tier in self._tiers if interval % tier.period == 0]
+        if tiers:
+            # 先读水位线，再读段数据: 水位线之前的桶此时一定已经落盘
+            series, watermark = tiers[-1].series, tiers[-1].watermark
+            for columns in series.read(start, min(end, watermark)):
+                for timestamp, i, minimum, maximum, total, count in zip(*columns):
+                    if i == tag_id:
+                        merge(timestamp, minimum, maximum, total, count)
+            raw_start = max(start, watermark)
+        if raw_start < end:
+            for timestamp, value in self.query(tag, raw_start, end):
+                merge(timestamp, value, value, value, 1)
+        return [(key, b[0], b[1], b[2] / b[3], b[3]) for key, b in sorted(buckets.items())]
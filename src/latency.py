@@ -0,0 +1,141 @@
+#大牛大巨婴
+import csv
+import json
+import threading
+
+# HDR 风格的对数-线性分桶: 每个 2 的幂区间再均分为 SUB_BUCKETS 个桶，相对误差 < 1/SUB_BUCKETS
+SUB_BITS = 7
+SUB_BUCKETS = 1 << (SUB_BITS - 1)
+EXPORT_FIELDS = ['device', 'function_code', 'count', 'p50_ms', 'p95_ms', 'p99_ms', 'min_ms', 'max_ms',
+                 'mean_ms', 'timeouts', 'exceptions', 'retries']
+
+
+class LatencyHistogram:
+    """ 纳秒延迟直方图，记录是 O(1)，内存只和最大值的数量级有关 """
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @staticmethod
+    def bucket_index(value):
+        if value < 2 * SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SUB_BITS
+        return shift * SUB_BUCKETS + (value >> shift)
+
+    @staticmethod
+    def bucket_value(index):
+        """ 桶内的最大值，与 HdrHistogram 的 highestEquivalentValue 一致 """
+        if index < 2 * SUB_BUCKETS:
+            return index
+        shift = index // SUB_BUCKETS - 1
+        return ((index - shift * SUB_BUCKETS + 1) << shift) - 1
+
+    def record(self, value):
+        index = self.bucket_index(value)
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        if not self.count:
+            return None
+        target = max(1, -(-self.count * percent // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.bucket_value(index), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+
+class TransactionStats:
+    """ 一个 (设备, 功能码) 的延迟直方图和失败计数 """
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.timeouts = 0
+        self.exceptions = 0
+        self.retries = 0
+
+    def summary(self):
+        histogram = self.histogram
+        to_ms = lambda value: round(value / 1e6, 3) if value is not None else None
+        return {
+            'count': histogram.count,
+            'p50_ms': to_ms(histogram.percentile(50)),
+            'p95_ms': to_ms(histogram.percentile(95)),
+            'p99_ms': to_ms(histogram.percentile(99)),
+            'min_ms': to_ms(histogram.min),
+            'max_ms': to_ms(histogram.max if histogram.count else None),
+            'mean_ms': to_ms(histogram.mean),
+            'timeouts': self.timeouts,
+            'exceptions': self.exceptions,
+            'retries': self.retries,
+        }
+
+
+class LatencyStats:
+    """ 按 (设备, 功能码) 统计每次请求从发送到收到响应的耗时。
+
+    record() 在 I/O 线程调用，summary()/export() 可以在界面线程调用。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _get(self, device, function_code):
+        stats = self._stats.get((device, function_code))
+        if stats is None:
+            stats = self._stats[(device, function_code)] = TransactionStats()
+        return stats
+
+    def record(self, device, function_code, latency_ns=None, timeout=False, exception=False, retries=0):
+        with self._lock:
+            stats = self._get(device, function_code)
+            if latency_ns is not None:
+                stats.histogram.record(latency_ns)
+            if timeout:
+                stats.timeouts += 1
+            if exception:
+                stats.exceptions += 1
+            stats.retries += retries
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def summary(self):
+        """ 返回按设备、功能码排序的统计行 """
+        with self._lock:
+            rows = [dict(device=device, function_code=function_code, **stats.summary())
+                    for (device, function_code), stats in self._stats.items()]
+        return sorted(rows, key=lambda row: (row['device'], row['function_code']))
+
+    def export(self, path):
+        """ 按扩展名导出为 JSON 或 CSV """
+        rows = self.summary()
+        if path.lower().endswith('.json'):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(rows, f, ensure_ascii=False, indent=2)
+        else:
+            with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS)
+                writer.writeheader()
+                writer.writerows(rows)
+        return len(rows)
+
+    def __len__(self):
+        return len(self._stats)
@@ -4,10 +4,13 @@ import sys
 import json
 import platform
 import logging
-from PyQt6.QtWidgets import QApplication, QMessageBox
-from gui import ModbusBabyGUI
+import startup_profiler
+from startup_profiler import phase
 from utils import resource_path as get_resource_path # Use centralized resource_path
 
+CLI_COMMANDS = ('read', 'write', 'poll', 'recipe', 'scan', 'bus', '-h', '--help')
+PROFILE_STARTUP_FLAG = '--profile-startup'
+
 def check_permissions():
     if platform.system() == 'Darwin':
         try:
@@ -36,10 +39,36 @@ def load_config():
 
 
 def main():
-    app = QApplication(sys.argv)
+    # --profile-startup: 启动完成后在 stderr 输出各阶段和模块导入耗时
+    profiler = None
+    if PROFILE_STARTUP_FLAG in sys.argv:
+        sys.argv.remove(PROFILE_STARTUP_FLAG)
+        profiler = startup_profiler.StartupProfiler().start()
+
+    # 命令行子命令走无界面模式，不导入 PyQt
+    if len(sys.argv) > 1 and sys.argv[1] in CLI_COMMANDS:
+        with phase("导入命令行模块"):
+            from cli import main as cli_main
+        try:
+            with phase("执行命令"):
+                code = cli_main(sys.argv[1:])
+        finally:
+            if profiler:
+                profiler.report()
+        sys.exit(code)
+
+    with phase("导入 PyQt6"):
+        from PyQt6.QtCore import QTimer
+        from PyQt6.QtWidgets import QApplication, QMessageBox
+    with phase("导入界面模块"):
+        from gui import ModbusBabyGUI
+    with phase("创建 QApplication"):
+        app = QApplication(sys.argv)
     
     # 检查权限
-    if not check_permissions():
+    with phase("检查权限"):
+        permitted = check_permissions()
+    if not permitted:
         msg = QMessageBox()
         msg.setIcon(QMessageBox.Icon.Warning)
         msg.setText("权限错误")
@@ -48,9 +77,18 @@ def main():
         msg.exec()
         return
     
-    config = load_config()
-    window = ModbusBabyGUI(config)
-    window.show()
+    with phase("读取配置"):
+        config = load_config()
+    with phase("创建主窗口"):
+        window = ModbusBabyGUI(config)
+    with phase("显示窗口"):
+        window.show()
+    if profiler:
+        # 事件循环处理完第一批事件(包括首次绘制)后窗口才真正可用
+        def first_frame():
+            profiler.mark("窗口可用")
+            profiler.report()
+        QTimer.singleShot(0, first_frame)
     sys.exit(app.exec())
 
 if __name__ == "__main__":
@@ -1,19 +1,27 @@
 #大牛大巨婴
 import logging
+import threading
 import time
-from pymodbus.client import ModbusTcpClient, ModbusSerialClient
-from pymodbus.exceptions import ModbusException, ModbusIOException
-from pymodbus.pdu import ExceptionResponse
-import serial
-import os
-import time
-from datetime import datetime
-
-try:
-    from serial.tools import list_ports
-    PYSERIAL_AVAILABLE = True
-except ImportError:
-    PYSERIAL_AVAILABLE = False
+from codec import get_codec
+from packet_capture import PacketCaptureWriter, LINK_TYPES, LINK_UNKNOWN
+from reconnect import ReconnectManager
+from latency import LatencyStats
+
+# pymodbus 会连带导入 asyncio、ssl 等模块，是启动时最慢的一步。
+# 这些名字在第一次建立连接(或 load_pymodbus() 预加载)时才填充，窗口可以先显示出来
+ModbusTcpClient = ModbusSerialClient = None
+ModbusException = ModbusIOException = ExceptionResponse = None
+_pymodbus_lock = threading.Lock()
+
+
+def load_pymodbus():
+    """ 导入 pymodbus，可以在后台线程里提前调用 """
+    global ModbusTcpClient, ModbusSerialClient, ModbusException, ModbusIOException, ExceptionResponse
+    with _pymodbus_lock:
+        if ModbusTcpClient is None:
+            from pymodbus.exceptions import ModbusException, ModbusIOException
+            from pymodbus.pdu import ExceptionResponse
+            from pymodbus.client import ModbusSerialClient, ModbusTcpClient
 
 class SocketWrapper:
     """ A wrapper for a socket object to intercept send/recv calls. """
@@ -23,11 +31,14 @@ class SocketWrapper:
 
     def send(self, data):
         self._debugger.last_sent_packet = data
+        self._debugger._on_send()
         return self._sock.send(data)
 
     def recv(self, size):
         data = self._sock.recv(size)
-        self._debugger.last_received_packet = data
+        # pymodbus 先读报文头再读剩余部分，这里需要拼接成完整的响应报文
+        self._debugger.last_received_packet += data
+        self._debugger._on_receive(data)
         return data
 
     def __getattr__(self, name):
@@ -42,11 +53,13 @@ class SerialWrapper:
 
     def write(self, data):
         self._debugger.last_sent_packet = data
+        self._debugger._on_send()
         return self._ser.write(data)
 
     def read(self, size):
         data = self._ser.read(size)
-        self._debugger.last_received_packet = data
+        self._debugger.last_received_packet += data
+        self._debugger._on_receive(data)
         return data
 
     def __getattr__(self, name):
@@ -60,20 +73,70 @@ class ModbusDebugger:
         self.client = None
         self.last_sent_packet = b''
         self.last_received_packet = b''
-        self.log_dir = "logs"
-        if not os.path.exists(self.log_dir):
-            os.makedirs(self.log_dir)
-        self.current_log_file = None
-        self.packet_count = 0
-        self.max_packets_per_file = 256
+        capture_config = (config or {}).get('packet_capture', {})
+        # 抓包目录在开始抓包时才创建，不抓包时不在当前目录留下空的 logs 目录
+        self.log_dir = capture_config.get('log_dir', "logs")
+        self.max_packets_per_file = capture_config.get('max_packets_per_file', 256)
+        self.max_bytes_per_file = capture_config.get('max_bytes_per_file', 16 * 1024 * 1024)
+        self.capture = None
+        if capture_config.get('enabled', False):
+            self.start_capture()
+        # 每次请求从发送到收完响应的耗时，按 (设备, 功能码) 统计
+        self.latency = LatencyStats()
+        self._sends = 0
+        self._sent_ns = None
+        self._received_ns = None
 
         # Store connection parameters
         self._connection_type = None
         self._connection_params = {}
         self._slave_id = None
+        # set_timeout 设置的超时，重连时新建的客户端沿用
+        self._timeout = None
+        # 轮询线程和界面线程共用同一个客户端，同一时刻只允许一个请求在总线上
+        self._io_lock = threading.RLock()
+        reconnect_config = (config or {}).get('reconnect', {})
+        self.reconnect_manager = ReconnectManager(
+            self._try_reconnect,
+            initial_delay=reconnect_config.get('initial_delay', 0.5),
+            max_delay=reconnect_config.get('max_delay', 30.0),
+            multiplier=reconnect_config.get('multiplier', 2.0),
+            jitter=reconnect_config.get('jitter', 0.2)
+        )
+        # TCP 上连续这么多次请求失败才进入退避重连，偶尔一次无应答只算这一次请求失败
+        self.max_failures = reconnect_config.get('max_failures', 10)
+        self._failures = 0
+        # 每次用户发起连接加 1，后台重连线程据此丢弃已经过时的连接结果
+        self._generation = 0
+
+    @property
+    def reconnecting(self):
+        return self.reconnect_manager.reconnecting
+
+    @property
+    def current_log_file(self):
+        return self.capture.current_log_file if self.capture else None
+
+    @property
+    def packet_count(self):
+        return self.capture.packet_count if self.capture else 0
+
+    def start_capture(self):
+        """ 开始把每一对收发报文写入 log_dir 下的二进制抓包文件 """
+        if not self.capture:
+            self.capture = PacketCaptureWriter(self.log_dir, self.max_packets_per_file, self.max_bytes_per_file)
+        return self.capture
+
+    def stop_capture(self):
+        if self.capture:
+            self.capture.close()
+            self.capture = None
 
     def get_available_serial_ports(self):
-        if not PYSERIAL_AVAILABLE:
+        # 串口枚举只在需要时导入，在部分系统上枚举本身也比较慢
+        try:
+            from serial.tools import list_ports
+        except ImportError:
             self.logger.warning("pyserial 库未安装，无法获取可用串口列表")
             return []
         try:
@@ -85,62 +148,175 @@ class ModbusDebugger:
 
     def _wrap_client_socket(self):
         """ Wraps the client's socket to intercept packets. """
-        if not self.client:
+        if not self.client or isinstance(self.client.socket, (SocketWrapper, SerialWrapper)):
             return
         if isinstance(self.client, ModbusTcpClient) and self.client.socket:
             self.client.socket = SocketWrapper(self.client.socket, self)
         elif isinstance(self.client, ModbusSerialClient) and self.client.socket:
             self.client.socket = SerialWrapper(self.client.socket, self)
 
-    def _reconnect(self):
-        self.logger.info("尝试重新连接 Modbus 设备...")
-        self.disconnect(clear_params=False)  # Properly close the port without clearing params
-        time.sleep(1)  # Wait for the OS to release the port
+    def _new_client(self):
+        """ 按保存的连接参数创建一个尚未连接的客户端 """
+        load_pymodbus()
+        timeout = {} if self._timeout is None else {'timeout': self._timeout}
+        if self._connection_type == "tcp":
+            return ModbusTcpClient(host=self._connection_params['host'], port=self._connection_params['port'], **timeout)
+        elif self._connection_type == "rtu":
+            return ModbusSerialClient(
+                port=self._connection_params['port'],
+                baudrate=self._connection_params['baud_rate'],
+                bytesize=self._connection_params['data_bits'],
+                parity=self._connection_params['parity'][0].upper(),
+                stopbits=self._connection_params['stop_bits'],
+                **timeout
+            )
+        return None
+
+    def _connect_client(self):
+        # 不等待后台重连线程，它可能正卡在连接超时里，等待会冻结界面
+        self.reconnect_manager.cancel(wait=False)
+        with self._io_lock:
+            self._generation += 1
+            if self.client:
+                self.client.close()
+            self.client = self._new_client()
+            if self.client.connect():
+                self._wrap_client_socket()
+                return True
+            return False
 
+    def _reconnect(self):
+        """ 通知后台开始重连，立即返回 False，当前请求直接按失败处理 """
         if not self._connection_type:
             self.logger.warning("没有可用的连接参数，无法重连。")
             return False
+        if self.reconnect_manager.reconnecting:
+            return False
+        self._failures += 1
+        # 某个从站不应答时 pymodbus 也会关闭串口。重新打开本地串口很快，
+        # 不必让整条总线上的其他从站一起进入退避重连
+        if self._connection_type == "rtu" and self.reopen():
+            return False
+        # TCP 超时后 pymodbus 同样会关闭连接。设备还在时立即重连只要几毫秒；
+        # 重连失败(连接被拒绝、不可达)或连续多次失败才认为连接已断开
+        if self._connection_type == "tcp" and self._failures < self.max_failures and self.reopen():
+            return False
+        if self.reconnect_manager.trigger():
+            self.logger.info("连接异常，开始在后台重新连接 Modbus 设备...")
+        return False
 
-        if self._connection_type == "tcp":
-            return self.connect_tcp(
-                self._connection_params['host'],
-                self._connection_params['port'],
-                self._slave_id
-            )
-        elif self._connection_type == "rtu":
-            return self.connect_rtu(
-                self._connection_params['port'],
-                self._connection_params['baud_rate'],
-                self._connection_params['data_bits'],
-                self._connection_params['stop_bits'],
-                self._connection_params['parity'],
-                self._slave_id
-            )
+    def reopen(self):
+        """ 连接被 pymodbus 因无应答关闭后立即重新打开，不经过退避重连 """
+        if self.reconnect_manager.reconnecting or not self.client:
+            return False
+        with self._io_lock:
+            try:
+                if self.client.connect():
+                    self._wrap_client_socket()
+                    return True
+            except Exception as e:
+                self.logger.error(f"重新打开连接失败: {str(e)}")
         return False
 
+    def _try_reconnect(self):
+        """ 由 ReconnectManager 在后台线程中调用 """
+        with self._io_lock:
+            generation = self._generation
+            if not self._connection_type:
+                return True  # 已经主动断开，不再重连
+            # 先关闭旧连接，串口必须释放后才能重新打开
+            if self.client:
+                self.client.close()
+            client = self._new_client()
+        # 连接过程可能要等待超时，不持有总线锁，其他请求在此期间直接失败
+        if not client.connect():
+            client.close()
+            return False
+        with self._io_lock:
+            # 等待期间用户断开或重新连接了，结果作废
+            if not self._connection_type or generation != self._generation:
+                client.close()
+                return True
+            self.client = client
+            self._wrap_client_socket()
+        return True
+
+    def set_timeout(self, timeout):
+        """ 设置之后请求的响应超时(秒)，RTU 总线调度器按帧长计算 """
+        self._timeout = timeout
+        if not self.client:
+            return
+        self.client.comm_params.timeout_connect = timeout
+        sock = self.client.socket
+        if isinstance(sock, SerialWrapper):
+            sock._ser.timeout = timeout
+
+    def _execute(self, call):
+        """ 执行一次请求并返回 (结果, 发送报文, 接收报文)，报文为原始 bytes。 """
+        if self.reconnect_manager.reconnecting:
+            # 重连期间不排队等待总线，直接按 I/O 失败返回
+            return ModbusIOException("设备正在重连，请求已跳过"), b'', b''
+        with self._io_lock:
+            self.last_sent_packet = b''
+            self.last_received_packet = b''
+            self._sends = 0
+            self._sent_ns = self._received_ns = None
+            result = None
+            try:
+                result = call()
+                if not isinstance(result, ModbusIOException):
+                    self._failures = 0
+            finally:
+                # 超时等异常情况也要记录，此时接收报文可能为空
+                if self.capture:
+                    self.capture.write(self.last_sent_packet, self.last_received_packet,
+                                       LINK_TYPES.get(self._connection_type, LINK_UNKNOWN))
+                self._record_latency(result)
+            return result, self.last_sent_packet, self.last_received_packet
+
+    def _on_send(self):
+        # pymodbus 重发时会多次调用，延迟按最后一次发送计算
+        self._sends += 1
+        self._sent_ns = time.perf_counter_ns()
+
+    def _on_receive(self, data):
+        if data:
+            self._received_ns = time.perf_counter_ns()
+
+    def _record_latency(self, result):
+        sent = self.last_sent_packet
+        if not self._sends or len(sent) < 2:
+            return  # 请求没有发出去
+        if self._connection_type == "tcp" and len(sent) >= 8:
+            # MBAP 头之后是单元号和功能码
+            unit, function_code = sent[6], sent[7]
+            device = f"{self._connection_params.get('host')}:{self._connection_params.get('port')}/{unit}"
+        else:
+            unit, function_code = sent[0], sent[1]
+            device = f"{self._connection_params.get('port')}/{unit}"
+        # 截断的报文也算超时: 收到了字节，但没有得到完整的响应
+        received = (self._received_ns is not None and self._received_ns >= self._sent_ns
+                    and result is not None and not isinstance(result, ModbusIOException))
+        self.latency.record(
+            device, function_code,
+            latency_ns=self._received_ns - self._sent_ns if received else None,
+            timeout=not received,
+            exception=isinstance(result, ExceptionResponse),
+            retries=self._sends - 1
+        )
+
     def connect_tcp(self, host, port, slave_id):
         try:
-            self.client = ModbusTcpClient(host=host, port=port)
             self._slave_id = slave_id
             self._connection_type = "tcp"
             self._connection_params = {'host': host, 'port': port}
-            if self.client.connect():
-                self._wrap_client_socket()
-                return True
-            return False
+            return self._connect_client()
         except Exception as e:
             self.logger.error(f"TCP 连接失败: {str(e)}")
             return False
 
     def connect_rtu(self, port, baud_rate, data_bits, stop_bits, parity, slave_id):
         try:
-            self.client = ModbusSerialClient(
-                port=port,
-                baudrate=baud_rate,
-                bytesize=data_bits,
-                parity=parity[0].upper(),
-                stopbits=stop_bits
-            )
             self._slave_id = slave_id
             self._connection_type = "rtu"
             self._connection_params = {
@@ -150,16 +326,13 @@ class ModbusDebugger:
                 'stop_bits': stop_bits,
                 'parity': parity
             }
-            if self.client.connect():
-                self._wrap_client_socket()
-                return True
-            return False
+            return self._connect_client()
         except Exception as e:
             self.logger.error(f"RTU 连接失败: {str(e)}")
             return False
 
     def disconnect(self, clear_params=True):
-        """Closes the connection and optionally resets state, with delays for resource release."""
+        """Closes the connection and optionally resets state."""
         if not self._connection_type:
             self.logger.info("没有可用的连接参数，无法重连")
             return False
@@ -167,325 +340,216 @@ class ModbusDebugger:
             self._connection_type = None
             self._connection_params = {}
             self._slave_id = None
+            # 不等待后台线程，它在连接完成后发现参数已清空会自行关闭连接
+            self.reconnect_manager.cancel(wait=False)
             self.logger.info("连接已清理。")
+        with self._io_lock:
+            if self.client:
+                self.client.close()
+        return True
 
     def write_coils(self, address, values, slave_id=None):
         if not self.client:
             self.logger.error("未连接到设备")
-            return False, "未连接", ("", "")
-        for attempt in range(2): # Allow one retry
-            try:
-                self.last_sent_packet = b''
-                self.last_received_packet = b''
-                result = self.client.write_coils(address, values, slave=slave_id or self._slave_id)
-                sent = self.format_packet(self.last_sent_packet)
-                received = self.format_packet(self.last_received_packet)
-                if isinstance(result, (ModbusIOException, ExceptionResponse)):
-                    self.logger.error(f"写入多个线圈失败: {result}")
-                    if attempt == 0 and self._reconnect():
-                        continue # Retry after successful reconnect
-                    return False, str(result), (sent, received)
-                return True, "写入成功", (sent, received)
-            except ModbusIOException as e:
-                self.logger.error(f"写入多个线圈时发生 ModbusIOException: {e}")
-                if attempt == 0 and self._reconnect():
-                    continue # Retry after successful reconnect
-                return False, str(e), (self.format_packet(self.last_sent_packet), self.format_packet(self.last_received_packet))
-            except Exception as e:
-                self.logger.error(f"写入多个线圈时发生错误: {str(e)}")
-                return False, str(e), (self.format_packet(self.last_sent_packet), self.format_packet(self.last_received_packet))
+            return False, "未连接", (b'', b'')
+        try:
+            result, sent, received = self._execute(
+                lambda: self.client.write_coils(address, values, slave=slave_id or self._slave_id))
+            if isinstance(result, (ModbusIOException, ExceptionResponse)):
+                self.logger.error(f"写入多个线圈失败: {result}")
+                if isinstance(result, ModbusIOException):
+                    self._reconnect()
+                return False, str(result), (sent, received)
+            return True, "写入成功", (sent, received)
+        except ModbusIOException as e:
+            self.logger.error(f"写入多个线圈时发生 ModbusIOException: {e}")
+            self._reconnect()
+            return False, str(e), (self.last_sent_packet, self.last_received_packet)
+        except Exception as e:
+            self.logger.error(f"写入多个线圈时发生错误: {str(e)}")
+            return False, str(e), (self.last_sent_packet, self.last_received_packet)
+
+    def build_registers(self, values, data_type='UINT16', byte_order='big', word_order='big'):
+        """ 按数据类型和字节序/字序把数值编码为寄存器列表 """
+        return get_codec(data_type, byte_order, word_order).encode(values)
 
     def write_registers(self, address, values, slave_id=None, data_type='UINT16', byte_order='big', word_order='big'):
         if not self.client:
             self.logger.error("未连接到设备")
-            return False, "未连接", ("", "")
+            return False, "未连接", (b'', b'')
         
-        from pymodbus.payload import BinaryPayloadBuilder
-        from pymodbus.constants import Endian
+        registers_to_write = self.build_registers(values, data_type, byte_order, word_order)
 
-        byteorder_map = {'big': Endian.BIG, 'little': Endian.LITTLE}
-        wordorder_map = {'big': Endian.BIG, 'little': Endian.LITTLE}
-
-        builder = BinaryPayloadBuilder(
-            byteorder=byteorder_map[byte_order],
-            wordorder=wordorder_map[word_order]
-        )
+        try:
+            result, sent, received = self._execute(
+                lambda: self.client.write_registers(address, registers_to_write, slave=slave_id or self._slave_id))
+            if isinstance(result, (ExceptionResponse, ModbusIOException)):
+                self.logger.error(f"写入寄存器失败: {result}")
+                if isinstance(result, ModbusIOException):
+                    self._reconnect()
+                return False, str(result), (sent, received)
+            return True, "写入成功", (sent, received)
+        except ModbusIOException as e:
+            self.logger.error(f"写入寄存器时发生 ModbusIOException: {e}")
+            self._reconnect()
+            return False, str(e), (self.last_sent_packet, self.last_received_packet)
+        except Exception as e:
+            self.logger.error(f"写入寄存器时发生错误: {str(e)}")
+            return False, str(e), (self.last_sent_packet, self.last_received_packet)
 
-        # Dynamically call the correct builder method based on data_type
-        for value in values:
-            if data_type == 'INT16':
-                builder.add_16bit_int(value)
-            elif data_type == 'UINT16':
-                builder.add_16bit_uint(value)
-            elif data_type == 'INT32':
-                builder.add_32bit_int(value)
-            elif data_type == 'UINT32':
-                builder.add_32bit_uint(value)
-            elif data_type == 'INT64':
-                builder.add_64bit_int(value)
-            elif data_type == 'UINT64':
-                builder.add_64bit_uint(value)
-            elif data_type == 'FLOAT32':
-                builder.add_32bit_float(value)
-            elif data_type == 'FLOAT64':
-                builder.add_64bit_float(value)
-            elif data_type == 'ASCII':
-                 builder.add_string(value)
-            # Note: BYTE and BOOL are handled as lists of UINT16s/Coils, not here.
-
-        registers_to_write = builder.to_registers()
-
-        for attempt in range(2): # Allow one retry
-            try:
-                self.last_sent_packet = b''
-                self.last_received_packet = b''
-                
-                result = self.client.write_registers(address, registers_to_write, slave=slave_id or self._slave_id)
-                sent = self.format_packet(self.last_sent_packet)
-                received = self.format_packet(self.last_received_packet)
-
-                if isinstance(result, (ExceptionResponse, ModbusIOException)):
-                    self.logger.error(f"写入寄存器失败: {result}")
-                    if attempt == 0 and self._reconnect():
-                        continue # Retry after successful reconnect
-                    return False, str(result), (sent, received)
-                return True, "写入成功", (sent, received)
-            except ModbusIOException as e:
-                self.logger.error(f"写入寄存器时发生 ModbusIOException: {e}")
-                if attempt == 0 and self._reconnect():
-                    continue # Retry after successful reconnect
-                return False, str(e), (self.format_packet(self.last_sent_packet), self.format_packet(self.last_received_packet))
-            except Exception as e:
-                self.logger.error(f"写入寄存器时发生错误: {str(e)}")
-                return False, str(e), (self.format_packet(self.last_sent_packet), self.format_packet(self.last_received_packet))
+    def _read_registers(self, address, count, slave_id, data_type, read_name, byte_order, word_order):
+        if not self.client: return None, b'', b''
+        try:
+            # 重连后 self.client 是新对象，所以每次都按名字重新取读函数
+            result, sent, received = self._execute(
+                lambda: getattr(self.client, read_name)(address=address, count=count, slave=slave_id or self._slave_id))
+            if isinstance(result, (ModbusIOException, ExceptionResponse)):
+                self.logger.error(f"读取寄存器失败: {result}")
+                if isinstance(result, ModbusIOException):
+                    self._reconnect()
+                return None, sent, received
 
-    def _read_registers(self, address, count, slave_id, data_type, read_func, byte_order, word_order):
-        if not self.client: return None, "", ""
-        for attempt in range(2): # Allow one retry
-            try:
-                self.last_sent_packet = b''
-                self.last_received_packet = b''
-                result = read_func(address=address, count=count, slave=slave_id or self._slave_id)
-                sent = self.format_packet(self.last_sent_packet)
-                received = self.format_packet(self.last_received_packet)
-                if isinstance(result, (ModbusIOException, ExceptionResponse)):
-                    self.logger.error(f"读取寄存器失败: {result}")
-                    if attempt == 0 and self._reconnect():
-                        continue # Retry after successful reconnect
-                    return None, sent, received
-                
-                processed_result = self.process_data(result.registers, data_type, byte_order, word_order)
-                return processed_result, sent, received
-            except ModbusIOException as e:
-                self.logger.error(f"读取寄存器时发生 ModbusIOException: {e}")
-                if attempt == 0 and self._reconnect():
-                    continue # Retry after successful reconnect
-                return None, self.format_packet(self.last_sent_packet), self.format_packet(self.last_received_packet)
-            except Exception as e:
-                self.logger.error(f"读取寄存器时发生错误: {str(e)}")
-                return None, self.format_packet(self.last_sent_packet), self.format_packet(self.last_received_packet)
+            processed_result = self.process_data(result.registers, data_type, byte_order, word_order)
+            return processed_result, sent, received
+        except ModbusIOException as e:
+            self.logger.error(f"读取寄存器时发生 ModbusIOException: {e}")
+            self._reconnect()
+            return None, self.last_sent_packet, self.last_received_packet
+        except Exception as e:
+            self.logger.error(f"读取寄存器时发生错误: {str(e)}")
+            return None, self.last_sent_packet, self.last_received_packet
 
-    def _read_bits(self, address, count, slave_id, read_func):
-        if not self.client: return None, "", ""
+    def _read_bits(self, address, count, slave_id, read_name):
+        if not self.client: return None, b'', b''
         try:
-            self.last_sent_packet = b''
-            self.last_received_packet = b''
             # Explicitly name arguments to avoid positional argument confusion
-            result = read_func(address=address, count=count, slave=slave_id or self.slave_id)
-            sent = self.format_packet(self.last_sent_packet)
-            received = self.format_packet(self.last_received_packet)
-            if isinstance(result, ExceptionResponse):
+            result, sent, received = self._execute(
+                lambda: getattr(self.client, read_name)(address=address, count=count, slave=slave_id or self._slave_id))
+            if isinstance(result, (ModbusIOException, ExceptionResponse)):
+                if isinstance(result, ModbusIOException):
+                    self._reconnect()
                 return None, sent, received
             return result.bits, sent, received
+        except ModbusIOException as e:
+            self.logger.error(f"读取位时发生 ModbusIOException: {e}")
+            self._reconnect()
+            return None, self.last_sent_packet, self.last_received_packet
         except Exception as e:
             self.logger.error(f"读取位时发生错误: {str(e)}")
-            return None, self.format_packet(self.last_sent_packet), self.format_packet(self.last_received_packet)
+            return None, self.last_sent_packet, self.last_received_packet
 
     def format_packet(self, packet: bytes) -> str:
-        if not isinstance(packet, bytes):
+        """ 把原始报文渲染成 "01 03 ..." 形式，只在界面真正显示报文时调用 """
+        if not isinstance(packet, (bytes, bytearray, memoryview)):
             return str(packet)
-        return ' '.join(f'{b:02X}' for b in packet)
+        return packet.hex(' ').upper()
 
     def process_data(self, registers, data_type, byte_order='big', word_order='big'):
         try:
-            if not registers: return []
-
-            from pymodbus.payload import BinaryPayloadDecoder
-            from pymodbus.constants import Endian
-
-            byteorder_map = {'big': Endian.BIG, 'little': Endian.LITTLE}
-            
-            # Manual word swapping for multi-register values
-            if word_order == 'little':
-                num_regs_per_val = 1
-                if data_type in ['INT32', 'UINT32', 'FLOAT32']:
-                    num_regs_per_val = 2
-                elif data_type in ['INT64', 'UINT64', 'FLOAT64']:
-                    num_regs_per_val = 4
-                
-                if num_regs_per_val > 1:
-                    swapped_registers = []
-                    for i in range(0, len(registers), num_regs_per_val):
-                        chunk = registers[i:i+num_regs_per_val]
-                        swapped_registers.extend(chunk[::-1])
-                    registers = swapped_registers
-
-            # After manual swapping, we tell the decoder the word order is standard.
-            decoder = BinaryPayloadDecoder.fromRegisters(
-                registers,
-                byteorder=byteorder_map[byte_order],
-                wordorder=Endian.BIG 
-            )
-
-            if data_type == 'BOOL':
-                return [bool(register & (1 << i)) for register in registers for i in range(16)]
-            elif data_type == 'BYTE':
-                byte_values = []
-                for reg in registers:
-                    if byte_order == 'big':
-                        byte_values.append((reg >> 8) & 0xFF)
-                        byte_values.append(reg & 0xFF)
-                    else:
-                        byte_values.append(reg & 0xFF)
-                        byte_values.append((reg >> 8) & 0xFF)
-                return byte_values
-            elif data_type == 'ASCII':
-                char_list = []
-                for register in registers:
-                    if byte_order == 'big':
-                        char_list.append(chr((register >> 8) & 0xFF))
-                        char_list.append(chr(register & 0xFF))
-                    else:
-                        char_list.append(chr(register & 0xFF))
-                        char_list.append(chr((register >> 8) & 0xFF))
-                return [''.join(char_list).rstrip('\x00')]
-            elif data_type == 'INT16':
-                return [decoder.decode_16bit_int() for _ in range(len(registers))]
-            elif data_type == 'UINT16':
-                return [decoder.decode_16bit_uint() for _ in range(len(registers))]
-            elif data_type == 'INT32':
-                return [decoder.decode_32bit_int() for _ in range(len(registers) // 2)]
-            elif data_type == 'UINT32':
-                return [decoder.decode_32bit_uint() for _ in range(len(registers) // 2)]
-            elif data_type == 'INT64':
-                return [decoder.decode_64bit_int() for _ in range(len(registers) // 4)]
-            elif data_type == 'UINT64':
-                return [decoder.decode_64bit_uint() for _ in range(len(registers) // 4)]
-            elif data_type == 'FLOAT32':
-                return [decoder.decode_32bit_float() for _ in range(len(registers) // 2)]
-            elif data_type == 'FLOAT64':
-                return [decoder.decode_64bit_float() for _ in range(len(registers) // 4)]
-            elif data_type == 'UNIX_TIMESTAMP':
-                if len(registers) >= 2:
-                    timestamp = decoder.decode_32bit_uint()
-                    try:
-                        dt = datetime.fromtimestamp(timestamp)
-                        return [dt.strftime('%Y-%m-%d %H:%M:%S')]
-                    except (ValueError, OSError):
-                        return [f"无效时间戳: {timestamp}"]
-                else:
-                    return ["时间戳数据不足"]
-            else:
-                self.logger.warning(f"未知的数据类型: {data_type}，返回原始数据")
-                return registers
-
+            codec = get_codec(data_type, byte_order, word_order)
+        except ValueError:
+            self.logger.warning(f"未知的数据类型: {data_type}，返回原始数据")
+            return registers
+        try:
+            return codec.decode(registers)
         except Exception as e:
             self.logger.error(f"处理数据时发生错误: {str(e)}")
             return registers
 
     def read_holding_registers(self, address, count, slave_id=None, data_type='UINT16', byte_order='big', word_order='big'):
-        return self._read_registers(address, count, slave_id, data_type, self.client.read_holding_registers, byte_order, word_order)
+        return self._read_registers(address, count, slave_id, data_type, 'read_holding_registers', byte_order, word_order)
 
     def read_input_registers(self, address, count, slave_id=None, data_type='UINT16', byte_order='big', word_order='big'):
-        return self._read_registers(address, count, slave_id, data_type, self.client.read_input_registers, byte_order, word_order)
+        return self._read_registers(address, count, slave_id, data_type, 'read_input_registers', byte_order, word_order)
 
     def read_coils(self, address, count, slave_id=None):
-        return self._read_bits(address, count, slave_id, self.client.read_coils)
+        return self._read_bits(address, count, slave_id, 'read_coils')
 
     def read_discrete_inputs(self, address, count, slave_id=None):
-        return self._read_bits(address, count, slave_id, self.client.read_discrete_inputs)
+        return self._read_bits(address, count, slave_id, 'read_discrete_inputs')
 
     def report_slave_id(self, slave_id=None):
         if not self.client:
-            return None, "", ""
+            return None, b'', b''
         try:
-            self.last_sent_packet = b''
-            self.last_received_packet = b''
-            result = self.client.report_slave_id(slave=slave_id or self._slave_id)
-            sent = self.format_packet(self.last_sent_packet)
-            received_raw = self.last_received_packet
+            result, sent, received_raw = self._execute(
+                lambda: self.client.report_slave_id(slave=slave_id or self._slave_id))
 
             if isinstance(result, (ModbusIOException, ExceptionResponse)):
                 self.logger.error(f"FC11H Modbus error: {result}")
-                return None, sent, self.format_packet(received_raw)
+                return None, sent, received_raw
 
-            # --- Direct and Final Parsing of Raw Response Bytes ---
-            # This method is independent of the pymodbus object structure.
-            # Response structure: MBAP(7 bytes) + PDU(variable)
-            # PDU: Func Code(1) + Byte Count(1) + Data(N)
+            info_list = self.parse_report_slave_id(received_raw)
+            return info_list, sent, received_raw
             
-            if not received_raw or len(received_raw) < 9: # Min length for MBAP + Func Code + Byte Count
-                raise ValueError(f"Invalid or empty response packet: {received_raw}")
-
+        except Exception as e:
+            self.logger.error(f"FC11H (report_slave_id) operation failed: {str(e)}")
+            return None, self.last_sent_packet, self.last_received_packet
+
+    def parse_report_slave_id(self, received_raw):
+        """ Parse a raw FC11H response frame into a list of readable lines. """
+        # --- Direct and Final Parsing of Raw Response Bytes ---
+        # This method is independent of the pymodbus object structure.
+        # Response structure: MBAP(7 bytes) + PDU(variable)
+        # PDU: Func Code(1) + Byte Count(1) + Data(N)
+
+        if self._connection_type == "rtu":
+            # RTU: Slave Addr(1) + PDU + CRC(2)
+            pdu = received_raw[1:-2]
+        else:
             pdu = received_raw[7:] # Skip MBAP header
-            byte_count = pdu[1]
-            
-            if len(pdu) - 2 != byte_count:
-                raise ValueError(f"Byte count mismatch in PDU. Expected {byte_count}, got {len(pdu) - 2}")
+        if len(pdu) < 2: # Min length for Func Code + Byte Count
+            raise ValueError(f"Invalid or empty response packet: {received_raw}")
 
-            info_list = []
-            
-            reported_slave_id = pdu[2]
-            run_status_byte = pdu[3]
-            vendor_data = pdu[4:]
+        byte_count = pdu[1]
 
-            info_list.append(f"Function Code: {pdu[0]} (Report Slave ID)")
-            info_list.append(f"Byte Count: {byte_count}")
-            info_list.append(f"Slave ID (from PDU): {reported_slave_id}")
-            info_list.append(f"Run Status: {'ON' if run_status_byte == 0xFF else 'OFF'}")
+        if len(pdu) - 2 != byte_count:
+            raise ValueError(f"Byte count mismatch in PDU. Expected {byte_count}, got {len(pdu) - 2}")
 
-            # Attempt to find a readable ASCII string within the vendor data
-            try:
-                import re
-                matches = re.findall(b"([ -~]{4,})", vendor_data)
-                ascii_parts = [m.decode('ascii') for m in matches]
-                if ascii_parts:
-                    info_list.append(f"Vendor/Model (ASCII): {', '.join(ascii_parts)}")
-            except Exception as e:
-                self.logger.warning(f"Could not parse ASCII from vendor info: {e}")
+        info_list = []
 
-            hex_data = ' '.join(f'{b:02X}' for b in vendor_data)
-            info_list.append(f"Vendor Specific Data (Hex): {hex_data}")
+        reported_slave_id = pdu[2]
+        run_status_byte = pdu[3]
+        vendor_data = pdu[4:]
 
-            return info_list, sent, self.format_packet(received_raw)
-            
+        info_list.append(f"Function Code: {pdu[0]} (Report Slave ID)")
+        info_list.append(f"Byte Count: {byte_count}")
+        info_list.append(f"Slave ID (from PDU): {reported_slave_id}")
+        info_list.append(f"Run Status: {'ON' if run_status_byte == 0xFF else 'OFF'}")
+
+        # Attempt to find a readable ASCII string within the vendor data
+        try:
+            import re
+            matches = re.findall(b"([ -~]{4,})", vendor_data)
+            ascii_parts = [m.decode('ascii') for m in matches]
+            if ascii_parts:
+                info_list.append(f"Vendor/Model (ASCII): {', '.join(ascii_parts)}")
         except Exception as e:
-            self.logger.error(f"FC11H (report_slave_id) operation failed: {str(e)}")
-            return None, self.format_packet(self.last_sent_packet), self.format_packet(self.last_received_packet)
+            self.logger.warning(f"Could not parse ASCII from vendor info: {e}")
+
+        hex_data = ' '.join(f'{b:02X}' for b in vendor_data)
+        info_list.append(f"Vendor Specific Data (Hex): {hex_data}")
+
+        return info_list
 
     def read_write_multiple_registers(self, read_address, read_count, write_address, write_registers, slave_id=None, data_type='UINT16', byte_order='big', word_order='big'):
         if not self.client:
-            return None, "", ""
+            return None, b'', b''
         try:
-            self.last_sent_packet = b''
-            self.last_received_packet = b''
             # Explicitly name arguments to avoid positional argument confusion
-            result = self.client.read_write_multiple_registers(
-                read_address=read_address,
-                read_count=read_count,
-                write_address=write_address,
-                write_registers=write_registers,
-                slave=slave_id or self._slave_id
-            )
-            sent = self.format_packet(self.last_sent_packet)
-            received = self.format_packet(self.last_received_packet)
+            result, sent, received = self._execute(
+                lambda: self.client.readwrite_registers(
+                    read_address=read_address,
+                    read_count=read_count,
+                    write_address=write_address,
+                    values=write_registers,
+                    slave=slave_id or self._slave_id
+                ))
             if isinstance(result, (ModbusIOException, ExceptionResponse)):
                 return None, sent, received
-            
-            from data_processor import DataProcessor, ByteOrder, WordOrder
-            dp = DataProcessor()
-            processed_result = dp.process_data(result.registers, data_type, ByteOrder(byte_order), WordOrder(word_order))
+
+            processed_result = self.process_data(result.registers, data_type, byte_order, word_order)
             return processed_result, sent, received
         except Exception as e:
             self.logger.error(f"FC23 (read_write_multiple_registers) 操作时发生错误: {str(e)}")
-            return None, self.format_packet(self.last_sent_packet), self.format_packet(self.last_received_packet)
+            return None, self.last_sent_packet, self.last_received_packet
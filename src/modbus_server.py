@@ -1,22 +1,331 @@
+import argparse
+import asyncio
+import json
+import math
+import random
 import sys
-from pymodbus.server import StartTcpServer
-from pymodbus.datastore import ModbusSlaveContext, ModbusServerContext
+from pymodbus.server import ModbusTcpServer
+from pymodbus.server.async_io import ModbusServerRequestHandler
+from pymodbus.datastore import ModbusSlaveContext, ModbusServerContext, ModbusSequentialDataBlock
+from codec import STRUCT_CODES, get_codec
+from subnet_scanner import parse_ports
 
-def run_server(host='0.0.0.0', port=502):
-    # 创建一个数据存储
-    store = ModbusSlaveContext()
-    context = ModbusServerContext(slaves=store, single=True)
+# 点表文件里的寄存器表名 -> ModbusSlaveContext.setValues 使用的功能码
+TABLE_FUNCTION_CODES = {'co': 1, 'di': 2, 'hr': 3, 'ir': 4}
+BIT_TABLES = ('co', 'di')
+DEFAULT_TABLE_SIZE = 10000
 
-    print(f"Starting Modbus TCP Server on {host}:{port}...")
+
+def run_server(host='0.0.0.0', port=502, map_file=None, faults=None):
+    """ faults 是故障注入规则列表，点表文件里的 "faults" 会追加在后面 """
+    faults = list(faults or [])
+    simulator = None
+    if map_file:
+        simulator = Simulator.from_file(map_file)
+        faults.extend(simulator.faults)
+        context = simulator.context
+        print(f"Starting Modbus TCP Simulator on {host}:{port} "
+              f"({len(simulator.units)} units, {len(simulator.points)} generated points)...")
+    else:
+        # 创建一个数据存储
+        store = ModbusSlaveContext()
+        context = ModbusServerContext(slaves=store, single=True)
+        print(f"Starting Modbus TCP Server on {host}:{port}...")
+    injector = FaultInjector(faults) if faults else None
+    if injector:
+        print(f"Fault injection: {len(injector.rules)} rules")
     try:
-        StartTcpServer(
-            context=context,
-            address=(host, port)
-        )
+        asyncio.run(serve(context, host, port, simulator, injector))
+    except KeyboardInterrupt:
+        pass
     except Exception as e:
         print(f"Error starting server: {e}")
         print("If using port 502, try running with sudo.")
         sys.exit(1)
+    finally:
+        if injector:
+            print(injector.format_stats())
+
+
+async def serve(context, host='0.0.0.0', port=502, simulator=None, injector=None):
+    server = FaultInjectingTcpServer(context, address=(host, port), injector=injector)
+    ticker = asyncio.create_task(simulator.run_ticks()) if simulator else None
+    try:
+        await server.serve_forever()
+    finally:
+        if ticker:
+            ticker.cancel()
+        await server.shutdown()
+
+
+class FaultRule:
+    """ 一条故障注入规则，units/function_codes 为空时匹配全部。
+
+    latency(+latency_jitter) 秒后才处理请求；drop 概率不回应；truncate 概率只发回被截断的报文；
+    exception 为强制返回的异常码(exception_rate 概率)；disconnect_after 每条连接第 N 个匹配请求时断开。
+    """
+    def __init__(self, spec):
+        self.units = set(parse_ports(spec['units'])) if spec.get('units') not in (None, '') else None
+        function_codes = spec.get('function_codes')
+        if isinstance(function_codes, (str, int)):
+            function_codes = parse_ports(function_codes)
+        self.function_codes = set(function_codes) if function_codes else None
+        self.latency = spec.get('latency', 0)
+        self.latency_jitter = spec.get('latency_jitter', 0)
+        self.drop = spec.get('drop', 0)
+        self.truncate = spec.get('truncate', 0)
+        self.exception = spec.get('exception')
+        self.exception_rate = spec.get('exception_rate', 1.0)
+        self.disconnect_after = spec.get('disconnect_after')
+
+    def matches(self, unit_id, function_code):
+        return ((self.units is None or unit_id in self.units)
+                and (self.function_codes is None or function_code in self.function_codes))
+
+
+class FaultInjector:
+    """ 按 (从站, 功能码) 匹配第一条规则，并统计每种故障注入的次数 """
+    def __init__(self, rules):
+        self.rules = [rule if isinstance(rule, FaultRule) else FaultRule(rule) for rule in rules]
+        self.stats = {}
+
+    def match(self, unit_id, function_code):
+        for index, rule in enumerate(self.rules):
+            if rule.matches(unit_id, function_code):
+                return index, rule
+        return None, None
+
+    def count(self, unit_id, function_code, event):
+        key = (unit_id, function_code)
+        counters = self.stats.get(key)
+        if counters is None:
+            counters = self.stats[key] = dict.fromkeys(
+                ('requests', 'delayed', 'dropped', 'truncated', 'exceptions', 'disconnects'), 0)
+        counters[event] += 1
+
+    def format_stats(self):
+        lines = ["unit  fc  requests  delayed  dropped  truncated  exceptions  disconnects"]
+        for (unit_id, function_code), c in sorted(self.stats.items()):
+            lines.append(f"{unit_id:>4} {function_code:>3} {c['requests']:>9} {c['delayed']:>8} {c['dropped']:>8} "
+                         f"{c['truncated']:>10} {c['exceptions']:>11} {c['disconnects']:>12}")
+        return '\n'.join(lines)
+
+
+class FaultInjectingRequestHandler(ModbusServerRequestHandler):
+    """ 在 pymodbus 的请求处理前后注入延迟、丢包、截断、异常码和断线。
+
+    每个请求都在自己的协程里执行，注入的延迟不会阻塞其他连接和同一连接上的其他请求。
+    """
+    def __init__(self, owner):
+        super().__init__(owner)
+        self.rule_requests = {}
+
+    async def _async_execute(self, request, *addr):
+        injector = self.server.injector
+        if injector is None:
+            return await super()._async_execute(request, *addr)
+        unit_id, function_code = request.slave_id, request.function_code
+        injector.count(unit_id, function_code, 'requests')
+        index, rule = injector.match(unit_id, function_code)
+        if rule is None:
+            return await super()._async_execute(request, *addr)
+        if rule.disconnect_after:
+            self.rule_requests[index] = self.rule_requests.get(index, 0) + 1
+            if self.rule_requests[index] >= rule.disconnect_after:
+                injector.count(unit_id, function_code, 'disconnects')
+                self.rule_requests[index] = 0
+                self.close()
+                return
+        if rule.latency or rule.latency_jitter:
+            injector.count(unit_id, function_code, 'delayed')
+            await asyncio.sleep(rule.latency + random.uniform(0, rule.latency_jitter))
+        if rule.drop and random.random() < rule.drop:
+            injector.count(unit_id, function_code, 'dropped')
+            return
+        if rule.exception is not None and random.random() < rule.exception_rate:
+            injector.count(unit_id, function_code, 'exceptions')
+            response = request.doException(rule.exception)
+            response.transaction_id = request.transaction_id
+            response.slave_id = request.slave_id
+            self.server_send(response, *addr)
+            return
+        await super()._async_execute(request, *addr)
+
+    def server_send(self, message, addr, **kwargs):
+        injector = self.server.injector
+        if injector is not None and message.should_respond and not kwargs.get("skip_encoding", False):
+            function_code = message.function_code & 0x7F
+            _, rule = injector.match(message.slave_id, function_code)
+            if rule is not None and rule.truncate and random.random() < rule.truncate:
+                injector.count(message.slave_id, function_code, 'truncated')
+                packet = self.framer.buildPacket(message)
+                self.send(packet[:random.randint(1, len(packet) - 1)], addr=addr)
+                return
+        super().server_send(message, addr, **kwargs)
+
+
+class FaultInjectingTcpServer(ModbusTcpServer):
+    """ 没有规则时与 ModbusTcpServer 行为相同 """
+    def __init__(self, context, injector=None, **kwargs):
+        super().__init__(context, **kwargs)
+        self.injector = injector
+
+    def callback_new_connection(self):
+        return FaultInjectingRequestHandler(self)
+
+
+class ValueGenerator:
+    """ 每个 tick 产生一个新值: ramp 锯齿、noise 随机噪声、counter 计数、sine 正弦、toggle 翻转 """
+    def __init__(self, spec, value=0, tick=1.0):
+        self.type = spec.get('type', 'ramp')
+        if self.type not in ('ramp', 'noise', 'counter', 'sine', 'toggle'):
+            raise ValueError(f"未知的生成器类型: {self.type}")
+        self.spec = spec
+        self.value = value
+        self.tick = tick
+        self.ticks = 0
+
+    def next(self):
+        spec = self.spec
+        self.ticks += 1
+        if self.type == 'ramp':
+            low, high = spec.get('min', 0), spec.get('max', 100)
+            self.value += spec.get('step', 1)
+            if self.value > high:
+                self.value = low
+        elif self.type == 'noise':
+            amplitude = spec.get('amplitude', 1)
+            self.value = spec.get('center', 0) + random.uniform(-amplitude, amplitude)
+        elif self.type == 'counter':
+            self.value += spec.get('step', 1)
+        elif self.type == 'sine':
+            phase = 2 * math.pi * self.ticks * self.tick / spec.get('period', 60)
+            self.value = spec.get('center', 0) + spec.get('amplitude', 1) * math.sin(phase)
+        else:
+            self.value = not self.value
+        return self.value
+
+
+class SimulatedPoint:
+    """ 一个点位在某个从站上的生成器和编码方式 """
+    def __init__(self, context, table, address, data_type, byte_order, word_order, generator):
+        self.context = context
+        self.function_code = TABLE_FUNCTION_CODES[table]
+        self.is_bit = table in BIT_TABLES
+        self.address = address
+        self.data_type = data_type
+        self.codec = None if self.is_bit else get_codec(data_type, byte_order, word_order)
+        self.generator = generator
+
+    def encode(self, value):
+        if self.is_bit:
+            return [bool(value)]
+        if self.data_type in STRUCT_CODES and STRUCT_CODES[self.data_type][0] not in 'fd':
+            # 整数类型按位宽回绕，计数器溢出后从头开始
+            code, width = STRUCT_CODES[self.data_type]
+            bits = 16 * width
+            value = int(round(value)) % (1 << bits)
+            if code.islower() and value >= 1 << (bits - 1):
+                value -= 1 << bits
+        elif self.data_type == 'UNIX_TIMESTAMP':
+            value = int(value)
+            return [(value >> 16) & 0xFFFF, value & 0xFFFF]
+        return self.codec.encode([value])
+
+    def update(self):
+        self.context.setValues(self.function_code, self.address, self.encode(self.generator.next()))
+
+
+class Simulator:
+    """ 从 JSON 点表文件加载的 Modbus TCP 仿真服务器。
+
+    一个 ModbusServerContext 里放多个从站，地址不做 +1 偏移(zero_mode)，与点表一致；
+    运行在 asyncio 上，可以同时接受几百个客户端连接，每个 tick 由生成器更新点位值。
+    """
+    def __init__(self, spec):
+        self.tick = spec.get('tick', 1.0)
+        self.units = {}
+        self.points = []
+        for unit_ids, unit_spec in spec.get('units', {'1': {}}).items():
+            ids = parse_ports(unit_ids)  # "1-10,20" 写法与端口列表相同
+            if unit_spec.get('shared', False):
+                # 一组从站共用一份数据，适合上百个从站的负载测试
+                context = self._build_context(unit_spec)
+                self.units.update((unit_id, context) for unit_id in ids)
+            else:
+                self.units.update((unit_id, self._build_context(unit_spec)) for unit_id in ids)
+        for point_spec in spec.get('points', []):
+            self._add_point(point_spec)
+        self.faults = spec.get('faults', [])
+        self.context = ModbusServerContext(slaves=self.units, single=False)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    @staticmethod
+    def _build_context(unit_spec):
+        size = unit_spec.get('size', DEFAULT_TABLE_SIZE)
+        blocks = {}
+        for table in TABLE_FUNCTION_CODES:
+            values = [False] * size if table in BIT_TABLES else [0] * size
+            # 初始值: {"地址": 值或寄存器列表}
+            for address, initial in unit_spec.get(table, {}).items():
+                initial = initial if isinstance(initial, list) else [initial]
+                values[int(address):int(address) + len(initial)] = initial
+            blocks[table] = ModbusSequentialDataBlock(0, values[:size])
+        return ModbusSlaveContext(zero_mode=True, **blocks)
+
+    def _add_point(self, spec):
+        table = spec.get('table', 'hr')
+        if table not in TABLE_FUNCTION_CODES:
+            raise ValueError(f"未知的寄存器表: {table}")
+        unit_ids = parse_ports(spec['units']) if 'units' in spec else list(self.units)
+        contexts = {id(self.units[unit_id]): self.units[unit_id] for unit_id in unit_ids if unit_id in self.units}
+        for context in contexts.values():
+            point = SimulatedPoint(
+                context, table, int(spec['address']), spec.get('data_type', 'UINT16').upper(),
+                spec.get('byte_order', 'big'), spec.get('word_order', 'big'),
+                ValueGenerator(spec.get('generator', {'type': 'ramp'}), spec.get('value', 0), self.tick)
+            )
+            context.setValues(point.function_code, point.address, point.encode(point.generator.value))
+            if 'generator' in spec:
+                self.points.append(point)
+
+    def update(self):
+        for point in self.points:
+            point.update()
+
+    async def run_ticks(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            self.update()
+
+    async def serve(self, host='0.0.0.0', port=502):
+        await serve(self.context, host, port, self, FaultInjector(self.faults) if self.faults else None)
+
 
 if __name__ == "__main__":
-    run_server()
\ No newline at end of file
+    # 用法: python modbus_server.py [端口] [地址] [--map 点表.json]，可以在多个本地端口上各起一个用于测试
+    # 故障注入: python modbus_server.py 5020 --units 1 --function-codes 3 --drop 0.1 --latency 0.05
+    parser = argparse.ArgumentParser(description="Modbus TCP 测试服务器/仿真器")
+    parser.add_argument('port', nargs='?', type=int, default=502)
+    parser.add_argument('host', nargs='?', default='0.0.0.0')
+    parser.add_argument('--map', dest='map_file', help="JSON 点表文件，提供后以仿真器模式运行")
+    faults = parser.add_argument_group("故障注入(也可以写在点表文件的 faults 列表里)")
+    faults.add_argument('--units', help="只对这些从站注入，例如 1-5,7")
+    faults.add_argument('--function-codes', help="只对这些功能码注入，例如 3,16")
+    faults.add_argument('--latency', type=float, default=0, help="附加延迟(秒)")
+    faults.add_argument('--latency-jitter', type=float, default=0, help="附加的随机延迟上限(秒)")
+    faults.add_argument('--drop', type=float, default=0, help="不回应的概率")
+    faults.add_argument('--truncate', type=float, default=0, help="只发回被截断报文的概率")
+    faults.add_argument('--exception', type=int, help="强制返回的异常码")
+    faults.add_argument('--exception-rate', type=float, default=1.0, help="返回异常码的概率")
+    faults.add_argument('--disconnect-after', type=int, help="每条连接每 N 个请求断开一次")
+    args = parser.parse_args()
+    rule = {key: getattr(args, key) for key in ('units', 'function_codes', 'latency', 'latency_jitter', 'drop',
+                                                 'truncate', 'exception', 'exception_rate', 'disconnect_after')}
+    injecting = any((args.latency, args.latency_jitter, args.drop, args.truncate,
+                     args.exception is not None, args.disconnect_after))
+    run_server(args.host, args.port, args.map_file, [rule] if injecting else None)
@@ -0,0 +1,111 @@
+#大牛大巨婴
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+from datetime import datetime
+
+# 文件格式: 文件头 CAPTURE_MAGIC，之后是连续的记录
+# 记录: RECORD_HEADER(时间戳 ns, 链路类型, 发送长度, 接收长度) + 发送报文 + 接收报文
+CAPTURE_MAGIC = b'MBCAP\x00\x01\x00'
+RECORD_HEADER = struct.Struct('<QBHH')
+CAPTURE_SUFFIX = '.mbcap'
+
+LINK_UNKNOWN = 0
+LINK_TCP = 1
+LINK_RTU = 2
+LINK_TYPES = {'tcp': LINK_TCP, 'rtu': LINK_RTU}
+
+
+class PacketCaptureWriter:
+    """ 把每一对请求/响应写入紧凑的二进制抓包文件。
+
+    写文件在后台线程完成，I/O 路径上只做一次入队；文件按报文数量或大小轮换。
+    队列满时丢弃新记录而不是阻塞通信，丢弃数量记录在 dropped 中。
+    """
+    def __init__(self, log_dir, max_packets_per_file=256, max_bytes_per_file=16 * 1024 * 1024, queue_size=10000):
+        self.logger = logging.getLogger(__name__)
+        self.log_dir = log_dir
+        self.max_packets_per_file = max_packets_per_file
+        self.max_bytes_per_file = max_bytes_per_file
+        self.current_log_file = None
+        self.packet_count = 0
+        self.dropped = 0
+        self._file = None
+        self._file_bytes = 0
+        self._sequence = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="packet-capture", daemon=True)
+        self._thread.start()
+
+    def write(self, sent, received, link=LINK_UNKNOWN):
+        try:
+            self._queue.put_nowait((time.time_ns(), link, bytes(sent), bytes(received)))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                # 空闲时才刷盘，繁忙时依靠文件缓冲批量写入
+                if self._file:
+                    self._file.flush()
+                continue
+            if item is None:
+                break
+            try:
+                self._write_record(*item)
+            except OSError as e:
+                self.logger.error(f"写入抓包文件失败: {str(e)}")
+        self._close_file()
+
+    def _write_record(self, timestamp, link, sent, received):
+        if (self._file is None or self.packet_count >= self.max_packets_per_file
+                or self._file_bytes >= self.max_bytes_per_file):
+            self._rotate()
+        self._file.write(RECORD_HEADER.pack(timestamp, link, len(sent), len(received)))
+        self._file.write(sent)
+        self._file.write(received)
+        self.packet_count += 1
+        self._file_bytes += RECORD_HEADER.size + len(sent) + len(received)
+
+    def _rotate(self):
+        self._close_file()
+        os.makedirs(self.log_dir, exist_ok=True)
+        self._sequence += 1
+        name = f"capture_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{self._sequence:04d}{CAPTURE_SUFFIX}"
+        self.current_log_file = os.path.join(self.log_dir, name)
+        self._file = open(self.current_log_file, 'wb', buffering=64 * 1024)
+        self._file.write(CAPTURE_MAGIC)
+        self._file_bytes = len(CAPTURE_MAGIC)
+        self.packet_count = 0
+
+    def _close_file(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def read_capture(path):
+    """ 逐条读取抓包文件，产出 (时间戳 ns, 链路类型, 发送报文, 接收报文) """
+    with open(path, 'rb') as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError(f"不是有效的抓包文件: {path}")
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            timestamp, link, sent_len, received_len = RECORD_HEADER.unpack(header)
+            sent = f.read(sent_len)
+            received = f.read(received_len)
+            if len(received) < received_len:
+                return  # 写入中断造成的残缺记录
+            yield timestamp, link, sent, received
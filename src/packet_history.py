@@ -0,0 +1,119 @@
+#大牛大巨婴
+import logging
+import time
+from collections import deque
+from datetime import datetime
+
+# 每条记录除报文本身以外的大致内存开销(对象头、deque 槽位等)
+RECORD_OVERHEAD = 128
+
+
+def to_bytes(packet):
+    """ 兼容旧接口: 报文可能已经被格式化成 "01 03 ..." 形式的字符串 """
+    if isinstance(packet, (bytes, bytearray, memoryview)):
+        return bytes(packet)
+    try:
+        return bytes.fromhex(packet or '')
+    except ValueError:
+        return str(packet).encode('utf-8', 'replace')
+
+
+class PacketRecord:
+    """ 一次收发: 单调时钟时间戳 + 原始报文 """
+    __slots__ = ('timestamp', 'operation', 'sent', 'received')
+
+    def __init__(self, timestamp, operation, sent, received):
+        self.timestamp = timestamp
+        self.operation = operation
+        self.sent = sent
+        self.received = received
+
+    @property
+    def size(self):
+        return len(self.sent) + len(self.received) + RECORD_OVERHEAD
+
+
+class PacketHistory:
+    """ 有上限的报文历史，界面的报文显示、复制和导出都从这里读取。
+
+    超过 max_entries 条或 max_bytes 字节时自动丢弃最早的记录；
+    如果配置了 spill_file，被丢弃的记录会先追加写入该文件。
+    """
+    def __init__(self, max_entries=10000, max_bytes=16 * 1024 * 1024, spill_file=None):
+        self.logger = logging.getLogger(__name__)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.spill_file = spill_file
+        self._spill = None
+        self._records = deque()
+        self._bytes = 0
+        # 单调时钟不受系统对时影响，显示时再换算成墙上时间
+        self._wall_offset_ns = time.time_ns() - time.monotonic_ns()
+
+    def append(self, operation, sent, received):
+        record = PacketRecord(time.monotonic_ns(), operation, to_bytes(sent), to_bytes(received))
+        self._records.append(record)
+        self._bytes += record.size
+        while self._records and (len(self._records) > self.max_entries or self._bytes > self.max_bytes):
+            self._evict()
+        return record
+
+    def _evict(self):
+        record = self._records.popleft()
+        self._bytes -= record.size
+        if self.spill_file:
+            self._spill_record(record)
+
+    def _spill_record(self, record):
+        try:
+            if self._spill is None:
+                self._spill = open(self.spill_file, 'a', encoding='utf-8')
+            self._spill.write(self.format_line(record))
+        except OSError as e:
+            self.logger.error(f"写入报文溢出文件失败: {str(e)}")
+            self.spill_file = None
+
+    def format_time(self, record):
+        wall = datetime.fromtimestamp((record.timestamp + self._wall_offset_ns) / 1e9)
+        return wall.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+    def header(self, record):
+        """ 报文显示区每条记录的标题行: 时间 + 操作 """
+        return f"{self.format_time(record)} {record.operation}"
+
+    def format_line(self, record):
+        """ 溢出文件和导出文件的一行: 时间、操作、发送报文、接收报文，以制表符分隔 """
+        return (f"{self.format_time(record)}\t{record.operation}\t"
+                f"{record.sent.hex(' ').upper()}\t{record.received.hex(' ').upper()}\n")
+
+    def to_text(self):
+        """ 复制到剪贴板用的文本，每条记录一组发送/接收报文 """
+        return '\n'.join(f"{self.header(record)}\n发送: {record.sent.hex(' ').upper()}\n"
+                         f"接收: {record.received.hex(' ').upper()}\n" for record in self._records)
+
+    def export(self, path):
+        """ 把当前保留的全部记录写入文件，返回写入的条数 """
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("时间\t操作\t发送\t接收\n")
+            for record in self._records:
+                f.write(self.format_line(record))
+        return len(self._records)
+
+    @property
+    def total_bytes(self):
+        return self._bytes
+
+    def clear(self):
+        self._records.clear()
+        self._bytes = 0
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records)
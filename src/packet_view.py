@@ -0,0 +1,49 @@
+#大牛大巨婴
+import re
+from PyQt6.QtCore import QEvent
+from PyQt6.QtGui import QColor, QPalette, QSyntaxHighlighter, QTextCharFormat
+from PyQt6.QtWidgets import QApplication, QPlainTextEdit
+
+# 每条报文在文档中占三行: 时间戳、十六进制数据、空行
+LINES_PER_ENTRY = 3
+HEADER_PATTERN = re.compile(r"^\[?\d{4}-\d{2}-\d{2} ")
+
+
+class PacketHighlighter(QSyntaxHighlighter):
+    """ 给时间戳行上色，颜色跟随当前调色板。 """
+    def __init__(self, document):
+        super().__init__(document)
+        self.time_format = QTextCharFormat()
+        self.update_palette(rehighlight=False)
+
+    def update_palette(self, rehighlight=True):
+        palette = QApplication.palette()
+        is_dark_mode = palette.color(QPalette.ColorRole.Window).lightness() < 128
+        if is_dark_mode:
+            self.time_format.setForeground(QColor(0, 255, 255))  # 深色模式使用青色
+        else:
+            self.time_format.setForeground(QColor("blue"))  # 浅色模式使用蓝色
+        if rehighlight:
+            self.rehighlight()
+
+    def highlightBlock(self, text):
+        if HEADER_PATTERN.match(text):
+            self.setFormat(0, len(text), self.time_format)
+
+
+class PacketView(QPlainTextEdit):
+    """ 只追加的报文显示区，超过 max_entries 条时由文档自动丢弃最早的内容。 """
+    def __init__(self, max_entries=1000, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setMaximumBlockCount(max_entries * LINES_PER_ENTRY)
+        self.highlighter = PacketHighlighter(self.document())
+
+    def append_packet(self, header, packet):
+        # appendPlainText 只处理新增的块，滚动条在底部时会自动跟随
+        self.appendPlainText(f"{header}\n{packet}\n")
+
+    def changeEvent(self, event):
+        if event.type() == QEvent.Type.PaletteChange:
+            self.highlighter.update_palette()
+        super().changeEvent(event)
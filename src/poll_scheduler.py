@@ -0,0 +1,199 @@
+#大牛大巨婴
+# 多速率轮询: 每个轮询组有自己的周期，同一时刻到期的组合并到一个总线窗口里，按合并后的读计划一起读取
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import reduce
+from read_planner import ReadPlanner, range_tags
+from tag_database import (COLUMN_ALIASES, REGISTER_TYPE_ALIASES, BYTE_ORDER_ALIASES, WORD_ORDER_ALIASES,
+                          TagDatabase, read_rows)
+
+# 轮询组文件的列名，地址和数量表示组的起始地址和值的个数，周期单位为毫秒
+GROUP_COLUMN_ALIASES = dict(COLUMN_ALIASES, **{'组名': 'name', '周期': 'interval', '轮询周期': 'interval',
+                                               '间隔': 'interval'})
+# 到期时间落在这个范围(秒)内的组提前并入当前窗口，避免相差几毫秒的组各占一次总线
+DEFAULT_BATCH_WINDOW = 0.02
+# 界面定时器的最小节拍(ms)
+MIN_TICK = 10
+# 缓存的读计划个数上限。周期互质的组很多时到期组合可能有很多种，只保留最近用过的
+MAX_CACHED_PLANS = 64
+
+
+class PollGroup:
+    """ 一个轮询组: 一台设备上的一段地址，按自己的周期(秒)轮询 """
+    def __init__(self, name, tags, interval):
+        if interval <= 0:
+            raise ValueError(f"轮询组 {name} 的周期必须大于 0")
+        if not tags:
+            raise ValueError(f"轮询组 {name} 没有点位")
+        self.name = name
+        self.tags = list(tags)
+        self.interval = interval
+        # None 表示还没有轮询过，立即到期
+        self.next_due = None
+        self.polls = 0
+        # 总线忙不过来时跳过的周期数
+        self.missed = 0
+
+    @classmethod
+    def from_range(cls, name, interval, register_type, address, count=1, data_type='UINT16',
+                   byte_order='big', word_order='big', slave_id=None):
+        """ 点位名称为 "组名:地址" """
+        tags = range_tags(register_type, address, count, data_type, byte_order, word_order, slave_id, f"{name}:")
+        for tag in tags:
+            tag.description = f"{name} / {interval * 1000:g} ms"
+        return cls(name, tags, interval)
+
+    def is_due(self, now):
+        return self.next_due is None or self.next_due <= now
+
+    def advance(self, now):
+        """ 按固定节拍推进到下一个周期，请求耗时不会累积成漂移；错过的周期直接跳过，不连续补读 """
+        if self.next_due is None:
+            self.next_due = now
+        self.next_due += self.interval
+        if self.next_due <= now:
+            missed = int((now - self.next_due) // self.interval) + 1
+            self.next_due += missed * self.interval
+            self.missed += missed
+        self.polls += 1
+
+    def reset(self):
+        self.next_due = None
+        self.polls = 0
+        self.missed = 0
+
+    def __repr__(self):
+        return f"PollGroup({self.name!r}, {len(self.tags)} 个点位, {self.interval * 1000:g} ms)"
+
+
+class PollScheduler:
+    """ 多速率轮询调度器，接口与 TagDatabase 相同(poll/tags/迭代)，可以直接交给 PollingWorker。
+
+    每次 poll() 只读取到期的组。到期组的点位放在一起规划，同一从站上相邻的地址即使属于不同的组也只发一个请求；
+    读计划按到期组合缓存，周期固定时组合的种类很少，之后的窗口不需要重新规划；缓存最多 MAX_CACHED_PLANS 个。
+    poll() 在轮询线程调用，reset()/summary() 可以在界面线程调用，组的状态由锁保护。
+    "设备"指当前连接上的一个从站地址，所有组共用同一个连接。
+    """
+    def __init__(self, groups=(), planner=None, batch_window=DEFAULT_BATCH_WINDOW, clock=time.monotonic):
+        self.logger = logging.getLogger(__name__)
+        self.groups = []
+        self.planner = planner or ReadPlanner()
+        self.batch_window = batch_window
+        self.clock = clock
+        # (到期组名称, ...) -> 编译好的 TagDatabase，按最近使用排序
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+        # 每次 reset() 加一，reset 之前开始的 poll() 不再推进组的计时
+        self._generation = 0
+        for group in groups:
+            self.add(group)
+
+    def add(self, group):
+        if any(existing.name == group.name for existing in self.groups):
+            raise ValueError(f"轮询组名称重复: {group.name}")
+        with self._lock:
+            self.groups.append(group)
+            self._plans.clear()
+
+    @property
+    def tags(self):
+        return [tag for group in self.groups for tag in group.tags]
+
+    @property
+    def tick(self):
+        """ 界面定时器的节拍(ms): 各组周期的最大公约数，不小于 MIN_TICK """
+        intervals = [max(1, round(group.interval * 1000)) for group in self.groups]
+        return max(MIN_TICK, reduce(math.gcd, intervals)) if intervals else MIN_TICK
+
+    def due(self, now=None):
+        """ 到期的组，包括 batch_window 内即将到期的组 """
+        now = self.clock() if now is None else now
+        return [group for group in self.groups if group.is_due(now + self.batch_window)]
+
+    def next_due(self):
+        """ 最早的下一次到期时间，与 clock 同一时基；没有组时返回 None """
+        now = self.clock()
+        return min((now if group.next_due is None else group.next_due for group in self.groups), default=None)
+
+    def _database(self, due):
+        key = tuple(group.name for group in due)
+        database = self._plans.get(key)
+        if database is None:
+            database = TagDatabase((tag for group in due for tag in group.tags), self.planner)
+            database.compile()
+            self._plans[key] = database
+            if len(self._plans) > MAX_CACHED_PLANS:
+                self._plans.popitem(last=False)
+        else:
+            self._plans.move_to_end(key)
+        return database
+
+    def poll(self, debugger):
+        """ 读取到期的组，返回 ({点位名称: 值}, [(发送报文, 接收报文), ...])；没有到期的组时返回空结果 """
+        now = self.clock()
+        with self._lock:
+            due = self.due(now)
+            if not due:
+                return {}, []
+            database = self._database(due)
+            generation = self._generation
+        # 读取期间不持有锁，界面线程调用 summary() 不会等待总线
+        values, packets = database.poll(debugger)
+        with self._lock:
+            if generation == self._generation:
+                for group in due:
+                    group.advance(now)
+        return values, packets
+
+    def reset(self):
+        """ 重新开始计时，下一次 poll() 读取全部组 """
+        with self._lock:
+            self._generation += 1
+            for group in self.groups:
+                group.reset()
+
+    def summary(self):
+        """ 每个组的轮询次数和跳过的周期数 """
+        with self._lock:
+            return [f"{group.name}: 周期 {group.interval * 1000:g} ms，轮询 {group.polls} 次，跳过 {group.missed} 个周期"
+                    for group in self.groups]
+
+    def __len__(self):
+        return len(self.groups)
+
+    def __iter__(self):
+        return iter(self.tags)
+
+
+def _group_from_row(row, line):
+    row = {GROUP_COLUMN_ALIASES.get(key.strip(), key.strip()): value for key, value in row.items() if key}
+    row = {key: value.strip() if isinstance(value, str) else value for key, value in row.items()}
+    try:
+        register_type = row.get('register_type') or 'Holding Register'
+        register_type = REGISTER_TYPE_ALIASES.get(str(register_type).lower(), register_type)
+        return PollGroup.from_range(
+            name=row.get('name') or f"组{line}",
+            interval=float(row['interval']) / 1000,
+            register_type=register_type,
+            address=int(row['address']),
+            count=int(row['count']) if row.get('count') not in (None, '') else 1,
+            data_type=(row.get('data_type') or 'UINT16').upper(),
+            byte_order=BYTE_ORDER_ALIASES[str(row.get('byte_order') or 'big').lower()],
+            word_order=WORD_ORDER_ALIASES[str(row.get('word_order') or 'big').lower()],
+            slave_id=int(row['slave_id']) if row.get('slave_id') not in (None, '') else None,
+        )
+    except (KeyError, ValueError) as e:
+        raise ValueError(f"第 {line} 个轮询组无效: {e}") from e
+
+
+def parse_poll_groups(rows):
+    """ 把字典列表(config.json 的 poll_groups 或文件中的行)转换成 PollGroup 列表 """
+    return [_group_from_row(row, i + 1) for i, row in enumerate(rows)]
+
+
+def load_poll_groups(path):
+    """ 从 CSV 或 JSON 文件读取轮询组，JSON 可以是列表，也可以是 {"groups": 列表} """
+    return parse_poll_groups(read_rows(path, key='groups'))
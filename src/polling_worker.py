@@ -0,0 +1,101 @@
+#大牛大巨婴
+import logging
+from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
+from codec import STRUCT_CODES
+from read_planner import BIT_REGISTER_TYPES, registers_per_value
+
+
+class PollingWorker(QObject):
+    """ 在独立的 QThread 中执行轮询 I/O，解码结果和报文通过信号送回界面线程。 """
+    poll_finished = pyqtSignal(dict)
+    writes_finished = pyqtSignal(dict)
+
+    def __init__(self, modbus_debugger, historian=None):
+        super().__init__()
+        self.logger = logging.getLogger(__name__)
+        self.modbus_debugger = modbus_debugger
+        self.historian = historian
+        # 设置后只有超出死区的值才会写入历史库并送回界面
+        self.deadband_filter = None
+
+    @pyqtSlot(dict)
+    def poll(self, request):
+        response = dict(request)
+        try:
+            if 'plan' in request:
+                # 导入的点表: 按编译好的读计划轮询全部点位
+                values, packets = request['plan'].poll(self.modbus_debugger)
+                deadband_filter = self.deadband_filter
+                if deadband_filter is not None:
+                    values = deadband_filter.filter(values)
+                    if not values:
+                        packets = []  # 没有变化时也不刷新报文区
+                response['values'], response['packets'] = values, packets
+                self._record(values)
+                self.poll_finished.emit(response)
+                return
+            response['result'], response['sent_packet'], response['received_packet'] = self._read(request)
+            if response['result'] is not None:
+                values = self._named_values(request, response['result'])
+                deadband_filter = self.deadband_filter
+                if deadband_filter is not None:
+                    values = deadband_filter.filter(values)
+                    response['unchanged'] = not values
+                self._record(values)
+        except Exception as e:
+            self.logger.error(f"轮询操作发生错误: {str(e)}")
+            response['error'] = str(e)
+        self.poll_finished.emit(response)
+
+    @pyqtSlot(dict)
+    def flush_writes(self, request):
+        """ 执行写队列: 合并后的 FC16/FC15 请求与轮询在同一个线程里排队，不会同时占用总线 """
+        response = dict(request)
+        try:
+            response['results'] = request['queue'].flush(self.modbus_debugger)
+        except Exception as e:
+            self.logger.error(f"执行写队列时发生错误: {str(e)}")
+            response['error'] = str(e)
+        self.writes_finished.emit(response)
+
+    def _read(self, request):
+        register_type = request['register_type']
+        start_address = request['start_address']
+        count = request['count']
+        slave_id = request['slave_id']
+        if register_type == 'Holding Register':
+            return self.modbus_debugger.read_holding_registers(
+                start_address, count, slave_id, request['data_type'],
+                byte_order=request['byte_order'], word_order=request['word_order']
+            )
+        elif register_type == 'Input Register':
+            return self.modbus_debugger.read_input_registers(
+                start_address, count, slave_id, request['data_type'],
+                byte_order=request['byte_order'], word_order=request['word_order']
+            )
+        elif register_type == 'Discrete Input':
+            return self.modbus_debugger.read_discrete_inputs(start_address, count, slave_id)
+        elif register_type == 'Coil':
+            return self.modbus_debugger.read_coils(start_address, count, slave_id)
+        raise ValueError(f"不支持轮询的寄存器类型: {register_type}")
+
+    def _record(self, values):
+        # 只是入队，写盘在历史库自己的线程里完成
+        if self.historian is not None:
+            self.historian.record(values)
+
+    @staticmethod
+    def _named_values(request, result):
+        """ 按地址给轮询结果命名，例如 "Holding Register:100" """
+        register_type = request['register_type']
+        start_address = request['start_address']
+        if register_type in BIT_REGISTER_TYPES:
+            width = 1
+        elif request['data_type'] in STRUCT_CODES:
+            width = registers_per_value(request['data_type'])
+        else:
+            # ASCII、时间戳等非数值类型交给历史库按下标展开或跳过
+            return {f"{register_type}:{start_address}": result}
+        # 读线圈时 pymodbus 会把位数补齐到 8 的倍数
+        return {f"{register_type}:{start_address + i * width}": value
+                for i, value in enumerate(result[:request['count']])}
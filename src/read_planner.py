@@ -0,0 +1,170 @@
+#大牛大巨婴
+import logging
+
+# 寄存器类型与读功能码的对应关系，名称与界面上的寄存器类型下拉框一致
+READ_FUNCTION_CODES = {
+    'Coil': 1,
+    'Discrete Input': 2,
+    'Holding Register': 3,
+    'Input Register': 4,
+}
+BIT_REGISTER_TYPES = ('Coil', 'Discrete Input')
+
+# Modbus PDU 限制: FC03/04 最多 125 个寄存器，FC01/02 最多 2000 个位
+MAX_READ_REGISTERS = 125
+MAX_READ_BITS = 2000
+# 这些类型读的是 count 个寄存器组成的一个值，其余类型读 count 个值
+BLOCK_DATA_TYPES = ('BOOL', 'BYTE', 'ASCII')
+
+
+def registers_per_value(data_type):
+    """ 每个值占用的寄存器数量 """
+    if data_type in ('INT32', 'UINT32', 'FLOAT32', 'UNIX_TIMESTAMP'):
+        return 2
+    elif data_type in ('INT64', 'UINT64', 'FLOAT64'):
+        return 4
+    return 1
+
+
+class Tag:
+    """ 一个需要读取的点位: 地址 + 寄存器类型 + 数据类型 """
+    def __init__(self, address, register_type='Holding Register', data_type='UINT16',
+                 byte_order='big', word_order='big', slave_id=None, name=None, count=None,
+                 scale=1, unit='', description='', deadband=None, deadband_percent=None):
+        if register_type not in READ_FUNCTION_CODES:
+            raise ValueError(f"不支持的寄存器类型: {register_type}")
+        self.address = address
+        self.register_type = register_type
+        self.data_type = 'BOOL' if register_type in BIT_REGISTER_TYPES else data_type
+        self.byte_order = byte_order
+        self.word_order = word_order
+        self.slave_id = slave_id
+        self.name = name if name is not None else str(address)
+        # count 用于 ASCII 这类长度由用户决定的类型
+        self.count = count or registers_per_value(self.data_type)
+        self.scale = scale
+        self.unit = unit
+        self.description = description
+        # 按例外报告的死区，None 表示使用全局设置
+        self.deadband = deadband
+        self.deadband_percent = deadband_percent
+
+    @property
+    def end(self):
+        return self.address + self.count
+
+    def __repr__(self):
+        return f"Tag({self.name!r}, {self.register_type}, {self.address}, {self.data_type})"
+
+
+def range_tags(register_type, address, count, data_type='UINT16', byte_order='big', word_order='big',
+               slave_id=None, prefix=''):
+    """ 把一段地址范围转换成点位，点位名称为 prefix + 地址 """
+    options = dict(register_type=register_type, data_type=data_type, byte_order=byte_order,
+                   word_order=word_order, slave_id=slave_id)
+    if register_type in BIT_REGISTER_TYPES or data_type not in BLOCK_DATA_TYPES:
+        width = 1 if register_type in BIT_REGISTER_TYPES else registers_per_value(data_type)
+        return [Tag(address + i * width, name=f"{prefix}{address + i * width}", **options) for i in range(count)]
+    return [Tag(address, name=f"{prefix}{address}", count=count, **options)]
+
+
+class ReadBlock:
+    """ 一次 FC01/02/03/04 请求，以及它覆盖的点位 """
+    def __init__(self, register_type, slave_id, start, count, tags):
+        self.register_type = register_type
+        self.slave_id = slave_id
+        self.start = start
+        self.count = count
+        self.tags = tags
+
+    @property
+    def function_code(self):
+        return READ_FUNCTION_CODES[self.register_type]
+
+    def slice(self, tag, values):
+        """ 从整块读取结果中取出某个点位对应的寄存器/位 """
+        offset = tag.address - self.start
+        return values[offset:offset + tag.count]
+
+    def __repr__(self):
+        return (f"ReadBlock(FC{self.function_code:02d}, slave={self.slave_id}, "
+                f"start={self.start}, count={self.count}, tags={len(self.tags)})")
+
+
+class ReadPlanner:
+    """ 把任意点位集合合并成尽量少的块读取请求。
+
+    gap_fill 是允许一并读取的空洞大小(寄存器数)，bit_gap_fill 是位类型的空洞大小。
+    多读几个寄存器通常比多一次往返便宜得多，尤其是低波特率的 RTU 总线。
+    """
+    def __init__(self, gap_fill=8, bit_gap_fill=64, max_registers=MAX_READ_REGISTERS, max_bits=MAX_READ_BITS):
+        self.logger = logging.getLogger(__name__)
+        self.gap_fill = gap_fill
+        self.bit_gap_fill = bit_gap_fill
+        self.max_registers = max_registers
+        self.max_bits = max_bits
+
+    def plan(self, tags):
+        groups = {}
+        for tag in tags:
+            groups.setdefault((tag.slave_id, tag.register_type), []).append(tag)
+
+        blocks = []
+        for (slave_id, register_type), group in groups.items():
+            is_bit = register_type in BIT_REGISTER_TYPES
+            limit = self.max_bits if is_bit else self.max_registers
+            gap = self.bit_gap_fill if is_bit else self.gap_fill
+            blocks.extend(self._plan_group(slave_id, register_type, group, limit, gap))
+
+        blocks.sort(key=lambda b: (b.slave_id is None, b.slave_id or 0, b.function_code, b.start))
+        self.logger.debug(f"{len(tags)} 个点位合并为 {len(blocks)} 个读请求")
+        return blocks
+
+    def _plan_group(self, slave_id, register_type, tags, limit, gap):
+        # 按起始地址排序后贪心扩展: 对于有长度上限的区间覆盖，这样得到的块数最少
+        blocks = []
+        start = end = None
+        members = []
+        for tag in sorted(tags, key=lambda t: (t.address, t.end)):
+            if tag.count > limit:
+                raise ValueError(f"{tag} 超过单次读取上限 {limit}")
+            if members and tag.address - end <= gap and max(end, tag.end) - start <= limit:
+                end = max(end, tag.end)
+                members.append(tag)
+                continue
+            if members:
+                blocks.append(ReadBlock(register_type, slave_id, start, end - start, members))
+            start, end, members = tag.address, tag.end, [tag]
+        if members:
+            blocks.append(ReadBlock(register_type, slave_id, start, end - start, members))
+        return blocks
+
+
+def read_block(debugger, block):
+    """ 读取一个块，寄存器按 UINT16 原样返回，位按块长度截断 """
+    if block.register_type == 'Holding Register':
+        return debugger.read_holding_registers(block.start, block.count, block.slave_id)
+    elif block.register_type == 'Input Register':
+        return debugger.read_input_registers(block.start, block.count, block.slave_id)
+    elif block.register_type == 'Coil':
+        raw, sent, received = debugger.read_coils(block.start, block.count, block.slave_id)
+    else:
+        raw, sent, received = debugger.read_discrete_inputs(block.start, block.count, block.slave_id)
+    return (raw[:block.count] if raw is not None else None), sent, received
+
+
+def execute_plan(debugger, blocks):
+    """ 用 ModbusDebugger 执行读计划，返回 ({tag: 解码后的值列表}, [(发送报文, 接收报文), ...]) """
+    values = {}
+    packets = []
+    for block in blocks:
+        raw, sent, received = read_block(debugger, block)
+        packets.append((sent, received))
+        for tag in block.tags:
+            if raw is None:
+                values[tag] = None
+            elif block.register_type in BIT_REGISTER_TYPES:
+                values[tag] = list(block.slice(tag, raw))
+            else:
+                values[tag] = debugger.process_data(block.slice(tag, raw), tag.data_type, tag.byte_order, tag.word_order)
+    return values, packets
@@ -0,0 +1,81 @@
+#大牛大巨婴
+import logging
+import random
+import threading
+
+
+class ReconnectManager:
+    """ 在后台线程里重连，间隔按指数增长并带随机抖动，最长不超过 max_delay。
+
+    connect 是一个返回 True/False 的函数；重连期间 reconnecting 为 True，
+    调用方据此让请求立即失败，而不是在总线锁上排队等待。
+    """
+    def __init__(self, connect, initial_delay=0.5, max_delay=30.0, multiplier=2.0, jitter=0.2, name="reconnect"):
+        self.logger = logging.getLogger(__name__)
+        self._connect = connect
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.name = name
+        self.attempts = 0
+        self._lock = threading.Lock()
+        # 每次重连有自己的停止事件，取消后不等待的旧线程不会影响新的重连
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def reconnecting(self):
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+
+    def next_delay(self, attempt):
+        """ 第 attempt 次重试前的等待秒数 """
+        # 限制指数，设备长时间离线时避免浮点溢出
+        delay = min(self.max_delay, self.initial_delay * self.multiplier ** min(attempt, 32))
+        # 只向下抖动，保证不超过上限，同时避免多台设备在同一时刻一起重连
+        return delay * random.uniform(1 - self.jitter, 1)
+
+    def trigger(self):
+        """ 开始后台重连；已经在重连时什么也不做 """
+        with self._lock:
+            if self.reconnecting:
+                return False
+            self._stop = threading.Event()
+            self.attempts = 0
+            self._thread = threading.Thread(target=self._run, args=(self._stop,), name=self.name, daemon=True)
+            self._thread.start()
+            return True
+
+    def cancel(self, wait=True):
+        """ 停止重连，例如用户主动断开或重新连接时。
+
+        wait=False 时不等待正在进行的连接尝试结束，reconnecting 立即变为 False；
+        旧线程在连接返回后自行退出，connect 需要自己判断结果是否已经过时。
+        """
+        with self._lock:
+            self._stop.set()
+            thread = self._thread
+            if not wait:
+                self._thread = None
+        if wait and thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _run(self, stop):
+        attempts = 0
+        while True:
+            delay = self.next_delay(attempts)
+            self.logger.info(f"{delay:.2f} 秒后进行第 {attempts + 1} 次重连")
+            if stop.wait(delay):
+                return
+            attempts += 1
+            if not stop.is_set():
+                self.attempts = attempts
+            try:
+                if self._connect():
+                    self.logger.info(f"第 {attempts} 次重连成功")
+                    return
+            except Exception as e:
+                self.logger.error(f"重连时发生错误: {str(e)}")
+            if stop.is_set():
+                return
@@ -0,0 +1,170 @@
+#大牛大巨婴
+import logging
+from pymodbus.exceptions import ModbusException
+from pymodbus.pdu import ExceptionResponse
+from read_planner import BIT_REGISTER_TYPES, MAX_READ_BITS, MAX_READ_REGISTERS, ReadPlanner, Tag
+
+ILLEGAL_DATA_ADDRESS = 0x02
+MAX_ADDRESS = 65535
+# 无效区间内部的采样间隔: 不短于这个长度的有效区间一定能找到
+DEFAULT_RESOLUTION = 16
+READ_METHODS = {
+    'Holding Register': 'read_holding_registers',
+    'Input Register': 'read_input_registers',
+    'Coil': 'read_coils',
+    'Discrete Input': 'read_discrete_inputs',
+}
+
+
+class RegisterMap:
+    """ 每种寄存器类型的有效地址区间，区间为闭区间 [start, end] """
+    def __init__(self, slave_id=None, ranges=None):
+        self.slave_id = slave_id
+        self.ranges = ranges if ranges is not None else {}
+
+    def add(self, register_type, start, end):
+        ranges = self.ranges.setdefault(register_type, [])
+        if ranges and start <= ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+        else:
+            ranges.append((start, end))
+
+    def tags(self, data_type='UINT16'):
+        """ 每个区间按单次读取上限切成若干个点位 """
+        tags = []
+        for register_type, ranges in self.ranges.items():
+            limit = MAX_READ_BITS if register_type in BIT_REGISTER_TYPES else MAX_READ_REGISTERS
+            for start, end in ranges:
+                for address in range(start, end + 1, limit):
+                    count = min(limit, end + 1 - address)
+                    tags.append(Tag(address, register_type, data_type, slave_id=self.slave_id,
+                                    name=f"{register_type}:{address}", count=count))
+        return tags
+
+    def plan(self, planner=None):
+        """ 生成覆盖全部有效地址的读计划，可以直接交给 execute_plan """
+        return (planner or ReadPlanner(gap_fill=0, bit_gap_fill=0)).plan(self.tags())
+
+    def to_dict(self):
+        return {register_type: [list(r) for r in ranges] for register_type, ranges in self.ranges.items()}
+
+    @classmethod
+    def from_dict(cls, data, slave_id=None):
+        return cls(slave_id, {register_type: [tuple(r) for r in ranges] for register_type, ranges in data.items()})
+
+    def format(self):
+        lines = []
+        for register_type, ranges in self.ranges.items():
+            text = ', '.join(f"{start}" if start == end else f"{start}-{end}" for start, end in ranges) or "无"
+            lines.append(f"{register_type}: {text}")
+        return '\n'.join(lines)
+
+
+class RegisterExplorer:
+    """ 用异常码 02 (非法数据地址) 二分查找设备实现了哪些地址。
+
+    按单次读取上限分窗口前进，整窗有效时一次请求即可确认；有边界时利用
+    "从有效起点往后读得越长越容易失败" 和 "读到有效终点时起点越靠后越容易成功" 这两个
+    单调性做二分，每个边界只需要 O(log n) 次请求。
+    无效地址之间每隔 resolution 个地址采样一次，长度不小于 resolution 的有效区间一定能找到，
+    更短且两端都落在无效区间里的有效区间可能被漏掉。resolution 越小越完整，请求也越多。
+    """
+    def __init__(self, modbus_debugger, slave_id=None, window=None, resolution=DEFAULT_RESOLUTION):
+        if resolution < 1:
+            raise ValueError(f"采样间隔必须大于 0: {resolution}")
+        self.logger = logging.getLogger(__name__)
+        self.modbus_debugger = modbus_debugger
+        self.slave_id = slave_id
+        self.window = window
+        self.resolution = resolution
+        self.requests = 0
+        self.errors = 0
+
+    def explore(self, register_types=tuple(READ_METHODS), first=0, last=MAX_ADDRESS, stop_event=None, callback=None):
+        """ 返回 RegisterMap；callback(register_type, address) 报告进度 """
+        register_map = RegisterMap(self.slave_id)
+        for register_type in register_types:
+            register_map.ranges[register_type] = []
+            self._explore_type(register_map, register_type, first, last, stop_event, callback)
+        self.logger.info(f"地址探测完成，共 {self.requests} 次请求:\n{register_map.format()}")
+        return register_map
+
+    def _explore_type(self, register_map, register_type, first, last, stop_event, callback):
+        limit = MAX_READ_BITS if register_type in BIT_REGISTER_TYPES else MAX_READ_REGISTERS
+        # 窗口包含两端的采样点，所以步长比单次读取上限小 1
+        step = min(self.window or limit - 1, limit - 1)
+        probe = lambda address, count=1: self._read_ok(register_type, address, count)
+
+        a = first
+        a_valid = probe(a)
+        range_start = a if a_valid else None
+        while a < last:
+            if stop_event is not None and stop_event.is_set():
+                break
+            if callback:
+                callback(register_type, a)
+            b = min(a + step, last)
+            if a_valid and probe(a, b - a + 1):
+                a = b  # 整个窗口都有效
+                continue
+            if a_valid:
+                # [a, a + n) 都有效的最大 n
+                n = self._bisect(lambda n: probe(a, n), 1, b - a)
+                register_map.add(register_type, range_start, a + n - 1)
+                range_start = None
+                gap_start = a + n
+            else:
+                gap_start = a
+            # gap_start 无效，在 (gap_start, b] 里找下一个有效地址
+            x = self._next_valid(probe, gap_start, b)
+            if x is None:
+                a, a_valid = b, False
+                continue
+            # [y, x] 都有效的最小 y
+            range_start = self._bisect(lambda y: not probe(y, x - y + 1), gap_start, x - 1) + 1
+            a, a_valid = x, True
+        if range_start is not None:
+            register_map.add(register_type, range_start, a)
+
+    def _next_valid(self, probe, gap_start, end):
+        """ 从 gap_start 之后每隔 resolution 采样一次，最后采样 end；返回第一个有效地址，都无效时返回 None """
+        candidates = list(range(gap_start + self.resolution, end, self.resolution))
+        if end > gap_start:
+            candidates.append(end)
+        for address in candidates:
+            if probe(address):
+                return address
+        return None
+
+    @staticmethod
+    def _bisect(predicate, low, high):
+        """ predicate(low) 为真，返回 [low, high] 中满足 predicate 的最大值；predicate 须单调 """
+        while low < high:
+            middle = (low + high + 1) // 2
+            if predicate(middle):
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def _read_ok(self, register_type, address, count):
+        debugger = self.modbus_debugger
+        read_name = READ_METHODS[register_type]
+        slave_id = self.slave_id or debugger._slave_id
+        self.requests += 1
+        try:
+            result, _, _ = debugger._execute(
+                lambda: getattr(debugger.client, read_name)(address=address, count=count, slave=slave_id))
+        except ModbusException as e:
+            result = e
+        if isinstance(result, ExceptionResponse):
+            if result.exception_code != ILLEGAL_DATA_ADDRESS:
+                self.errors += 1
+                self.logger.debug(f"{register_type} {address}+{count}: 异常码 {result.exception_code:02X}")
+            return False
+        if isinstance(result, ModbusException):
+            # 超时后 pymodbus 会关闭连接，保守地当作无效地址继续探测
+            self.errors += 1
+            debugger.reopen()
+            return False
+        return True
@@ -0,0 +1,231 @@
+#大牛大巨婴
+import logging
+import threading
+import time
+from read_planner import READ_FUNCTION_CODES, BIT_REGISTER_TYPES
+from tag_database import COLUMN_ALIASES, REGISTER_TYPE_ALIASES, BYTE_ORDER_ALIASES, WORD_ORDER_ALIASES, read_rows
+
+# RTU 读请求固定 8 字节: 地址(1) + 功能码(1) + 起始地址(2) + 数量(2) + CRC(2)
+READ_REQUEST_LENGTH = 8
+# 任务文件的列名与点表相同，另加优先级
+JOB_COLUMN_ALIASES = dict(COLUMN_ALIASES, **{'优先级': 'priority'})
+
+
+class SerialTiming:
+    """ 按串口参数计算 Modbus RTU 的帧间隔和超时(单位: 秒)。
+
+    一个字符 = 起始位 + 数据位 + 校验位 + 停止位。按规范，波特率高于 19200 时
+    字符间隔和帧间隔分别固定为 750us 和 1.75ms。
+    turnaround 是从站收到请求后开始应答前的处理时间，margin 用来吸收 USB 转串口等延迟。
+    """
+    def __init__(self, baud_rate, data_bits=8, parity='None', stop_bits=1, turnaround=0.05, margin=0.02):
+        self.baud_rate = baud_rate
+        self.data_bits = data_bits
+        self.parity = parity
+        self.stop_bits = stop_bits
+        self.turnaround = turnaround
+        self.margin = margin
+        parity_bits = 0 if str(parity)[:1].upper() in ('N', '') else 1
+        self.bits_per_char = 1 + data_bits + parity_bits + stop_bits
+        self.char_time = self.bits_per_char / baud_rate
+        if baud_rate > 19200:
+            self.inter_char_timeout = 0.00075
+            self.silent_interval = 0.00175
+        else:
+            self.inter_char_timeout = 1.5 * self.char_time
+            self.silent_interval = 3.5 * self.char_time
+
+    @classmethod
+    def from_params(cls, params, turnaround=0.05, margin=0.02):
+        """ 使用 ModbusDebugger 保存的 RTU 连接参数 """
+        return cls(int(params['baud_rate']), int(params['data_bits']), params['parity'],
+                   float(params['stop_bits']), turnaround, margin)
+
+    def frame_time(self, length):
+        return length * self.char_time
+
+    def transaction_time(self, request_length, response_length):
+        """ 一次请求/应答在总线上占用的理论最短时间，含前后两个帧间隔，不含从站处理时间 """
+        return (self.silent_interval + self.frame_time(request_length)
+                + self.silent_interval + self.frame_time(response_length))
+
+    def response_timeout(self, request_length, response_length):
+        """ 从开始发送请求到收完应答的最长等待时间 """
+        return (self.frame_time(request_length) + self.turnaround
+                + self.frame_time(response_length) + self.silent_interval + self.margin)
+
+
+class BusJob:
+    """ 总线上的一个周期性读任务: 从站 + 功能码(寄存器类型) + 地址范围 """
+    def __init__(self, slave_id, register_type, address, count, data_type='UINT16',
+                 byte_order='big', word_order='big', priority=1, name=None):
+        if register_type not in READ_FUNCTION_CODES:
+            raise ValueError(f"不支持的寄存器类型: {register_type}")
+        if priority <= 0:
+            raise ValueError(f"优先级必须大于 0: {priority}")
+        self.slave_id = slave_id
+        self.register_type = register_type
+        self.address = address
+        self.count = count
+        self.data_type = 'BOOL' if register_type in BIT_REGISTER_TYPES else data_type
+        self.byte_order = byte_order
+        self.word_order = word_order
+        self.priority = priority
+        self.name = name or f"{slave_id}:FC{self.function_code:02d}:{address}+{count}"
+        # 加权轮询的当前权值
+        self._current = 0
+
+    @property
+    def function_code(self):
+        return READ_FUNCTION_CODES[self.register_type]
+
+    @property
+    def response_length(self):
+        if self.register_type in BIT_REGISTER_TYPES:
+            data_length = (self.count + 7) // 8
+        else:
+            data_length = self.count * 2
+        # 地址(1) + 功能码(1) + 字节数(1) + 数据 + CRC(2)
+        return 5 + data_length
+
+    def __repr__(self):
+        return f"BusJob({self.name!r}, priority={self.priority})"
+
+
+class RtuBusScheduler:
+    """ 在一条 RTU 总线上轮流执行多个从站的读任务。
+
+    mode 为 'round_robin' 时按顺序逐个执行；为 'priority' 时按 priority 加权，
+    权重为 3 的任务被执行的次数是权重为 1 的三倍，且分布均匀、不会饿死低优先级任务。
+    每次请求前都保证距上一帧结束至少 3.5 个字符时间，超时按请求和应答的帧长计算。
+    """
+    def __init__(self, modbus_debugger, jobs=(), mode='round_robin', turnaround=0.05, margin=0.02):
+        if mode not in ('round_robin', 'priority'):
+            raise ValueError(f"未知的调度模式: {mode}")
+        if modbus_debugger._connection_type != "rtu":
+            raise ValueError("总线调度器需要先建立 RTU 连接")
+        self.logger = logging.getLogger(__name__)
+        self.modbus_debugger = modbus_debugger
+        self.jobs = list(jobs)
+        self.mode = mode
+        self.timing = SerialTiming.from_params(modbus_debugger._connection_params, turnaround, margin)
+        self.requests = 0
+        self.failures = 0
+        self.busy_time = 0.0
+        self._index = 0
+        self._last_frame_end = 0.0
+
+    def add_job(self, job):
+        self.jobs.append(job)
+
+    def remove_job(self, job):
+        self.jobs.remove(job)
+
+    def theoretical_rate(self):
+        """ 当前任务组合下总线每秒最多能完成的请求数(不含从站处理时间) """
+        if not self.jobs:
+            return 0.0
+        mean = sum(self.timing.transaction_time(READ_REQUEST_LENGTH, job.response_length)
+                   for job in self.jobs) / len(self.jobs)
+        return 1.0 / mean
+
+    def next_job(self):
+        if not self.jobs:
+            return None
+        if self.mode == 'round_robin':
+            job = self.jobs[self._index % len(self.jobs)]
+            self._index += 1
+            return job
+        # 平滑加权轮询: 每轮所有任务加上自己的权重，选出最大者后减去总权重
+        total = 0
+        best = None
+        for job in self.jobs:
+            job._current += job.priority
+            total += job.priority
+            if best is None or job._current > best._current:
+                best = job
+        best._current -= total
+        return best
+
+    def run_job(self, job):
+        """ 执行一个任务，返回 (解码后的值, 发送报文, 接收报文)，失败时值为 None """
+        # 保证距上一帧结束至少 3.5 个字符时间
+        wait = self._last_frame_end + self.timing.silent_interval - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+        # 按帧长设置的超时只用于这一次请求，之后恢复，界面和命令行的其他请求仍使用原来的超时
+        debugger = self.modbus_debugger
+        previous_timeout = debugger.client.comm_params.timeout_connect if debugger.client else debugger._timeout
+        debugger.set_timeout(self.timing.response_timeout(READ_REQUEST_LENGTH, job.response_length))
+        start = time.perf_counter()
+        try:
+            result = self._read(job)
+        finally:
+            self._last_frame_end = time.perf_counter()
+            self.busy_time += self._last_frame_end - start
+            self.requests += 1
+            debugger.set_timeout(previous_timeout)
+        if result[0] is None:
+            self.failures += 1
+        return result
+
+    def _read(self, job):
+        debugger = self.modbus_debugger
+        if job.register_type == 'Holding Register':
+            return debugger.read_holding_registers(job.address, job.count, job.slave_id, job.data_type,
+                                                   byte_order=job.byte_order, word_order=job.word_order)
+        elif job.register_type == 'Input Register':
+            return debugger.read_input_registers(job.address, job.count, job.slave_id, job.data_type,
+                                                 byte_order=job.byte_order, word_order=job.word_order)
+        elif job.register_type == 'Coil':
+            raw, sent, received = debugger.read_coils(job.address, job.count, job.slave_id)
+        else:
+            raw, sent, received = debugger.read_discrete_inputs(job.address, job.count, job.slave_id)
+        # 位读取按字节返回，截掉补齐的位
+        return (raw[:job.count] if raw is not None else None), sent, received
+
+    def run_cycle(self, callback=None):
+        """ 调度 len(jobs) 次；轮询模式下即每个任务执行一次 """
+        for _ in range(len(self.jobs)):
+            job = self.next_job()
+            values, sent, received = self.run_job(job)
+            if callback:
+                callback(job, values, sent, received)
+
+    def run(self, stop_event=None, duration=None, callback=None):
+        """ 持续调度直到 stop_event 被设置或超过 duration 秒 """
+        stop_event = stop_event or threading.Event()
+        deadline = time.perf_counter() + duration if duration is not None else None
+        while self.jobs and not stop_event.is_set():
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            job = self.next_job()
+            values, sent, received = self.run_job(job)
+            if callback:
+                callback(job, values, sent, received)
+
+
+def _job_from_row(row, line):
+    row = {JOB_COLUMN_ALIASES.get(key.strip(), key.strip()): value for key, value in row.items() if key}
+    row = {key: value.strip() if isinstance(value, str) else value for key, value in row.items()}
+    try:
+        register_type = row.get('register_type') or 'Holding Register'
+        register_type = REGISTER_TYPE_ALIASES.get(str(register_type).lower(), register_type)
+        return BusJob(
+            slave_id=int(row['slave_id']),
+            register_type=register_type,
+            address=int(row['address']),
+            count=int(row['count']) if row.get('count') not in (None, '') else 1,
+            data_type=(row.get('data_type') or 'UINT16').upper(),
+            byte_order=BYTE_ORDER_ALIASES[str(row.get('byte_order') or 'big').lower()],
+            word_order=WORD_ORDER_ALIASES[str(row.get('word_order') or 'big').lower()],
+            priority=int(row['priority']) if row.get('priority') not in (None, '') else 1,
+            name=row.get('name') or None,
+        )
+    except (KeyError, ValueError) as e:
+        raise ValueError(f"第 {line} 个总线任务无效: {e}") from e
+
+
+def load_bus_jobs(path):
+    """ 从 CSV 或 JSON 文件读取总线任务，JSON 可以是列表，也可以是 {"jobs": 列表} """
+    return [_job_from_row(row, i + 1) for i, row in enumerate(read_rows(path, key='jobs'))]
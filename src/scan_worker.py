@@ -0,0 +1,131 @@
+#大牛大巨婴
+import logging
+import threading
+from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
+
+
+class ScanWorker(QObject):
+    """ 在后台线程里扫描从站地址，进度和结果通过信号送回界面线程。 """
+    scan_progress = pyqtSignal(int, int)
+    scan_finished = pyqtSignal(dict)
+
+    def __init__(self, modbus_debugger):
+        super().__init__()
+        self.logger = logging.getLogger(__name__)
+        self.modbus_debugger = modbus_debugger
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        """ 可以从界面线程直接调用 """
+        self._stop_event.set()
+
+    @pyqtSlot(dict)
+    def scan(self, request):
+        self._stop_event.clear()
+        slave_ids = range(request.get('first_id', 1), request.get('last_id', 247) + 1)
+        total = len(slave_ids)
+        probed = 0
+
+        def on_probe(slave_id, result):
+            nonlocal probed
+            probed += 1
+            self.scan_progress.emit(probed, total)
+
+        response = dict(request)
+        try:
+            # 扫描器依赖 pymodbus/asyncio，在工作线程里第一次扫描时才导入，不拖慢界面启动
+            from slave_scanner import SlaveScanner
+            scanner = SlaveScanner(self.modbus_debugger, probe=request.get('probe', 'read'),
+                                   address=request.get('address', 0))
+            response['results'] = scanner.scan(slave_ids, on_probe, self._stop_event)
+        except Exception as e:
+            self.logger.error(f"扫描从站时发生错误: {str(e)}")
+            response['error'] = str(e)
+        response['stopped'] = self._stop_event.is_set()
+        self.scan_finished.emit(response)
+
+
+class SubnetScanWorker(QObject):
+    """ 在后台线程里用 asyncio 扫描网段内的 Modbus TCP 设备。 """
+    scan_progress = pyqtSignal(int, int)
+    scan_finished = pyqtSignal(dict)
+
+    def __init__(self):
+        super().__init__()
+        self.logger = logging.getLogger(__name__)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    @pyqtSlot(dict)
+    def scan(self, request):
+        self._stop_event.clear()
+        response = dict(request)
+        try:
+            from subnet_scanner import SubnetScanner
+            scanner = SubnetScanner(request['ports'], slave_id=request.get('slave_id', 1),
+                                    timeout=request.get('timeout', 0.5))
+            total = len(scanner.targets(request['cidr']))
+
+            def on_probe(host, port, result):
+                self.scan_progress.emit(scanner.probed, total)
+
+            response['results'] = scanner.scan_sync(request['cidr'], on_probe, self._stop_event)
+        except Exception as e:
+            self.logger.error(f"扫描网段时发生错误: {str(e)}")
+            response['error'] = str(e)
+        response['stopped'] = self._stop_event.is_set()
+        self.scan_finished.emit(response)
+
+
+class ExploreWorker(QObject):
+    """ 在后台线程里探测设备实现了哪些地址区间。 """
+    explore_progress = pyqtSignal(str, int)
+    explore_finished = pyqtSignal(dict)
+
+    def __init__(self, modbus_debugger):
+        super().__init__()
+        self.logger = logging.getLogger(__name__)
+        self.modbus_debugger = modbus_debugger
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    @pyqtSlot(dict)
+    def explore(self, request):
+        self._stop_event.clear()
+        response = dict(request)
+        try:
+            from register_explorer import RegisterExplorer
+            explorer = RegisterExplorer(self.modbus_debugger, request.get('slave_id'))
+            response['map'] = explorer.explore(request['register_types'], stop_event=self._stop_event,
+                                               callback=self.explore_progress.emit)
+            response['requests'] = explorer.requests
+        except Exception as e:
+            self.logger.error(f"探测地址时发生错误: {str(e)}")
+            response['error'] = str(e)
+        response['stopped'] = self._stop_event.is_set()
+        self.explore_finished.emit(response)
+
+
+class SerialPortWorker(QObject):
+    """ 在后台线程里枚举系统串口 """
+    ports_found = pyqtSignal(list)
+
+    def __init__(self, modbus_debugger):
+        super().__init__()
+        self.logger = logging.getLogger(__name__)
+        self.modbus_debugger = modbus_debugger
+
+    @pyqtSlot()
+    def refresh(self):
+        ports = []
+        try:
+            if self.modbus_debugger is not None:
+                ports = self.modbus_debugger.get_available_serial_ports()
+            self.logger.info(f"系统检测到的串口: {ports}")
+        except Exception as e:
+            self.logger.error(f"获取系统串口列表时出错: {str(e)}")
+        self.ports_found.emit(ports)
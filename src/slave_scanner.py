@@ -0,0 +1,177 @@
+#大牛大巨婴
+import logging
+import queue
+import threading
+import time
+from pymodbus.exceptions import ModbusException
+from pymodbus.pdu import ExceptionResponse
+from modbus_debugger import ModbusDebugger
+from rtu_bus import SerialTiming, READ_REQUEST_LENGTH
+
+# 网关返回这两个异常码表示后面的从站不存在或没有应答
+GATEWAY_EXCEPTIONS = (0x0A, 0x0B)
+# FC03 读 1 个寄存器的 RTU 应答长度
+READ_ONE_RESPONSE_LENGTH = 7
+
+
+class AdaptiveTimeout:
+    """ 按已观测到的应答时间调整超时，算法同 TCP 的 RTO: srtt + 4 * rttvar """
+    def __init__(self, initial, minimum, maximum):
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.srtt = None
+        self.rttvar = None
+        self._lock = threading.Lock()
+
+    def update(self, sample):
+        with self._lock:
+            if self.srtt is None:
+                self.srtt = sample
+                self.rttvar = sample / 2
+            else:
+                self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - sample)
+                self.srtt = 0.875 * self.srtt + 0.125 * sample
+
+    @property
+    def value(self):
+        if self.srtt is None:
+            return self.initial
+        return min(self.maximum, max(self.minimum, self.srtt + 4 * self.rttvar))
+
+
+class SlaveScanResult:
+    """ 一个有应答的从站。exception_code 不为 None 表示从站用异常响应回答了探测请求 """
+    def __init__(self, slave_id, latency, exception_code=None, sent_packet=b'', received_packet=b''):
+        self.slave_id = slave_id
+        self.latency = latency
+        self.exception_code = exception_code
+        self.sent_packet = sent_packet
+        self.received_packet = received_packet
+
+    def __repr__(self):
+        return f"SlaveScanResult(slave_id={self.slave_id}, latency={self.latency * 1000:.1f}ms)"
+
+
+class SlaveScanner:
+    """ 在当前连接上探测 1-247 中哪些从站地址有应答。
+
+    probe 为 'read' 时读 address 处的 1 个保持寄存器，为 'report_slave_id' 时发送 FC11；
+    任何正常或异常响应都说明该地址上有设备。RTU 总线上逐个探测，超时从帧长算起；
+    TCP 网关上额外建立最多 concurrency - 1 条连接并发探测。
+    """
+    def __init__(self, modbus_debugger, probe='read', address=0, concurrency=8,
+                 initial_timeout=None, min_timeout=None, max_timeout=1.0):
+        if probe not in ('read', 'report_slave_id'):
+            raise ValueError(f"未知的探测方式: {probe}")
+        self.logger = logging.getLogger(__name__)
+        self.modbus_debugger = modbus_debugger
+        self.probe = probe
+        self.address = address
+        self.concurrency = concurrency
+        self.silent_interval = 0
+        if modbus_debugger._connection_type == "rtu":
+            timing = SerialTiming.from_params(modbus_debugger._connection_params)
+            self.silent_interval = timing.silent_interval
+            # FC11 的应答长度由设备决定，按一帧较长的应答估算
+            response_length = READ_ONE_RESPONSE_LENGTH if probe == 'read' else 64
+            default_timeout = timing.response_timeout(READ_REQUEST_LENGTH, response_length)
+            default_minimum = timing.frame_time(READ_REQUEST_LENGTH + READ_ONE_RESPONSE_LENGTH) + timing.silent_interval
+        else:
+            default_timeout = 0.25
+            default_minimum = 0.02
+        self.timeout = AdaptiveTimeout(
+            initial_timeout or default_timeout,
+            min_timeout or default_minimum,
+            max_timeout
+        )
+
+    def scan(self, slave_ids=range(1, 248), callback=None, stop_event=None):
+        """ 返回按地址排序的 SlaveScanResult 列表；callback(slave_id, result) 每探测一个地址调用一次 """
+        if not self.modbus_debugger.client:
+            raise ValueError("未连接到设备")
+        stop_event = stop_event or threading.Event()
+        pending = queue.Queue()
+        for slave_id in slave_ids:
+            pending.put(slave_id)
+        results = []
+        results_lock = threading.Lock()
+        previous_timeout = self.modbus_debugger.client.comm_params.timeout_connect
+
+        def work(debugger):
+            while not stop_event.is_set():
+                try:
+                    slave_id = pending.get_nowait()
+                except queue.Empty:
+                    return
+                result = self._probe(debugger, slave_id)
+                if result:
+                    with results_lock:
+                        results.append(result)
+                if callback:
+                    callback(slave_id, result)
+
+        workers = self._open_workers()
+        started = time.perf_counter()
+        try:
+            threads = [threading.Thread(target=work, args=(debugger,), daemon=True) for debugger in workers[1:]]
+            for thread in threads:
+                thread.start()
+            work(workers[0])
+            for thread in threads:
+                thread.join()
+        finally:
+            for debugger in workers[1:]:
+                debugger.capture = None  # 共享的抓包由主连接负责关闭
+                debugger.disconnect()
+            self.modbus_debugger.set_timeout(previous_timeout)
+        self.logger.info(f"扫描完成: {len(results)} 个从站有应答，"
+                         f"{len(workers)} 条连接，用时 {time.perf_counter() - started:.2f} 秒")
+        return sorted(results, key=lambda r: r.slave_id)
+
+    def _open_workers(self):
+        """ TCP 上为并发探测建立额外连接；网关拒绝更多连接时就用已有的 """
+        debugger = self.modbus_debugger
+        workers = [debugger]
+        if debugger._connection_type != "tcp":
+            return workers
+        config = dict(debugger.config or {})
+        config['packet_capture'] = {'enabled': False, 'log_dir': debugger.log_dir}
+        for _ in range(self.concurrency - 1):
+            worker = ModbusDebugger(config)
+            if not worker.connect_tcp(debugger._connection_params['host'], debugger._connection_params['port'],
+                                      debugger._slave_id):
+                worker.disconnect()
+                break
+            worker.capture = debugger.capture
+            worker.latency = debugger.latency
+            workers.append(worker)
+        return workers
+
+    def _probe(self, debugger, slave_id):
+        if self.silent_interval:
+            time.sleep(self.silent_interval)
+        debugger.set_timeout(self.timeout.value)
+        if self.probe == 'report_slave_id':
+            call = lambda: debugger.client.report_slave_id(slave=slave_id)
+        else:
+            call = lambda: debugger.client.read_holding_registers(self.address, count=1, slave=slave_id)
+        start = time.perf_counter()
+        try:
+            result, sent, received = debugger._execute(call)
+        except ModbusException as e:
+            self.logger.debug(f"探测从站 {slave_id} 时发生错误: {str(e)}")
+            result, sent, received = e, debugger.last_sent_packet, debugger.last_received_packet
+        latency = time.perf_counter() - start
+
+        if isinstance(result, ModbusException) or not received:
+            # 没有应答时 pymodbus 会关闭连接，直接重新打开，不走退避重连
+            debugger.reopen()
+            return None
+        exception_code = None
+        if isinstance(result, ExceptionResponse):
+            exception_code = result.exception_code
+            if exception_code in GATEWAY_EXCEPTIONS:
+                return None
+        self.timeout.update(latency)
+        return SlaveScanResult(slave_id, latency, exception_code, sent, received)
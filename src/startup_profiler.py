@@ -0,0 +1,149 @@
+#大牛大巨婴
+# 启动耗时分析: main.py --profile-startup 时启用，统计各启动阶段和每个模块的导入耗时，结果输出到 stderr
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# 当前启用的分析器，没有启用时 phase() 什么也不做
+_active = None
+
+
+def phase(name):
+    """ 界面等模块在这里标记启动阶段，不需要关心是否启用了分析 """
+    return _active.phase(name) if _active else nullcontext()
+
+
+class _TimedLoader:
+    """ 包装模块的 loader，只在执行模块代码时计时，其余属性原样转发 """
+    def __init__(self, loader, name, timer):
+        self._loader = loader
+        self._name = name
+        self._timer = timer
+        self._create_time = 0.0
+
+    def create_module(self, spec):
+        # 扩展模块(.so/.pyd)的加载耗时主要在这里
+        start = time.perf_counter()
+        try:
+            return self._loader.create_module(spec)
+        finally:
+            self._create_time = time.perf_counter() - start
+
+    def exec_module(self, module):
+        self._timer.enter(self._name, self._create_time)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timer.exit()
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class ImportTimer:
+    """ 放在 sys.meta_path 最前面的查找器，效果与 python -X importtime 相同，但可以在运行时开关。
+
+    累计耗时包含它导入的子模块，自身耗时不包含；只统计主线程的导入。
+    """
+    def __init__(self):
+        self.records = []
+        self._stack = []
+        self._thread = threading.get_ident()
+
+    def install(self):
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        if threading.get_ident() != self._thread:
+            return None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                spec.loader = _TimedLoader(spec.loader, fullname, self)
+            return spec
+        return None
+
+    def enter(self, name, elapsed=0.0):
+        # [模块名, 开始时间, 子模块耗时]，elapsed 是 create_module 已经用掉的时间
+        self._stack.append([name, time.perf_counter() - elapsed, 0.0])
+
+    def exit(self):
+        name, start, children = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        if self._stack:
+            self._stack[-1][2] += elapsed
+        self.records.append((name, elapsed, elapsed - children, len(self._stack)))
+
+    def slowest(self, count=20):
+        """ 按累计耗时排序的 (模块名, 累计, 自身)，只列顶层导入，子模块已计入父模块 """
+        top = [(name, elapsed, own) for name, elapsed, own, depth in self.records if depth == 0]
+        return sorted(top, key=lambda record: record[1], reverse=True)[:count]
+
+    def by_self_time(self, count=20):
+        return sorted(((name, elapsed, own) for name, elapsed, own, _ in self.records),
+                      key=lambda record: record[2], reverse=True)[:count]
+
+
+class StartupProfiler:
+    """ 记录启动阶段耗时: with profiler.phase("名称"): ...；mark() 记录从开始到某个时刻的耗时 """
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+        self.started = time.perf_counter()
+        self.phases = []
+        self.marks = []
+        self.imports = ImportTimer()
+        self.imports.install()
+        self._depth = 0
+
+    def start(self):
+        global _active
+        _active = self
+        return self
+
+    @contextmanager
+    def phase(self, name):
+        # 按开始顺序记录，嵌套的阶段缩进显示
+        entry = [self._depth, name, None]
+        self.phases.append(entry)
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry[2] = time.perf_counter() - start
+            self._depth -= 1
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter() - self.started))
+
+    def report(self, count=20):
+        global _active
+        _active = None
+        self.imports.uninstall()
+        ms = lambda seconds: f"{seconds * 1000:9.1f} ms"
+        lines = ["", "启动阶段:"]
+        for depth, name, elapsed in self.phases:
+            lines.append(f"  {'  ' * depth}{name:<{30 - 2 * depth}}{ms(elapsed or 0)}")
+        for name, elapsed in self.marks:
+            lines.append(f"  {name:<30}{ms(elapsed)}  (从启动开始)")
+        lines.append(f"  {'合计':<30}{ms(time.perf_counter() - self.started)}")
+        total_imports = sum(own for _, _, own, _ in self.imports.records)
+        lines.append(f"\n模块导入: {len(self.imports.records)} 个，共{ms(total_imports)}")
+        lines.append(f"  {'最慢的顶层导入':<40}{'累计':>12}{'自身':>12}")
+        for name, elapsed, own in self.imports.slowest(count):
+            lines.append(f"  {name:<40}{ms(elapsed)}{ms(own)}")
+        lines.append(f"  {'自身耗时最多的模块':<40}{'累计':>12}{'自身':>12}")
+        for name, elapsed, own in self.imports.by_self_time(count):
+            lines.append(f"  {name:<40}{ms(elapsed)}{ms(own)}")
+        self.stream.write('\n'.join(lines) + '\n')
+        self.stream.flush()
@@ -0,0 +1,127 @@
+#大牛大巨婴
+import asyncio
+import ipaddress
+import logging
+import struct
+import time
+
+# MBAP 报文头: 事务号(2) + 协议号(2) + 长度(2) + 单元号(1)
+MBAP_HEADER = struct.Struct('>HHHB')
+READ_ONE_REGISTER = struct.Struct('>BHH')
+REPORT_SLAVE_ID = 0x11
+
+
+def parse_ports(text):
+    """ "502, 5020-5022" -> [502, 5020, 5021, 5022] """
+    ports = []
+    for part in str(text).replace(' ', '').split(','):
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            ports.extend(range(int(first), int(last) + 1))
+        else:
+            ports.append(int(part))
+    return ports
+
+
+class SubnetScanResult:
+    """ 一个有 Modbus 应答的 主机:端口。exception_code 不为 None 表示以异常响应回答 """
+    def __init__(self, host, port, slave_id, function_code, connect_time, latency, exception_code=None):
+        self.host = host
+        self.port = port
+        self.slave_id = slave_id
+        self.function_code = function_code
+        self.connect_time = connect_time
+        self.latency = latency
+        self.exception_code = exception_code
+
+    def __repr__(self):
+        return (f"SubnetScanResult({self.host}:{self.port}, slave={self.slave_id}, "
+                f"FC{self.function_code:02X}, {self.latency * 1000:.1f}ms)")
+
+
+class SubnetScanner:
+    """ 用 asyncio 并发扫描一个网段内的 Modbus TCP 设备。
+
+    对每个 主机:端口 先发 FC03 读 1 个寄存器，没有 Modbus 应答时再试 FC11；
+    同时进行的连接数由 concurrency 限制，connect_time/latency 分别是建连和请求的耗时。
+    """
+    def __init__(self, ports=(502,), slave_id=1, address=0, concurrency=256, timeout=0.5):
+        self.logger = logging.getLogger(__name__)
+        self.ports = list(ports)
+        self.slave_id = slave_id
+        self.address = address
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.probed = 0
+
+    def targets(self, cidr):
+        network = ipaddress.ip_network(cidr, strict=False)
+        # /32 或 /31 时 hosts() 的行为不一致，单个地址直接扫描
+        hosts = list(network.hosts()) or [network.network_address]
+        return [(str(host), port) for host in hosts for port in self.ports]
+
+    async def scan(self, cidr, callback=None, stop_event=None):
+        """ 返回按 (主机, 端口) 排序的 SubnetScanResult 列表；callback(host, port, result) 每个目标调用一次 """
+        targets = self.targets(cidr)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        self.probed = 0
+        started = time.perf_counter()
+
+        async def probe(host, port):
+            async with semaphore:
+                if stop_event is not None and stop_event.is_set():
+                    return None
+                result = await self.probe(host, port)
+            self.probed += 1
+            if callback:
+                callback(host, port, result)
+            return result
+
+        results = await asyncio.gather(*(probe(host, port) for host, port in targets))
+        results = [result for result in results if result]
+        self.logger.info(f"网段 {cidr} 扫描完成: {len(targets)} 个目标，{len(results)} 个有应答，"
+                         f"用时 {time.perf_counter() - started:.2f} 秒")
+        return sorted(results, key=lambda r: (ipaddress.ip_address(r.host), r.port))
+
+    def scan_sync(self, cidr, callback=None, stop_event=None):
+        return asyncio.run(self.scan(cidr, callback, stop_event))
+
+    async def probe(self, host, port):
+        for function_code in (0x03, REPORT_SLAVE_ID):
+            try:
+                result = await self._transact(host, port, function_code)
+            except ConnectionRefusedError:
+                return None  # 端口没有监听，不必再试 FC11
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                continue
+            if result:
+                return result
+        return None
+
+    async def _transact(self, host, port, function_code):
+        start = time.perf_counter()
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), self.timeout)
+        connect_time = time.perf_counter() - start
+        try:
+            if function_code == REPORT_SLAVE_ID:
+                pdu = bytes([REPORT_SLAVE_ID])
+            else:
+                pdu = READ_ONE_REGISTER.pack(function_code, self.address, 1)
+            transaction_id = 1
+            writer.write(MBAP_HEADER.pack(transaction_id, 0, len(pdu) + 1, self.slave_id) + pdu)
+            start = time.perf_counter()
+            await writer.drain()
+            header = await asyncio.wait_for(reader.readexactly(MBAP_HEADER.size), self.timeout)
+            response_id, protocol_id, length, _ = MBAP_HEADER.unpack(header)
+            if response_id != transaction_id or protocol_id != 0 or not 2 <= length <= 254:
+                raise ValueError(f"不是 Modbus TCP 应答: {header.hex(' ')}")
+            response = await asyncio.wait_for(reader.readexactly(length - 1), self.timeout)
+            latency = time.perf_counter() - start
+        finally:
+            writer.close()
+        if response[0] & 0x7F != function_code:
+            raise ValueError(f"功能码不匹配: {response[0]:02X}")
+        exception_code = response[1] if response[0] & 0x80 else None
+        return SubnetScanResult(host, port, self.slave_id, function_code, connect_time, latency, exception_code)
@@ -0,0 +1,230 @@
+#大牛大巨婴
+import csv
+import json
+import logging
+import os
+from datetime import datetime
+from codec import STRUCT_CODES, struct_for
+from read_planner import BIT_REGISTER_TYPES, READ_FUNCTION_CODES, ReadPlanner, Tag, read_block
+
+# 点表列名，兼容 update_address_table 使用的中文列名
+COLUMN_ALIASES = {
+    '名称': 'name', '地址': 'address', '寄存器类型': 'register_type', '数据类型': 'data_type',
+    '字节序': 'byte_order', '字序': 'word_order', '比例': 'scale', '系数': 'scale', '单位': 'unit',
+    '描述': 'description', '从站地址': 'slave_id', '数量': 'count',
+    '死区': 'deadband', '死区百分比': 'deadband_percent',
+}
+REGISTER_TYPE_ALIASES = {
+    'hr': 'Holding Register', 'holding': 'Holding Register',
+    'ir': 'Input Register', 'input': 'Input Register',
+    'co': 'Coil', 'coil': 'Coil',
+    'di': 'Discrete Input', 'discrete': 'Discrete Input',
+}
+# 界面上的 AB/BA、1234/4321 写法
+BYTE_ORDER_ALIASES = {'ab': 'big', 'ba': 'little', 'big': 'big', 'little': 'little'}
+WORD_ORDER_ALIASES = {'1234': 'big', '4321': 'little', 'big': 'big', 'little': 'little'}
+
+# (字节序, 字序) -> (是否先交换每个寄存器内的两个字节, struct 字节序)
+# 字节序和字序都是 little 等于整体反转，相当于直接按小端解码；两者不一致时先做字内交换
+ORDER_LAYOUT = {
+    ('big', 'big'): (False, '>'),
+    ('little', 'little'): (False, '<'),
+    ('little', 'big'): (True, '>'),
+    ('big', 'little'): (True, '<'),
+}
+
+
+def _tag_from_row(row, line):
+    row = {COLUMN_ALIASES.get(key.strip(), key.strip()): value for key, value in row.items() if key}
+    row = {key: value.strip() if isinstance(value, str) else value for key, value in row.items()}
+    try:
+        register_type = row.get('register_type') or 'Holding Register'
+        register_type = REGISTER_TYPE_ALIASES.get(str(register_type).lower(), register_type)
+        return Tag(
+            address=int(row['address']),
+            register_type=register_type,
+            data_type=(row.get('data_type') or 'UINT16').upper(),
+            byte_order=BYTE_ORDER_ALIASES[str(row.get('byte_order') or 'big').lower()],
+            word_order=WORD_ORDER_ALIASES[str(row.get('word_order') or 'big').lower()],
+            slave_id=int(row['slave_id']) if row.get('slave_id') not in (None, '') else None,
+            name=row.get('name') or None,
+            count=int(row['count']) if row.get('count') not in (None, '') else None,
+            scale=float(row['scale']) if row.get('scale') not in (None, '') else 1,
+            unit=row.get('unit') or '',
+            description=row.get('description') or '',
+            deadband=float(row['deadband']) if row.get('deadband') not in (None, '') else None,
+            deadband_percent=float(row['deadband_percent']) if row.get('deadband_percent') not in (None, '') else None,
+        )
+    except (KeyError, ValueError) as e:
+        raise ValueError(f"第 {line} 个点位无效: {e}") from e
+
+
+def read_rows(path, key='tags'):
+    """ 读取 CSV 或 JSON 表格，返回字典列表；JSON 可以是列表，也可以是 {key: 列表} """
+    if os.path.splitext(path)[1].lower() == '.json':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data.get(key, []) if isinstance(data, dict) else data
+    # utf-8-sig: Excel 导出的 CSV 带 BOM
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def load_tags(path):
+    """ 从 CSV 或 JSON 文件读取点位列表 """
+    return [_tag_from_row(row, i + 1) for i, row in enumerate(read_rows(path))]
+
+
+class CompiledBlock:
+    """ 一个读块及其解码表。
+
+    同一块里字节序/字序相同的点位合成一个 struct 格式，点位之间的空洞用填充字节跳过，
+    每个周期一次 unpack_from 就能解出整组点位。
+    """
+    def __init__(self, block):
+        self.block = block
+        self.is_bit = block.register_type in BIT_REGISTER_TYPES
+        # [(是否字内交换, Struct, [(tag, 值个数, 类型)])]
+        self.groups = []
+        if not self.is_bit:
+            self._compile()
+
+    def _compile(self):
+        layouts = {}
+        for tag in sorted(self.block.tags, key=lambda t: t.address):
+            code, width = STRUCT_CODES.get(tag.data_type, (None, 1))
+            if code and width > 1:
+                layout = ORDER_LAYOUT[(tag.byte_order, tag.word_order)]
+            elif tag.data_type == 'BOOL':
+                # 位按寄存器值逐位展开，与字节序无关
+                layout = (False, '>')
+            else:
+                # 单寄存器和按字节处理的类型只受字节序影响
+                layout = (tag.byte_order == 'little', '>')
+            # 同一布局下地址重叠的点位放进下一个格式
+            groups = layouts.setdefault(layout, [])
+            offset = (tag.address - self.block.start) * 2
+            for group in groups:
+                if group['position'] <= offset:
+                    break
+            else:
+                group = {'formats': [], 'fields': [], 'position': 0}
+                groups.append(group)
+            if offset > group['position']:
+                group['formats'].append(f"{offset - group['position']}x")
+            field_format, values, kind = self._field(tag, code, width)
+            group['formats'].append(field_format)
+            group['fields'].append((tag, values, kind))
+            group['position'] = offset + tag.count * 2
+
+        for (swap, endian), groups in layouts.items():
+            for group in groups:
+                self.groups.append((swap, struct_for(endian + ''.join(group['formats'])), group['fields']))
+
+    @staticmethod
+    def _field(tag, code, width):
+        if code:
+            count = max(1, tag.count // width)
+            return f"{count}{code}", count, 'number'
+        if tag.data_type == 'BOOL':
+            return f"{tag.count}H", tag.count, 'bits'
+        if tag.data_type == 'UNIX_TIMESTAMP':
+            return 'I', 1, 'timestamp'
+        if tag.data_type in ('BYTE', 'ASCII'):
+            return f"{tag.count * 2}s", 1, tag.data_type.lower()
+        raise ValueError(f"未知的数据类型: {tag.data_type}")
+
+    def decode(self, values):
+        """ values 是块的寄存器值(UINT16)或位列表，返回 [(tag, 值)] """
+        if self.is_bit:
+            return [(tag, values[tag.address - self.block.start:tag.end - self.block.start])
+                    for tag in self.block.tags]
+        raw = struct_for(f'>{len(values)}H').pack(*values)
+        swapped = None
+        decoded = []
+        for swap, group_struct, fields in self.groups:
+            if swap:
+                if swapped is None:
+                    swapped = bytearray(len(raw))
+                    swapped[0::2] = raw[1::2]
+                    swapped[1::2] = raw[0::2]
+                items = group_struct.unpack_from(swapped)
+            else:
+                items = group_struct.unpack_from(raw)
+            index = 0
+            for tag, count, kind in fields:
+                if kind == 'number':
+                    value = items[index] if count == 1 else list(items[index:index + count])
+                    if tag.scale != 1:
+                        value = value * tag.scale if count == 1 else [v * tag.scale for v in value]
+                elif kind == 'bits':
+                    value = [bool(register & (1 << i)) for register in items[index:index + count] for i in range(16)]
+                elif kind == 'timestamp':
+                    value = self._format_timestamp(items[index])
+                elif kind == 'ascii':
+                    value = items[index].decode('latin-1').rstrip('\x00')
+                else:
+                    value = list(items[index])
+                decoded.append((tag, value))
+                index += count if kind in ('number', 'bits') else 1
+        return decoded
+
+    @staticmethod
+    def _format_timestamp(timestamp):
+        try:
+            return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+        except (ValueError, OSError):
+            return f"无效时间戳: {timestamp}"
+
+
+class TagDatabase:
+    """ 点表。compile() 只需调用一次，之后每个轮询周期执行 poll() 即可。 """
+    def __init__(self, tags=(), planner=None):
+        self.logger = logging.getLogger(__name__)
+        self.tags = []
+        self.planner = planner or ReadPlanner()
+        self.blocks = None
+        for tag in tags:
+            self.add(tag)
+
+    @classmethod
+    def from_file(cls, path, planner=None):
+        return cls(load_tags(path), planner)
+
+    def add(self, tag):
+        if tag.register_type not in READ_FUNCTION_CODES:
+            raise ValueError(f"不支持的寄存器类型: {tag.register_type}")
+        if any(existing.name == tag.name for existing in self.tags):
+            raise ValueError(f"点位名称重复: {tag.name}")
+        self.tags.append(tag)
+        self.blocks = None
+
+    def compile(self):
+        self.blocks = [CompiledBlock(block) for block in self.planner.plan(self.tags)]
+        self.logger.info(f"点表编译完成: {len(self.tags)} 个点位，{len(self.blocks)} 个读请求")
+        return self.blocks
+
+    def poll(self, debugger):
+        """ 执行一个轮询周期，返回 ({点位名称: 值}, [(发送报文, 接收报文), ...])；读取失败的块对应的值为 None """
+        if self.blocks is None:
+            self.compile()
+        values = {}
+        packets = []
+        for compiled in self.blocks:
+            raw, sent, received = read_block(debugger, compiled.block)
+            packets.append((sent, received))
+            if raw is None:
+                values.update((tag.name, None) for tag in compiled.block.tags)
+                continue
+            try:
+                values.update((tag.name, value) for tag, value in compiled.decode(raw))
+            except Exception as e:
+                self.logger.error(f"解码 {compiled.block} 时发生错误: {str(e)}")
+                values.update((tag.name, None) for tag in compiled.block.tags)
+        return values, packets
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __iter__(self):
+        return iter(self.tags)
@@ -0,0 +1,209 @@
+#大牛大巨婴
+import logging
+import threading
+from codec import STRUCT_CODES, get_codec
+from read_planner import registers_per_value
+from tag_database import (COLUMN_ALIASES, REGISTER_TYPE_ALIASES, BYTE_ORDER_ALIASES, WORD_ORDER_ALIASES,
+                          read_rows)
+
+# Modbus PDU 限制: FC16 一次最多写 123 个寄存器，FC15 一次最多写 1968 个线圈
+MAX_WRITE_REGISTERS = 123
+MAX_WRITE_COILS = 1968
+WRITE_FUNCTION_CODES = {
+    'Holding Register': 16,
+    'Coil': 15,
+}
+# 配方文件的数值列
+RECIPE_COLUMN_ALIASES = dict(COLUMN_ALIASES, **{'值': 'value', '数值': 'value', '写入值': 'value'})
+TRUE_VALUES = ('1', 'true', 'on')
+FALSE_VALUES = ('0', 'false', 'off')
+
+
+class WriteBlock:
+    """ 一次 FC15/FC16 请求: 从 start 开始的连续地址 """
+    def __init__(self, register_type, slave_id, start, values):
+        self.register_type = register_type
+        self.slave_id = slave_id
+        self.start = start
+        self.values = values
+
+    @property
+    def function_code(self):
+        return WRITE_FUNCTION_CODES[self.register_type]
+
+    @property
+    def count(self):
+        return len(self.values)
+
+    def __repr__(self):
+        return (f"WriteBlock(FC{self.function_code:02d}, slave={self.slave_id}, "
+                f"start={self.start}, count={self.count})")
+
+
+class WriteQueue:
+    """ 写队列。同一从站上相邻或重叠地址的待写值合并成尽量少的 FC16/FC15 请求。
+
+    同一地址多次写入时只保留最后一次的值。合并后按从站、地址顺序发送，不保证与加入队列的顺序一致；
+    地址之间的空洞不会被一并写入，以免改写队列之外的寄存器。
+    超过 PDU 上限拆分请求时只在值的边界处拆分，一个 FLOAT32/INT64 等多寄存器值总在同一个请求里写入。
+    """
+    def __init__(self, max_registers=MAX_WRITE_REGISTERS, max_coils=MAX_WRITE_COILS):
+        self.logger = logging.getLogger(__name__)
+        self.max_registers = max_registers
+        self.max_coils = max_coils
+        # (从站地址, 寄存器类型) -> {地址: (值, 是否为一个值的第一个寄存器)}，dict 覆盖赋值即"后写的值生效"
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add_registers(self, address, registers, slave_id=None, registers_per_value=1):
+        """ 加入已经编码好的寄存器值(UINT16)，每 registers_per_value 个寄存器是一个值，拆分请求时不会分开 """
+        registers = [int(register) for register in registers]
+        if any(not 0 <= register <= 0xFFFF for register in registers):
+            raise ValueError("寄存器值必须在 0-65535 范围内")
+        if registers_per_value < 1:
+            raise ValueError(f"无效的每值寄存器数: {registers_per_value}")
+        self._add('Holding Register', address, registers, slave_id, registers_per_value)
+
+    def add_values(self, address, values, data_type='UINT16', byte_order='big', word_order='big', slave_id=None):
+        """ 按数据类型和字节序/字序编码后加入队列 """
+        self.add_registers(address, get_codec(data_type, byte_order, word_order).encode(values), slave_id,
+                           registers_per_value(data_type))
+
+    def add_coils(self, address, values, slave_id=None):
+        self._add('Coil', address, [bool(value) for value in values], slave_id)
+
+    def _add(self, register_type, address, values, slave_id, width=1):
+        if not values:
+            return
+        if address < 0 or address + len(values) > 0x10000:
+            raise ValueError(f"地址超出范围: {address}-{address + len(values) - 1}")
+        with self._lock:
+            pending = self._pending.setdefault((slave_id, register_type), {})
+            for offset, value in enumerate(values):
+                pending[address + offset] = (value, offset % width == 0)
+
+    def plan(self):
+        """ 返回合并后的 WriteBlock 列表，不修改队列 """
+        with self._lock:
+            snapshot = {key: dict(values) for key, values in self._pending.items()}
+        blocks = []
+        for (slave_id, register_type), values in sorted(snapshot.items(),
+                                                        key=lambda item: (item[0][0] or 0, item[0][1])):
+            limit = self.max_coils if register_type == 'Coil' else self.max_registers
+            start = None
+            run = []
+            cut = 0  # run 中最后一个值的起始位置
+            for address in sorted(values):
+                value, first = values[address]
+                if run and address != start + len(run):
+                    blocks.append(WriteBlock(register_type, slave_id, start, run))
+                    run = []
+                elif run and len(run) >= limit:
+                    # 在最后一个值的边界处拆分，被截断的值留到下一个请求；单个值超过上限时只能整段拆分
+                    split = len(run) if first else cut or len(run)
+                    blocks.append(WriteBlock(register_type, slave_id, start, run[:split]))
+                    start += split
+                    run = run[split:]
+                    cut = 0
+                if not run:
+                    start = address
+                    cut = 0
+                if first:
+                    cut = len(run)
+                run.append(value)
+            if run:
+                blocks.append(WriteBlock(register_type, slave_id, start, run))
+        return blocks
+
+    def flush(self, debugger):
+        """ 执行队列中的写入，返回 [(WriteBlock, 是否成功, 消息, (发送报文, 接收报文))]。
+
+        某个请求失败后停止，失败的和尚未发送的值留在队列中，可以重试。
+        """
+        results = []
+        for block in self.plan():
+            if block.register_type == 'Coil':
+                success, message, packets = debugger.write_coils(block.start, block.values, block.slave_id)
+            else:
+                success, message, packets = debugger.write_registers(block.start, block.values, block.slave_id)
+            results.append((block, success, message, packets))
+            if not success:
+                self.logger.error(f"{block} 写入失败，队列中还有 {len(self)} 个值: {message}")
+                break
+            self._discard(block)
+        return results
+
+    def _discard(self, block):
+        # 发送期间又加入了同一地址的新值时保留新值
+        with self._lock:
+            pending = self._pending.get((block.slave_id, block.register_type), {})
+            for address, value in enumerate(block.values, block.start):
+                if address in pending and pending[address][0] == value:
+                    del pending[address]
+            if not pending:
+                self._pending.pop((block.slave_id, block.register_type), None)
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+
+    def load_recipe(self, path):
+        """ 从 CSV/JSON 配方文件加入写入值，列名与点表相同，另加"值"列；返回加入的行数 """
+        rows = read_rows(path, key='recipe')
+        entries = [_recipe_entry(row, i + 1) for i, row in enumerate(rows)]
+        for register_type, address, values, data_type, byte_order, word_order, slave_id in entries:
+            if register_type == 'Coil':
+                self.add_coils(address, values, slave_id)
+            else:
+                self.add_values(address, values, data_type, byte_order, word_order, slave_id)
+        self.logger.info(f"配方已加入写队列: {len(entries)} 行，共 {len(self)} 个地址")
+        return len(entries)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(values) for values in self._pending.values())
+
+
+def parse_write_value(text, register_type, data_type):
+    """ 把配方或命令行里的文本转换成写入值 """
+    text = str(text).strip()
+    if register_type == 'Coil':
+        if text.lower() in TRUE_VALUES:
+            return True
+        if text.lower() in FALSE_VALUES:
+            return False
+        raise ValueError(f"无效的线圈值: {text}")
+    if data_type.startswith('FLOAT'):
+        return float(text)
+    return int(text, 16) if text.lower().startswith('0x') else int(text)
+
+
+def _recipe_entry(row, line):
+    row = {RECIPE_COLUMN_ALIASES.get(key.strip(), key.strip()): value for key, value in row.items() if key}
+    row = {key: value.strip() if isinstance(value, str) else value for key, value in row.items()}
+    try:
+        register_type = row.get('register_type') or 'Holding Register'
+        register_type = REGISTER_TYPE_ALIASES.get(str(register_type).lower(), register_type)
+        if register_type not in WRITE_FUNCTION_CODES:
+            raise ValueError(f"{register_type} 不支持写入")
+        data_type = (row.get('data_type') or 'UINT16').upper()
+        address = int(row['address'])
+        slave_id = int(row['slave_id']) if row.get('slave_id') not in (None, '') else None
+        byte_order = BYTE_ORDER_ALIASES[str(row.get('byte_order') or 'big').lower()]
+        word_order = WORD_ORDER_ALIASES[str(row.get('word_order') or 'big').lower()]
+        value = row['value']
+        if register_type == 'Coil':
+            values = [parse_write_value(value, register_type, data_type)]
+        elif data_type == 'ASCII':
+            values = str(value)
+        elif data_type == 'UNIX_TIMESTAMP':
+            # 与界面写入一致: 高位字在前的两个寄存器
+            timestamp = int(value)
+            values = [(timestamp >> 16) & 0xFFFF, timestamp & 0xFFFF]
+        elif data_type in STRUCT_CODES:
+            values = [parse_write_value(value, register_type, data_type)]
+        else:
+            raise ValueError(f"配方不支持的数据类型: {data_type}")
+        return register_type, address, values, data_type, byte_order, word_order, slave_id
+    except (KeyError, ValueError) as e:
+        raise ValueError(f"配方第 {line} 行无效: {e}") from e
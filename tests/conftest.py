@@ -0,0 +1,77 @@
+#大牛大巨婴
+# src 下的模块按平铺方式互相导入，测试时把 src 加入 sys.path
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import pytest
+from codec import get_codec
+
+
+class FakeDebugger:
+    """ 代替 ModbusDebugger: 寄存器和线圈存在内存里，记录每一个请求，可以指定某些起始地址读取失败 """
+    def __init__(self):
+        self.registers = {}  # (寄存器类型, 地址) -> UINT16，未设置的地址返回地址本身的低 16 位
+        self.bits = {}  # (寄存器类型, 地址) -> bool，未设置的地址返回 地址 % 3 == 0
+        self.requests = []  # (功能码, 起始地址, 数量, 从站地址)
+        self.fail_starts = set()
+        self.fail_writes = set()
+
+    def _registers(self, register_type, function_code, address, count, slave_id):
+        self.requests.append((function_code, address, count, slave_id))
+        if address in self.fail_starts:
+            return None, b'', b''
+        values = [self.registers.get((register_type, a), a & 0xFFFF) for a in range(address, address + count)]
+        return values, bytes([function_code]), b'\x00'
+
+    def _bits(self, register_type, function_code, address, count, slave_id):
+        self.requests.append((function_code, address, count, slave_id))
+        if address in self.fail_starts:
+            return None, b'', b''
+        # pymodbus 把位数补齐到 8 的倍数
+        padded = (count + 7) // 8 * 8
+        return ([self.bits.get((register_type, a), a % 3 == 0) for a in range(address, address + padded)],
+                bytes([function_code]), b'\x00')
+
+    def read_holding_registers(self, address, count, slave_id=None, data_type='UINT16', byte_order='big',
+                               word_order='big'):
+        values, sent, received = self._registers('Holding Register', 3, address, count, slave_id)
+        return (values if values is None else self.process_data(values, data_type, byte_order, word_order),
+                sent, received)
+
+    def read_input_registers(self, address, count, slave_id=None, data_type='UINT16', byte_order='big',
+                             word_order='big'):
+        values, sent, received = self._registers('Input Register', 4, address, count, slave_id)
+        return (values if values is None else self.process_data(values, data_type, byte_order, word_order),
+                sent, received)
+
+    def read_coils(self, address, count, slave_id=None):
+        return self._bits('Coil', 1, address, count, slave_id)
+
+    def read_discrete_inputs(self, address, count, slave_id=None):
+        return self._bits('Discrete Input', 2, address, count, slave_id)
+
+    def write_registers(self, address, values, slave_id=None):
+        self.requests.append((16, address, len(values), slave_id))
+        if address in self.fail_writes:
+            return False, "写入失败", (b'', b'')
+        for offset, value in enumerate(values):
+            self.registers[('Holding Register', address + offset)] = value
+        return True, "写入成功", (b'\x10', b'\x10')
+
+    def write_coils(self, address, values, slave_id=None):
+        self.requests.append((15, address, len(values), slave_id))
+        if address in self.fail_writes:
+            return False, "写入失败", (b'', b'')
+        for offset, value in enumerate(values):
+            self.bits[('Coil', address + offset)] = bool(value)
+        return True, "写入成功", (b'\x0f', b'\x0f')
+
+    def process_data(self, registers, data_type, byte_order='big', word_order='big'):
+        return get_codec(data_type, byte_order, word_order).decode(registers)
+
+
+@pytest.fixture
+def debugger():
+    return FakeDebugger()
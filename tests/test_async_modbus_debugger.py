@@ -0,0 +1,142 @@
+#大牛大巨婴
+import asyncio
+from pymodbus.exceptions import ModbusIOException
+from pymodbus.pdu import ExceptionResponse
+from pymodbus.pdu.register_read_message import ReadHoldingRegistersResponse
+from async_modbus_debugger import AsyncModbusDebugger, ProtocolWrapper, poll_devices
+
+REQUEST = b'\x00\x01\x00\x00\x00\x06\x01\x03\x00\x00\x00\x01'
+RESPONSE = b'\x00\x01\x00\x00\x00\x05\x01\x03\x02\x00\x07'
+
+
+class FakeProtocol:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, data, addr=None):
+        self.sent.append(data)
+
+    def data_received(self, data):
+        pass
+
+
+class FakeAsyncClient:
+    """ 依次返回预设的结果，结果为异常对象时和 pymodbus 一样抛出 ModbusIOException """
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = 0
+        self.ctx = FakeProtocol()
+
+    async def _respond(self):
+        self.calls += 1
+        # 经过 ProtocolWrapper 收发报文，和真实客户端一样触发延迟统计
+        self.ctx.send(REQUEST)
+        result = self.results.pop(0)
+        if isinstance(result, ModbusIOException):
+            raise result
+        self.ctx.data_received(RESPONSE)
+        return result
+
+    async def read_holding_registers(self, address, count=1, slave=1):
+        return await self._respond()
+
+    async def write_registers(self, address, values, slave=1):
+        return await self._respond()
+
+    async def write_coils(self, address, values, slave=1):
+        return await self._respond()
+
+    def close(self):
+        pass
+
+
+def make_debugger(results, reconnect_result=True):
+    debugger = AsyncModbusDebugger({})
+    debugger.client = FakeAsyncClient(results)
+    debugger._connection_type = 'tcp'
+    debugger._connection_params = {'host': 'plc', 'port': 502}
+    debugger._slave_id = 1
+    debugger._wrap_client_socket()
+    debugger.reconnects = 0
+
+    async def reconnect():
+        debugger.reconnects += 1
+        return reconnect_result
+
+    debugger._reconnect = reconnect
+    return debugger
+
+
+def test_exception_response_is_returned_without_reconnect():
+    debugger = make_debugger([ExceptionResponse(3, 2)])
+    values, sent, received = asyncio.run(debugger.read_holding_registers(100, 1))
+    assert values is None
+    assert (sent, received) == (REQUEST, RESPONSE)
+    assert (debugger.client.calls, debugger.reconnects) == (1, 0)
+
+    debugger = make_debugger([ExceptionResponse(16, 2)])
+    success, message, _ = asyncio.run(debugger.write_registers(100, [1]))
+    assert not success and 'Exception Response' in message
+    assert (debugger.client.calls, debugger.reconnects) == (1, 0)
+
+    debugger = make_debugger([ExceptionResponse(15, 2)])
+    success, _, _ = asyncio.run(debugger.write_coils(100, [True]))
+    assert not success
+    assert (debugger.client.calls, debugger.reconnects) == (1, 0)
+
+
+def test_io_error_reconnects_and_retries_once():
+    debugger = make_debugger([ModbusIOException("无应答"), ReadHoldingRegistersResponse([7])])
+    values, _, _ = asyncio.run(debugger.read_holding_registers(0, 1))
+    assert values == [7]
+    assert (debugger.client.calls, debugger.reconnects) == (2, 1)
+
+    debugger = make_debugger([ModbusIOException("无应答"), ModbusIOException("无应答")])
+    success, _, _ = asyncio.run(debugger.write_registers(0, [1]))
+    assert not success
+    assert (debugger.client.calls, debugger.reconnects) == (2, 1)
+
+
+def test_failed_reconnect_does_not_resend():
+    debugger = make_debugger([ModbusIOException("无应答")], reconnect_result=False)
+    values, _, _ = asyncio.run(debugger.read_holding_registers(0, 1))
+    assert values is None
+    assert (debugger.client.calls, debugger.reconnects) == (1, 1)
+
+
+def test_latency_is_recorded_per_device_and_function_code():
+    debugger = make_debugger([ReadHoldingRegistersResponse([7]), ExceptionResponse(3, 2), ModbusIOException("无应答")],
+                             reconnect_result=False)
+
+    async def run():
+        await debugger.read_holding_registers(0, 1)
+        await debugger.read_holding_registers(0, 1)
+        await debugger.read_holding_registers(0, 1)
+
+    asyncio.run(run())
+    row, = debugger.latency.summary()
+    assert (row['device'], row['function_code']) == ('plc:502/1', 3)
+    assert (row['count'], row['exceptions'], row['timeouts'], row['retries']) == (2, 1, 1, 0)
+    assert row['min_ms'] >= 0
+
+
+def test_protocol_wrapper_counts_retransmissions():
+    debugger = AsyncModbusDebugger({})
+    protocol = FakeProtocol()
+    ProtocolWrapper(protocol, debugger)
+    protocol.send(b'\x01')
+    protocol.send(b'\x02')
+    protocol.data_received(b'\x03')
+    assert debugger._sends == 2
+    assert debugger.last_sent_packet == b'\x01\x02'
+    assert debugger.last_received_packet == b'\x03'
+    assert protocol.sent == [b'\x01', b'\x02']
+
+
+def test_poll_devices_keeps_order():
+    first = make_debugger([ReadHoldingRegistersResponse([1])])
+    second = make_debugger([ExceptionResponse(3, 2)])
+    results = asyncio.run(poll_devices([first, second], 0, 1))
+    assert [values for values, _, _ in results] == [[1], None]
+    assert second.reconnects == 0
+
@@ -0,0 +1,129 @@
+#大牛大巨婴
+import struct
+import pytest
+from codec import RAW_TYPES, STRUCT_CODES, get_codec, struct_for
+from modbus_debugger import ModbusDebugger
+from write_queue import WriteQueue
+
+ORDERS = [('big', 'big'), ('big', 'little'), ('little', 'big'), ('little', 'little')]
+SAMPLES = {
+    'INT16': [0, 1, -1, -32768, 32767],
+    'UINT16': [0, 1, 0x1234, 0xFFFF],
+    'INT32': [0, -1, -2 ** 31, 2 ** 31 - 1, 0x12345678],
+    'UINT32': [0, 1, 0x12345678, 2 ** 32 - 1],
+    'INT64': [0, -1, -2 ** 63, 2 ** 63 - 1, 0x0102030405060708],
+    'UINT64': [0, 2 ** 64 - 1, 0x0102030405060708],
+    'FLOAT32': [0.0, 1.5, -2.25, 2.0 ** 127],
+    'FLOAT64': [0.0, 1.5, -2.25, 1.7976931348623157e308],
+}
+
+
+@pytest.mark.parametrize('byte_order,word_order', ORDERS)
+@pytest.mark.parametrize('data_type', list(STRUCT_CODES))
+def test_numeric_round_trip(data_type, byte_order, word_order):
+    codec = get_codec(data_type, byte_order, word_order)
+    values = SAMPLES[data_type]
+    registers = codec.encode(values)
+    assert len(registers) == len(values) * STRUCT_CODES[data_type][1]
+    assert all(0 <= register <= 0xFFFF for register in registers)
+    assert codec.decode(registers) == values
+
+
+@pytest.mark.parametrize('byte_order,word_order', ORDERS)
+@pytest.mark.parametrize('data_type', list(STRUCT_CODES))
+def test_numeric_encode_matches_payload_builder(data_type, byte_order, word_order):
+    payload = pytest.importorskip('pymodbus.payload')
+    from pymodbus.constants import Endian
+    endian = {'big': Endian.BIG, 'little': Endian.LITTLE}
+    builder = payload.BinaryPayloadBuilder(byteorder=endian[byte_order], wordorder=endian[word_order])
+    method = {
+        'INT16': builder.add_16bit_int, 'UINT16': builder.add_16bit_uint,
+        'INT32': builder.add_32bit_int, 'UINT32': builder.add_32bit_uint,
+        'INT64': builder.add_64bit_int, 'UINT64': builder.add_64bit_uint,
+        'FLOAT32': builder.add_32bit_float, 'FLOAT64': builder.add_64bit_float,
+    }[data_type]
+    for value in SAMPLES[data_type]:
+        method(value)
+    assert get_codec(data_type, byte_order, word_order).encode(SAMPLES[data_type]) == builder.to_registers()
+
+
+def test_word_order_swaps_registers_within_each_value():
+    assert get_codec('UINT32', 'big', 'big').encode([0x12345678]) == [0x1234, 0x5678]
+    assert get_codec('UINT32', 'big', 'little').encode([0x12345678]) == [0x5678, 0x1234]
+    assert get_codec('UINT32', 'little', 'big').encode([0x12345678]) == [0x3412, 0x7856]
+    assert get_codec('UINT32', 'little', 'little').encode([0x12345678, 1]) == [0x7856, 0x3412, 0x0100, 0x0000]
+
+
+def test_decode_drops_incomplete_trailing_value():
+    assert get_codec('FLOAT32').decode([0x3FC0, 0x0000, 0x1234]) == [1.5]
+    assert get_codec('UINT32').decode([]) == []
+
+
+@pytest.mark.parametrize('byte_order,word_order', ORDERS)
+@pytest.mark.parametrize('text', ['', 'H', 'Hello', 'Modbus', 'abc\xff'])
+def test_ascii_round_trip(text, byte_order, word_order):
+    codec = get_codec('ASCII', byte_order, word_order)
+    registers = codec.encode(text)
+    assert len(registers) == (len(text) + 1) // 2
+    assert codec.decode(registers) == ([text] if registers else [])
+
+
+def test_ascii_register_layout():
+    # AB: 与 BinaryPayloadBuilder 相同；BA: 每个寄存器内字节交换，奇数长度的填充字节在高位
+    assert get_codec('ASCII', 'big').encode('Hello') == [0x4865, 0x6C6C, 0x6F00]
+    assert get_codec('ASCII', 'little').encode('Hello') == [0x6548, 0x6C6C, 0x006F]
+
+
+@pytest.mark.parametrize('byte_order', ['big', 'little'])
+def test_ascii_writes_match_between_gui_and_recipe(tmp_path, byte_order):
+    # 界面直接写入、写队列和配方都把字符串交给编码器，同一输入写出相同的寄存器，按同一字节序读回不变
+    path = tmp_path / 'recipe.csv'
+    path.write_text(f'address,data_type,byte_order,value\n0,ASCII,{byte_order},AB\n', encoding='utf-8')
+    recipe = WriteQueue()
+    recipe.load_recipe(str(path))
+    queued = WriteQueue()
+    queued.add_values(0, 'AB', 'ASCII', byte_order)
+    direct = ModbusDebugger({}).build_registers('AB', 'ASCII', byte_order)
+    assert recipe.plan()[0].values == queued.plan()[0].values == direct
+    assert get_codec('ASCII', byte_order).decode(direct) == ['AB']
+
+
+@pytest.mark.parametrize('byte_order', ['big', 'little'])
+def test_byte_round_trip(byte_order):
+    codec = get_codec('BYTE', byte_order)
+    values = [0x01, 0x02, 0xFE, 0xFF]
+    assert codec.decode(codec.encode(values)) == values
+    # 奇数个字节补一个 0
+    assert codec.decode(codec.encode([7, 8, 9])) == [7, 8, 9, 0]
+
+
+def test_bool_decodes_low_bit_first():
+    bits = get_codec('BOOL').decode([0x0005])
+    assert len(bits) == 16
+    assert bits[:4] == [True, False, True, False]
+    assert get_codec('BOOL').encode([1, 0x1FFFF]) == [1, 0xFFFF]
+
+
+def test_unix_timestamp():
+    codec = get_codec('UNIX_TIMESTAMP')
+    assert codec.decode([0x0000]) == ["时间戳数据不足"]
+    decoded = codec.decode([0x6000, 0x0000])
+    assert len(decoded) == 1 and decoded[0][:2] == '20'
+
+
+def test_codecs_are_cached_per_combination():
+    assert get_codec('FLOAT32', 'big', 'little') is get_codec('FLOAT32', 'big', 'little')
+    assert get_codec('FLOAT32', 'big', 'little') is not get_codec('FLOAT32', 'little', 'little')
+    assert struct_for('>2H') is struct_for('>2H')
+    assert struct_for('>2H').pack(1, 2) == struct.pack('>2H', 1, 2)
+
+
+@pytest.mark.parametrize('args', [('FLOAT16',), ('UINT16', 'middle'), ('UINT16', 'big', 'sideways')])
+def test_invalid_codec_arguments(args):
+    with pytest.raises(ValueError):
+        get_codec(*args)
+
+
+def test_raw_types_are_known():
+    for data_type in RAW_TYPES:
+        get_codec(data_type)
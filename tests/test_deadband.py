@@ -0,0 +1,100 @@
+#大牛大巨婴
+from deadband import DeadbandFilter
+from read_planner import Tag
+
+
+def test_change_only_mode_reports_first_value_and_changes():
+    deadband = DeadbandFilter()
+    assert [deadband.changed('a', v) for v in (1, 1, 2, 2, 1)] == [True, False, True, False, True]
+    assert (deadband.passed, deadband.dropped) == (3, 2)
+
+
+def test_absolute_deadband_is_inclusive():
+    deadband = DeadbandFilter(deadband=0.5)
+    assert deadband.changed('a', 10.0)
+    assert not deadband.changed('a', 10.5)
+    assert not deadband.changed('a', 9.5)
+    assert deadband.changed('a', 10.51)
+
+
+def test_percent_deadband_is_relative_to_last_reported_value():
+    deadband = DeadbandFilter(deadband_percent=10)
+    assert deadband.changed('a', 100)
+    assert not deadband.changed('a', 110)
+    assert deadband.changed('a', 111)
+    # 基准变为 111，死区为 11.1
+    assert not deadband.changed('a', 100)
+    assert deadband.changed('a', 99.8)
+
+
+def test_larger_of_absolute_and_percent_wins():
+    deadband = DeadbandFilter(deadband=5, deadband_percent=1)
+    deadband.changed('small', 10)
+    deadband.changed('large', 1000)
+    assert not deadband.changed('small', 15)  # 绝对死区 5 大于 0.1
+    assert not deadband.changed('large', 1010)  # 百分比死区 10 大于 5
+    assert deadband.changed('large', 1011)
+
+
+def test_slow_drift_accumulates_until_reported():
+    deadband = DeadbandFilter(deadband=1)
+    reported = [v / 10 for v in range(0, 40, 3) if deadband.changed('a', v / 10)]
+    # 基准是上次放行的值，每累计超过 1 报告一次
+    assert reported == [0.0, 1.2, 2.4, 3.6]
+
+
+def test_nan_and_non_numeric_values():
+    nan = float('nan')
+    deadband = DeadbandFilter(deadband=10)
+    assert deadband.changed('a', nan)
+    assert not deadband.changed('a', nan)
+    assert deadband.changed('a', 1.0)
+    assert deadband.changed('a', nan)
+    assert deadband.changed('s', 'run')
+    assert not deadband.changed('s', 'run')
+    assert deadband.changed('s', 'stop')
+    assert deadband.changed('n', None)
+    assert deadband.changed('n', 0)
+
+
+def test_bools_ignore_the_numeric_deadband():
+    deadband = DeadbandFilter(deadband=5)
+    assert deadband.changed('b', False)
+    assert deadband.changed('b', True)
+    assert not deadband.changed('b', True)
+
+
+def test_lists_report_when_any_element_exceeds():
+    deadband = DeadbandFilter(deadband=1)
+    assert deadband.changed('a', [1, 2, 3])
+    assert not deadband.changed('a', [1.5, 2.5, 2])
+    assert deadband.changed('a', [1, 2, 4.5])
+    # 长度变化总是报告
+    assert deadband.changed('a', [1, 2])
+    assert deadband.changed('bits', [True, False])
+    assert not deadband.changed('bits', [True, False])
+    assert deadband.changed('bits', [True, True])
+
+
+def test_per_tag_configuration_falls_back_to_defaults():
+    deadband = DeadbandFilter(deadband=1, deadband_percent=0)
+    deadband.configure([Tag(0, name='wide', deadband=10), Tag(1, name='percent', deadband_percent=50),
+                        Tag(2, name='default')])
+    for name in ('wide', 'percent', 'default'):
+        deadband.changed(name, 100)
+    assert deadband.filter({'wide': 109, 'percent': 140, 'default': 101}) == {}
+    assert deadband.filter({'wide': 111, 'percent': 160, 'default': 102}) == {'wide': 111, 'percent': 160,
+                                                                              'default': 102}
+    # percent 点位的绝对死区沿用默认的 1
+    deadband.set_deadband('percent', deadband_percent=0)
+    assert not deadband.changed('percent', 161)
+
+
+def test_reset_reports_everything_again():
+    deadband = DeadbandFilter(deadband=100)
+    values = {'a': 1, 'b': [2]}
+    assert deadband.filter(values) == values
+    assert deadband.filter(values) == {}
+    deadband.reset()
+    assert deadband.filter(values) == values
+    assert (deadband.passed, deadband.dropped) == (4, 2)
@@ -0,0 +1,181 @@
+#大牛大巨婴
+import json
+import os
+import pytest
+from historian import Historian
+
+SECOND = 1_000_000_000
+BASE = 1_700_000_000 * SECOND
+
+
+@pytest.fixture
+def open_historian(tmp_path):
+    opened = []
+
+    def factory(**options):
+        options.setdefault('segment_capacity', 64)
+        options.setdefault('rollups', (1, 60))
+        historian = Historian(str(tmp_path / 'history'), **options)
+        opened.append(historian)
+        return historian
+
+    yield factory
+    for historian in opened:
+        if historian._thread.is_alive():
+            historian.close()
+
+
+def expected_buckets(samples, interval):
+    buckets = {}
+    for timestamp, value in samples:
+        buckets.setdefault(timestamp - timestamp % interval, []).append(value)
+    return [(key, min(v), max(v), sum(v) / len(v), len(v)) for key, v in sorted(buckets.items())]
+
+
+def test_samples_are_expanded_and_queried(open_historian):
+    historian = open_historian()
+    historian.record({'a': 1, 'b': [2, 3], 'c': 'text', 'd': [4.5], 'e': None, 'f': True}, BASE)
+    historian.record({'a': 5}, BASE + SECOND)
+    assert historian.flush(5)
+    assert sorted(historian.tags()) == ['a', 'b[0]', 'b[1]', 'd', 'f']
+    assert historian.query('a') == [(BASE, 1.0), (BASE + SECOND, 5.0)]
+    assert historian.query('b[1]') == [(BASE, 3.0)]
+    assert historian.query('a', BASE + 1, BASE + 2 * SECOND) == [(BASE + SECOND, 5.0)]
+    assert historian.query('missing') == []
+
+
+def test_new_tags_are_persisted_once_per_batch(open_historian, monkeypatch):
+    saves = []
+    original = Historian._save_tags
+    monkeypatch.setattr(Historian, '_save_tags', lambda self: saves.append(1) or original(self))
+    historian = open_historian()
+    historian.record({f"tag{i}": i for i in range(2000)}, BASE)
+    assert historian.flush(10)
+    assert len(saves) == 1
+    historian.record({f"tag{i}": i for i in range(2000)}, BASE + SECOND)
+    assert historian.flush(10)
+    assert len(saves) == 1
+    with open(os.path.join(historian.data_dir, 'tags.json'), encoding='utf-8') as f:
+        assert len(json.load(f)) == 2000
+
+
+def test_timestamps_stay_monotonic_when_the_clock_steps_back(open_historian):
+    historian = open_historian()
+    historian.record({'a': 1}, BASE + 5 * SECOND)
+    historian.record({'a': 2}, BASE)
+    assert historian.flush(5)
+    assert [t for t, _ in historian.query('a')] == [BASE + 5 * SECOND, BASE + 5 * SECOND]
+
+
+def test_downsample_matches_raw_samples(open_historian):
+    historian = open_historian()
+    samples = [(BASE + i * SECOND // 4, float(i % 7)) for i in range(400)]
+    for timestamp, value in samples:
+        historian.record({'a': value}, timestamp)
+    assert historian.flush(5)
+    end = samples[-1][0] + 1
+    for interval in (1, 2, 60, 0.5):
+        assert historian.downsample('a', BASE, end, interval) == expected_buckets(samples, int(interval * SECOND))
+
+
+def test_reopen_keeps_tags_and_replays_open_buckets(open_historian):
+    historian = open_historian()
+    samples = [(BASE + i * SECOND // 3, float(i)) for i in range(300)]
+    for timestamp, value in samples:
+        historian.record({'a': value, 'b': -value}, timestamp)
+    assert historian.flush(5)
+    before = historian.downsample('a', BASE, samples[-1][0] + 1, 60)
+    historian.close()
+
+    reopened = open_historian()
+    assert sorted(reopened.tags()) == ['a', 'b']
+    assert reopened.query('a') == samples
+    assert reopened.downsample('a', BASE, samples[-1][0] + 1, 60) == before
+    # 重启后继续写入: 编号沿用，未结束的桶从原始样本恢复后继续累计
+    more = [(samples[-1][0] + (i + 1) * SECOND, 1000.0 + i) for i in range(120)]
+    for timestamp, value in more:
+        reopened.record({'a': value, 'c': value}, timestamp)
+    assert reopened.flush(5)
+    assert sorted(reopened.tags()) == ['a', 'b', 'c']
+    end = more[-1][0] + 1
+    assert reopened.downsample('a', BASE, end, 60) == expected_buckets(samples + more, 60 * SECOND)
+    assert reopened.downsample('a', BASE, end, 1) == expected_buckets(samples + more, SECOND)
+
+
+def test_full_queue_drops_instead_of_blocking(open_historian):
+    historian = open_historian(queue_size=1)
+    for i in range(1000):
+        historian.record({'a': i}, BASE + i)
+    assert historian.flush(5)
+    assert historian.dropped > 0
+    assert len(historian.query('a')) + historian.dropped == 1000
+
+
+def open_files():
+    return len(os.listdir('/proc/self/fd'))
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason="需要 /proc 统计打开的文件")
+def test_long_runs_keep_only_the_tail_segment_open(open_historian):
+    baseline = open_files()
+    historian = open_historian()
+    # 每个 record 展开成 500 个样本，64 行一段，共 781 个段，旧实现需要 1500 多个文件描述符
+    for i in range(100):
+        historian.record({'a': [float(i)] * 500}, BASE + i * SECOND)
+        assert historian.flush(5)
+    assert len(historian._raw.sealed) == 100 * 500 // 64
+    # 每组只有尾段打开: 原始样本和两个降采样周期各一个文件加一个映射
+    assert open_files() - baseline <= 3 * 2
+    assert historian.query('a[0]') == [(BASE + i * SECOND, float(i)) for i in range(100)]
+    assert historian.query('a[499]', BASE + 99 * SECOND) == [(BASE + 99 * SECOND, 99.0)]
+    assert [bucket[4] for bucket in historian.downsample('a[7]', BASE, BASE + 100 * SECOND, 60)] == [40, 60]
+    assert open_files() - baseline <= 3 * 2
+
+
+def test_queries_span_sealed_segments_after_reopen(open_historian):
+    historian = open_historian()
+    samples = [(BASE + i * SECOND, float(i)) for i in range(1000)]
+    for timestamp, value in samples:
+        historian.record({'a': value}, timestamp)
+    assert historian.flush(5)
+    historian.close()
+
+    reopened = open_historian()
+    assert len(reopened._raw.sealed) == 1000 // 64
+    assert reopened.query('a') == samples
+    assert reopened.query('a', samples[100][0], samples[300][0]) == samples[100:300]
+    more = [(samples[-1][0] + (i + 1) * SECOND, -1.0) for i in range(100)]
+    for timestamp, value in more:
+        reopened.record({'a': value}, timestamp)
+    assert reopened.flush(5)
+    assert reopened.query('a') == samples + more
+    # 段文件编号接着已有的最大编号
+    names = sorted(os.listdir(os.path.join(reopened.data_dir, 'raw')))
+    assert names == [f"{i:06d}.seg" for i in range(1, len(names) + 1)]
+
+
+def test_retention_by_age_removes_old_segments(open_historian):
+    historian = open_historian(max_age=100, rollup_max_age=600)
+    samples = [(BASE + i * SECOND, float(i)) for i in range(2000)]
+    for timestamp, value in samples:
+        historian.record({'a': value}, timestamp)
+    assert historian.flush(5)
+    timestamps = [t for t, _ in historian.query('a')]
+    assert timestamps[-1] == samples[-1][0]
+    # 只删除整段: 保留的最早样本不晚于截止时间，超出部分不足一段
+    cutoff = samples[-1][0] - 100 * SECOND
+    assert timestamps[0] <= cutoff < timestamps[0] + 64 * SECOND
+    assert len(os.listdir(os.path.join(historian.data_dir, 'raw'))) <= 100 // 64 + 2
+    buckets = historian.downsample('a', BASE, samples[-1][0] + 1, 1)
+    assert buckets[0][0] <= samples[-1][0] - 600 * SECOND
+
+
+def test_retention_by_size_keeps_the_newest_data(open_historian):
+    historian = open_historian(max_bytes=20_000)
+    for i in range(3000):
+        historian.record({'a': i}, BASE + i * SECOND)
+    assert historian.flush(5)
+    assert historian._raw.size <= 20_000
+    values = [value for _, value in historian.query('a')]
+    assert values[-1] == 2999.0
+    assert values == [float(v) for v in range(int(values[0]), 3000)]
@@ -0,0 +1,114 @@
+#大牛大巨婴
+import csv
+import json
+import random
+import pytest
+from benchmark import compare, measure
+from latency import EXPORT_FIELDS, SUB_BUCKETS, LatencyHistogram, LatencyStats
+
+
+def test_small_values_have_exact_buckets():
+    for value in range(2 * SUB_BUCKETS):
+        assert LatencyHistogram.bucket_index(value) == value
+        assert LatencyHistogram.bucket_value(value) == value
+
+
+def test_bucket_value_bounds_every_value_in_its_bucket():
+    values = list(range(4096)) + [(1 << bits) + offset for bits in range(12, 40) for offset in (-1, 0, 1)]
+    rng = random.Random(1)
+    values += [rng.randrange(1, 1 << 40) for _ in range(5000)]
+    for value in values:
+        index = LatencyHistogram.bucket_index(value)
+        highest = LatencyHistogram.bucket_value(index)
+        assert highest >= value
+        assert (highest - value) / max(value, 1) < 1 / SUB_BUCKETS
+        # 桶的上界也落在同一个桶里，下一个值进入下一个桶
+        assert LatencyHistogram.bucket_index(highest) == index
+        assert LatencyHistogram.bucket_index(highest + 1) == index + 1
+
+
+def test_bucket_indexes_are_monotonic():
+    indexes = [LatencyHistogram.bucket_index(value) for value in range(200_000)]
+    assert all(b - a in (0, 1) for a, b in zip(indexes, indexes[1:]))
+
+
+def test_percentiles_min_max_mean():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50) is None
+    assert histogram.mean is None
+    values = list(range(1, 1001))
+    random.Random(2).shuffle(values)
+    for value in values:
+        histogram.record(value * 1000)
+    assert (histogram.count, histogram.min, histogram.max) == (1000, 1000, 1_000_000)
+    assert histogram.mean == pytest.approx(500_500)
+    for percent in (50, 90, 99, 99.9):
+        exact = percent * 10 * 1000
+        assert exact <= histogram.percentile(percent) < exact * (1 + 1 / SUB_BUCKETS)
+    # 百分位不会超过实际最大值
+    assert histogram.percentile(100) == 1_000_000
+    assert histogram.percentile(0) == histogram.bucket_value(histogram.bucket_index(1000))
+
+
+def test_single_sample():
+    histogram = LatencyHistogram()
+    histogram.record(123_456_789)
+    assert histogram.percentile(1) == histogram.percentile(99) == 123_456_789
+
+
+def test_stats_summary_and_counters():
+    stats = LatencyStats()
+    stats.record('b', 3, 2_000_000)
+    stats.record('a', 16, 1_000_000, retries=2)
+    stats.record('a', 3, timeout=True)
+    stats.record('a', 3, 5_000_000, exception=True)
+    rows = stats.summary()
+    assert [(row['device'], row['function_code']) for row in rows] == [('a', 3), ('a', 16), ('b', 3)]
+    a3 = rows[0]
+    assert (a3['count'], a3['timeouts'], a3['exceptions'], a3['retries']) == (1, 1, 1, 0)
+    assert a3['p50_ms'] == pytest.approx(5, rel=1 / SUB_BUCKETS)
+    assert rows[1]['retries'] == 2
+    stats.record('c', 1, timeout=True)
+    c1 = stats.summary()[-1]
+    assert (c1['count'], c1['p50_ms'], c1['min_ms'], c1['max_ms'], c1['mean_ms']) == (0, None, None, None, None)
+    stats.reset()
+    assert len(stats) == 0
+
+
+def test_stats_export(tmp_path):
+    stats = LatencyStats()
+    stats.record('dev', 3, 1_500_000)
+    assert stats.export(str(tmp_path / 'latency.json')) == 1
+    assert json.loads((tmp_path / 'latency.json').read_text(encoding='utf-8')) == stats.summary()
+    stats.export(str(tmp_path / 'latency.csv'))
+    with open(tmp_path / 'latency.csv', encoding='utf-8-sig', newline='') as f:
+        reader = csv.DictReader(f)
+        rows = list(reader)
+    assert reader.fieldnames == EXPORT_FIELDS
+    assert (rows[0]['device'], rows[0]['count']) == ('dev', '1')
+
+
+def test_measure_counts_failures_and_values(capsys):
+    calls = []
+
+    def operation():
+        calls.append(1)
+        return len(calls) % 4 != 0
+
+    result = measure('op', operation, 20, 4, values_per_op=10, count=10)
+    assert len(calls) == 24
+    assert (result['iterations'], result['failures'], result['count']) == (20, 5, 10)
+    assert result['values_per_sec'] == pytest.approx(result['ops_per_sec'] * 10, rel=0.01)
+    assert result['p50_us'] <= result['p95_us'] <= result['p99_us']
+    assert 'op' in capsys.readouterr().out
+
+
+def test_compare_prints_changes_for_known_names(tmp_path, capsys):
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps({'results': [{'name': 'op', 'ops_per_sec': 100.0},
+                                                {'name': 'zero', 'ops_per_sec': 0}]}), encoding='utf-8')
+    compare([{'name': 'op', 'ops_per_sec': 150.0}, {'name': 'new', 'ops_per_sec': 1.0},
+             {'name': 'zero', 'ops_per_sec': 1.0}], str(baseline))
+    out = capsys.readouterr().out
+    assert '+50.0%' in out
+    assert 'new' not in out and 'zero' not in out
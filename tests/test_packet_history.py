@@ -0,0 +1,48 @@
+#大牛大巨婴
+from packet_history import RECORD_OVERHEAD, PacketHistory, to_bytes
+
+
+def test_to_bytes_accepts_formatted_strings():
+    assert to_bytes(b'\x01\x03') == b'\x01\x03'
+    assert to_bytes('01 03 00') == b'\x01\x03\x00'
+    assert to_bytes(None) == b''
+
+
+def test_evicts_oldest_by_count():
+    history = PacketHistory(max_entries=3)
+    for i in range(5):
+        history.append(f"op{i}", bytes([i]), b'')
+    assert [record.operation for record in history] == ['op2', 'op3', 'op4']
+
+
+def test_evicts_oldest_by_bytes():
+    history = PacketHistory(max_entries=100, max_bytes=2 * (RECORD_OVERHEAD + 10))
+    for i in range(4):
+        history.append(f"op{i}", b'x' * 5, b'y' * 5)
+    assert len(history) == 2
+    assert history.total_bytes == 2 * (RECORD_OVERHEAD + 10)
+
+
+def test_evicted_records_spill_to_file(tmp_path):
+    spill = tmp_path / 'spill.tsv'
+    history = PacketHistory(max_entries=1, spill_file=str(spill))
+    history.append('read', b'\x01\x03', b'\x01\x83\x02')
+    history.append('read', b'\x02', b'')
+    history.close()
+    line = spill.read_text(encoding='utf-8')
+    assert line.endswith("\tread\t01 03\t01 83 02\n")
+
+
+def test_text_and_export_cover_all_records(tmp_path):
+    history = PacketHistory()
+    history.append('写入', b'\x01\x10', b'\x01\x10')
+    history.append('读取', b'\x01\x03', b'')
+    text = history.to_text()
+    assert text.count("发送:") == 2 and "接收: 01 10" in text
+    path = tmp_path / 'packets.tsv'
+    assert history.export(str(path)) == 2
+    lines = path.read_text(encoding='utf-8').splitlines()
+    assert lines[0] == "时间\t操作\t发送\t接收"
+    assert lines[2].endswith("\t读取\t01 03\t")
+    history.clear()
+    assert len(history) == 0 and history.total_bytes == 0
@@ -0,0 +1,167 @@
+#大牛大巨婴
+import json
+import pytest
+from poll_scheduler import MAX_CACHED_PLANS, MIN_TICK, PollGroup, PollScheduler, load_poll_groups, parse_poll_groups
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def group(name, interval, address, count=1, **options):
+    return PollGroup.from_range(name, interval, 'Holding Register', address, count, **options)
+
+
+def test_tick_is_the_gcd_of_intervals_with_a_floor():
+    assert PollScheduler([group('a', 0.1, 0), group('b', 0.25, 10)]).tick == 50
+    assert PollScheduler([group('a', 1, 0), group('b', 1.5, 10)]).tick == 500
+    assert PollScheduler([group('a', 0.013, 0), group('b', 0.017, 10)]).tick == MIN_TICK
+    assert PollScheduler().tick == MIN_TICK
+
+
+def test_fixed_rate_advance_does_not_drift():
+    poll = group('a', 0.1, 0)
+    poll.advance(10.0)
+    assert poll.next_due == pytest.approx(10.1)
+    # 请求耗时让实际时间晚了一点，下一周期仍按固定节拍
+    poll.advance(10.13)
+    assert poll.next_due == pytest.approx(10.2)
+    assert (poll.polls, poll.missed) == (2, 0)
+
+
+def test_missed_cycles_are_skipped_and_counted():
+    poll = group('a', 0.1, 0)
+    poll.advance(10.0)
+    poll.advance(10.35)
+    # 这次轮询对应 10.1 的周期，10.2 和 10.3 已过期，直接跳过
+    assert poll.next_due == pytest.approx(10.4)
+    assert poll.missed == 2
+    poll.reset()
+    assert (poll.next_due, poll.polls, poll.missed) == (None, 0, 0)
+
+
+def test_due_includes_groups_inside_the_batch_window():
+    clock = FakeClock()
+    scheduler = PollScheduler([group('a', 1, 0), group('b', 1, 10)], batch_window=0.02, clock=clock)
+    assert [g.name for g in scheduler.due()] == ['a', 'b']
+    scheduler.groups[0].next_due = 100.015
+    scheduler.groups[1].next_due = 100.03
+    assert [g.name for g in scheduler.due()] == ['a']
+    assert scheduler.next_due() == 100.015
+
+
+def test_poll_reads_only_due_groups(debugger):
+    clock = FakeClock()
+    scheduler = PollScheduler([group('fast', 0.1, 0), group('slow', 1, 100)], clock=clock)
+    values, _ = scheduler.poll(debugger)
+    assert values == {'fast:0': 0, 'slow:100': 100}
+    clock.now += 0.1
+    values, _ = scheduler.poll(debugger)
+    assert values == {'fast:0': 0}
+    clock.now += 0.05
+    assert scheduler.poll(debugger) == ({}, [])
+    clock.now = 101.0
+    values, _ = scheduler.poll(debugger)
+    assert set(values) == {'fast:0', 'slow:100'}
+    fast, slow = scheduler.groups
+    assert (fast.polls, slow.polls) == (3, 2)
+    # fast 在 100.1 之后直到 101.0 没有被轮询
+    assert fast.missed == 8
+
+
+def test_adjacent_groups_share_one_request(debugger):
+    clock = FakeClock()
+    scheduler = PollScheduler([group('a', 0.1, 0, 5), group('b', 0.1, 5, 5, slave_id=None),
+                               group('c', 0.1, 5, 5, slave_id=2)], clock=clock)
+    scheduler.poll(debugger)
+    assert sorted(debugger.requests) == [(3, 0, 10, None), (3, 5, 5, 2)]
+
+
+def test_plans_are_cached_per_due_set(debugger):
+    clock = FakeClock()
+    scheduler = PollScheduler([group('fast', 0.1, 0), group('slow', 0.2, 100)], clock=clock)
+    for _ in range(10):
+        scheduler.poll(debugger)
+        clock.now += 0.1
+    assert set(scheduler._plans) == {('fast', 'slow'), ('fast',)}
+    scheduler.add(group('other', 1, 200))
+    assert scheduler._plans == {}
+
+
+def test_plan_cache_is_bounded(debugger):
+    clock = FakeClock()
+    # 周期互质的组到期组合很多，缓存只保留最近用过的 MAX_CACHED_PLANS 个
+    intervals = [2, 3, 5, 7, 11, 13, 17, 19]
+    scheduler = PollScheduler([group(f"g{i}", interval, i * 10) for i, interval in enumerate(intervals)],
+                              batch_window=0, clock=clock)
+    keys = set()
+    for _ in range(2000):
+        keys.add(tuple(g.name for g in scheduler.due()))
+        scheduler.poll(debugger)
+        clock.now += 1
+    assert len(keys) > MAX_CACHED_PLANS
+    assert len(scheduler._plans) == MAX_CACHED_PLANS
+    # 最近一次用到的组合在缓存末尾
+    assert next(reversed(scheduler._plans)) in keys
+
+
+def test_reset_during_a_poll_is_not_overwritten(debugger):
+    clock = FakeClock()
+    scheduler = PollScheduler([group('a', 10, 0)], clock=clock)
+    read_holding_registers = debugger.read_holding_registers
+
+    def read_and_reset(*args, **kwargs):
+        # 界面线程在读取期间点了开始轮询
+        scheduler.reset()
+        return read_holding_registers(*args, **kwargs)
+
+    debugger.read_holding_registers = read_and_reset
+    scheduler.poll(debugger)
+    assert scheduler.summary() == ['a: 周期 10000 ms，轮询 0 次，跳过 0 个周期']
+    assert len(scheduler.due()) == 1
+
+
+def test_reset_makes_every_group_due(debugger):
+    clock = FakeClock()
+    scheduler = PollScheduler([group('a', 10, 0), group('b', 20, 10)], clock=clock)
+    scheduler.poll(debugger)
+    assert scheduler.due() == []
+    scheduler.reset()
+    assert len(scheduler.due()) == 2
+    assert scheduler.summary()[0] == 'a: 周期 10000 ms，轮询 0 次，跳过 0 个周期'
+
+
+def test_groups_are_validated():
+    with pytest.raises(ValueError):
+        PollGroup('a', [], 1)
+    with pytest.raises(ValueError):
+        group('a', 0, 0)
+    scheduler = PollScheduler([group('a', 1, 0)])
+    with pytest.raises(ValueError, match='重复'):
+        scheduler.add(group('a', 2, 10))
+
+
+def test_parse_groups_from_rows():
+    fast, array = parse_poll_groups([
+        {'组名': '快速', '周期': '100', '地址': '0', '数量': '3', '从站地址': '2'},
+        {'name': 'floats', 'interval': 1000, 'address': 10, 'count': 4, 'data_type': 'float32',
+         'register_type': 'ir', 'byte_order': 'BA', 'word_order': '4321'},
+    ])
+    assert (fast.name, fast.interval, [t.name for t in fast.tags]) == ('快速', 0.1, ['快速:0', '快速:1', '快速:2'])
+    assert {t.slave_id for t in fast.tags} == {2}
+    assert array.interval == 1.0
+    assert [(t.address, t.register_type, t.data_type, t.byte_order, t.word_order) for t in array.tags][:2] == \
+        [(10, 'Input Register', 'FLOAT32', 'little', 'little'), (12, 'Input Register', 'FLOAT32', 'little', 'little')]
+    with pytest.raises(ValueError, match='第 1 个轮询组'):
+        parse_poll_groups([{'name': 'x', 'address': 0}])
+
+
+def test_load_groups_from_json(tmp_path):
+    path = tmp_path / 'groups.json'
+    path.write_text(json.dumps({'groups': [{'name': 'a', 'interval': 250, 'address': 0}]}), encoding='utf-8')
+    poll, = load_poll_groups(str(path))
+    assert (poll.name, poll.interval, len(poll.tags)) == ('a', 0.25, 1)
@@ -0,0 +1,112 @@
+#大牛大巨婴
+import random
+import pytest
+from read_planner import (MAX_READ_BITS, MAX_READ_REGISTERS, ReadPlanner, Tag, execute_plan, range_tags,
+                          registers_per_value)
+
+
+def spans(blocks):
+    return [(block.function_code, block.slave_id, block.start, block.count) for block in blocks]
+
+
+def test_adjacent_tags_share_one_block():
+    tags = [Tag(0), Tag(1, data_type='FLOAT32'), Tag(3, data_type='FLOAT64')]
+    blocks = ReadPlanner().plan(tags)
+    assert spans(blocks) == [(3, None, 0, 7)]
+    assert blocks[0].tags == tags
+
+
+def test_gap_fill_boundary():
+    # 默认 gap_fill=8: 空洞正好 8 个寄存器时合并，9 个时分开
+    assert spans(ReadPlanner().plan([Tag(0), Tag(9)])) == [(3, None, 0, 10)]
+    assert spans(ReadPlanner().plan([Tag(0), Tag(10)])) == [(3, None, 0, 1), (3, None, 10, 1)]
+
+
+def test_gap_fill_zero_only_merges_touching_tags():
+    planner = ReadPlanner(gap_fill=0)
+    assert spans(planner.plan([Tag(0), Tag(1), Tag(3)])) == [(3, None, 0, 2), (3, None, 3, 1)]
+
+
+def test_register_blocks_split_at_the_pdu_limit():
+    tags = [Tag(address) for address in range(300)]
+    blocks = ReadPlanner().plan(tags)
+    assert [block.count for block in blocks] == [MAX_READ_REGISTERS, MAX_READ_REGISTERS, 50]
+    assert sum(len(block.tags) for block in blocks) == 300
+
+
+def test_multi_register_values_are_never_split():
+    tags = [Tag(address, data_type='FLOAT64') for address in range(0, 400, 4)]
+    for block in ReadPlanner().plan(tags):
+        assert block.count <= MAX_READ_REGISTERS
+        assert all(block.start <= tag.address and tag.end <= block.start + block.count for tag in block.tags)
+
+
+def test_bit_blocks_use_the_bit_limit_and_gap():
+    tags = [Tag(address, register_type='Coil') for address in range(0, 4000, 2)]
+    blocks = ReadPlanner().plan(tags)
+    assert all(block.count <= MAX_READ_BITS for block in blocks)
+    assert len(blocks) == 2
+    # 位类型的空洞上限是 bit_gap_fill
+    assert len(ReadPlanner().plan([Tag(0, register_type='Coil'), Tag(65, register_type='Coil')])) == 1
+    assert len(ReadPlanner().plan([Tag(0, register_type='Coil'), Tag(66, register_type='Coil')])) == 2
+
+
+def test_slaves_and_register_types_are_planned_separately():
+    tags = [Tag(0, slave_id=2), Tag(1, slave_id=1), Tag(2, register_type='Input Register', slave_id=1),
+            Tag(3), Tag(0, register_type='Discrete Input', slave_id=1)]
+    assert spans(ReadPlanner().plan(tags)) == [
+        (2, 1, 0, 1), (3, 1, 1, 1), (4, 1, 2, 1), (3, 2, 0, 1), (3, None, 3, 1)]
+
+
+def test_overlapping_tags_share_registers():
+    tags = [Tag(0, data_type='UINT32', name='u32'), Tag(1, name='low'), Tag(0, name='high')]
+    assert spans(ReadPlanner().plan(tags)) == [(3, None, 0, 2)]
+
+
+def test_tag_longer_than_the_limit_is_rejected():
+    with pytest.raises(ValueError):
+        ReadPlanner().plan([Tag(0, data_type='ASCII', count=MAX_READ_REGISTERS + 1)])
+    with pytest.raises(ValueError):
+        Tag(0, register_type='Holding')
+
+
+def test_random_tag_sets_are_covered_within_limits():
+    rng = random.Random(0)
+    data_types = ['UINT16', 'INT32', 'FLOAT32', 'FLOAT64']
+    for _ in range(200):
+        planner = ReadPlanner(gap_fill=rng.randint(0, 20), max_registers=rng.randint(4, MAX_READ_REGISTERS))
+        tags = []
+        for i in range(rng.randint(1, 60)):
+            tags.append(Tag(rng.randint(0, 500), data_type=rng.choice(data_types), slave_id=rng.choice([1, 2]),
+                            name=str(i)))
+        blocks = planner.plan(tags)
+        planned = [tag for block in blocks for tag in block.tags]
+        assert sorted(planned, key=id) == sorted(tags, key=id)
+        for block in blocks:
+            assert 0 < block.count <= planner.max_registers
+            assert all(tag.slave_id == block.slave_id for tag in block.tags)
+            assert all(block.start <= tag.address and tag.end <= block.start + block.count for tag in block.tags)
+
+
+def test_range_tags():
+    assert [(t.address, t.count, t.name) for t in range_tags('Holding Register', 10, 3, 'FLOAT32', prefix='g:')] == [
+        (10, 2, 'g:10'), (12, 2, 'g:12'), (14, 2, 'g:14')]
+    assert [(t.address, t.count) for t in range_tags('Holding Register', 10, 6, 'ASCII')] == [(10, 6)]
+    coils = range_tags('Coil', 0, 3, 'FLOAT32')
+    assert [(t.address, t.data_type) for t in coils] == [(0, 'BOOL'), (1, 'BOOL'), (2, 'BOOL')]
+    assert registers_per_value('UNIX_TIMESTAMP') == 2
+
+
+def test_execute_plan_decodes_each_tag(debugger):
+    debugger.registers[('Holding Register', 2)] = 0x3FC0
+    debugger.registers[('Holding Register', 3)] = 0x0000
+    tags = [Tag(0, name='a'), Tag(2, data_type='FLOAT32', name='f'), Tag(40, name='far'),
+            Tag(5, register_type='Coil', name='c')]
+    blocks = ReadPlanner().plan(tags)
+    debugger.fail_starts.add(40)
+    values, packets = execute_plan(debugger, blocks)
+    by_name = {tag.name: value for tag, value in values.items()}
+    assert by_name == {'a': [0], 'f': [1.5], 'far': None, 'c': [False]}
+    assert len(packets) == len(blocks) == 3
+    # 位读取按块长度截断，不会带出 pymodbus 补齐的位
+    assert debugger.requests[0] == (1, 5, 1, None)
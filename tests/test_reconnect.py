@@ -0,0 +1,167 @@
+#大牛大巨婴
+import random
+import threading
+import time
+import pytest
+from modbus_debugger import ModbusDebugger, load_pymodbus
+from reconnect import ReconnectManager
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def test_delay_grows_exponentially_up_to_the_cap():
+    manager = ReconnectManager(lambda: True, initial_delay=0.5, max_delay=30, multiplier=2, jitter=0)
+    assert [manager.next_delay(attempt) for attempt in range(8)] == [0.5, 1, 2, 4, 8, 16, 30, 30]
+    # 长时间离线时指数不会溢出
+    assert manager.next_delay(10_000) == 30
+
+
+def test_jitter_only_shortens_the_delay():
+    random.seed(3)
+    manager = ReconnectManager(lambda: True, initial_delay=1, max_delay=8, multiplier=2, jitter=0.25)
+    for attempt in range(10):
+        nominal = min(8, 2 ** attempt)
+        delays = [manager.next_delay(attempt) for _ in range(200)]
+        assert all(nominal * 0.75 <= delay <= nominal for delay in delays)
+        assert max(delays) - min(delays) > nominal * 0.1
+
+
+def test_retries_until_connected():
+    results = iter([False, False, True])
+    manager = ReconnectManager(lambda: next(results), initial_delay=0.001, max_delay=0.005)
+    assert manager.trigger()
+    assert not manager.trigger()  # 已经在重连
+    assert wait_until(lambda: not manager.reconnecting)
+    assert manager.attempts == 3
+
+
+def test_connect_errors_are_retried():
+    calls = []
+
+    def connect():
+        calls.append(1)
+        if len(calls) < 2:
+            raise OSError("不可达")
+        return True
+
+    manager = ReconnectManager(connect, initial_delay=0.001)
+    manager.trigger()
+    assert wait_until(lambda: not manager.reconnecting)
+    assert len(calls) == 2
+
+
+def test_cancel_without_wait_detaches_a_blocked_attempt():
+    entered = threading.Event()
+    release = threading.Event()
+
+    def connect():
+        entered.set()
+        release.wait(5)
+        return False
+
+    manager = ReconnectManager(connect, initial_delay=0.001)
+    manager.trigger()
+    assert entered.wait(2)
+    started = time.monotonic()
+    manager.cancel(wait=False)
+    assert time.monotonic() - started < 0.1
+    assert not manager.reconnecting
+    # 旧线程还卡在连接里，也可以立即开始新的重连
+    assert manager.trigger()
+    manager.cancel(wait=False)
+    release.set()
+
+
+def test_cancel_with_wait_stops_the_thread():
+    manager = ReconnectManager(lambda: False, initial_delay=10)
+    manager.trigger()
+    manager.cancel()
+    assert not manager.reconnecting
+
+
+class FakeClient:
+    def __init__(self, connect_result=True):
+        self.connect_result = connect_result
+        self.socket = None
+        self.closed = False
+
+    def connect(self):
+        return self.connect_result
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def tcp_debugger():
+    load_pymodbus()
+    debugger = ModbusDebugger({'reconnect': {'max_failures': 3, 'initial_delay': 0.001}})
+    debugger._connection_type = 'tcp'
+    debugger._connection_params = {'host': 'plc', 'port': 502}
+    debugger.client = FakeClient()
+    debugger.triggers = 0
+
+    def trigger():
+        debugger.triggers += 1
+        return True
+
+    debugger.reconnect_manager.trigger = trigger
+    yield debugger
+    debugger.reconnect_manager.cancel()
+
+
+def test_single_failures_reopen_instead_of_backing_off(tcp_debugger):
+    tcp_debugger._reconnect()
+    tcp_debugger._reconnect()
+    assert tcp_debugger.triggers == 0
+    # 连续第 max_failures 次失败才进入退避重连
+    tcp_debugger._reconnect()
+    assert tcp_debugger.triggers == 1
+
+
+def test_successful_request_resets_the_failure_count(tcp_debugger):
+    tcp_debugger._reconnect()
+    tcp_debugger._reconnect()
+    tcp_debugger._execute(lambda: object())
+    tcp_debugger._reconnect()
+    tcp_debugger._reconnect()
+    assert tcp_debugger.triggers == 0
+
+
+def test_failed_reopen_backs_off_immediately(tcp_debugger):
+    tcp_debugger.client = FakeClient(connect_result=False)
+    tcp_debugger._reconnect()
+    assert tcp_debugger.triggers == 1
+
+
+def test_reconnect_result_is_dropped_after_user_reconnects():
+    load_pymodbus()
+    debugger = ModbusDebugger({'reconnect': {'initial_delay': 0.001}})
+    debugger._connection_type = 'tcp'
+    debugger._connection_params = {'host': 'plc', 'port': 502}
+    gate = threading.Event()
+    # 后台重连卡在 stale.connect() 里，模拟等待连接超时
+    stale = FakeClient()
+    fresh = FakeClient()
+    clients = iter([stale, fresh])
+    debugger._new_client = lambda: next(clients)
+    entered = threading.Event()
+    stale.connect = lambda: entered.set() or gate.wait(5)
+    debugger.reconnect_manager.trigger()
+    assert entered.wait(2)
+    started = time.monotonic()
+    assert debugger._connect_client()
+    # 不等待卡住的后台线程
+    assert time.monotonic() - started < 0.5
+    assert debugger.client is fresh
+    assert not debugger.reconnecting
+    gate.set()
+    assert wait_until(lambda: stale.closed)
+    assert debugger.client is fresh and not fresh.closed
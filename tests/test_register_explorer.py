@@ -0,0 +1,156 @@
+#大牛大巨婴
+import random
+import threading
+import pytest
+from pymodbus.exceptions import ModbusIOException
+from pymodbus.pdu import ExceptionResponse
+from read_planner import MAX_READ_REGISTERS
+from register_explorer import DEFAULT_RESOLUTION, MAX_ADDRESS, RegisterExplorer, RegisterMap
+
+
+class FakeDevice:
+    """ 只实现 ranges 里的地址，读到其他地址时返回异常码 02 """
+    def __init__(self, ranges, timeouts=()):
+        self.ranges = ranges
+        self.timeouts = set(timeouts)
+
+    def _read(self, function_code, address, count):
+        if address in self.timeouts:
+            return ModbusIOException("无应答")
+        end = address + count - 1
+        if any(start <= address and end <= stop for start, stop in self.ranges):
+            return object()
+        return ExceptionResponse(function_code, 0x02)
+
+    def read_holding_registers(self, address, count, slave=1):
+        return self._read(3, address, count)
+
+    def read_coils(self, address, count, slave=1):
+        return self._read(1, address, count)
+
+
+class ExploreDebugger:
+    def __init__(self, device):
+        self.client = device
+        self._slave_id = 1
+        self.reopened = 0
+
+    def _execute(self, call):
+        return call(), b'', b''
+
+    def reopen(self):
+        self.reopened += 1
+        return True
+
+
+def explore(ranges, register_type='Holding Register', last=MAX_ADDRESS, **options):
+    explorer = RegisterExplorer(ExploreDebugger(FakeDevice(ranges)), **options)
+    result = explorer.explore((register_type,), last=last).ranges[register_type]
+    return result, explorer
+
+
+@pytest.mark.parametrize('ranges', [
+    [(0, MAX_ADDRESS)],
+    [(0, 99)],
+    [(1, 100)],  # 常见的 1 起始点表，地址 0 无效
+    [(11, 115)],  # 整个区间夹在两个窗口采样点之间
+    [(100, 199), (1000, 1999), (40001, 40100)],
+    [(0, 0), (124, 124), (248, 300)],  # 正好落在窗口采样点上的单个地址
+    [(65000, MAX_ADDRESS)],
+    [],
+])
+def test_ranges_are_found_exactly(ranges):
+    assert explore(ranges)[0] == ranges
+
+
+def test_ranges_adjacent_to_short_gaps():
+    ranges = [(0, 49), (51, 70), (72, 200)]
+    assert explore(ranges)[0] == ranges
+
+
+def test_random_maps_are_found_exactly():
+    rng = random.Random(14)
+    for _ in range(60):
+        ranges = []
+        address = rng.randrange(0, 300)
+        while address < 5000:
+            length = rng.randrange(DEFAULT_RESOLUTION, 400)
+            ranges.append((address, address + length - 1))
+            address += length + rng.randrange(1, 600)
+        assert explore(ranges, last=5000)[0] == [(start, min(end, 5000)) for start, end in ranges]
+
+
+def test_short_ranges_are_never_reported_wrongly():
+    rng = random.Random(15)
+    for _ in range(60):
+        ranges = []
+        address = rng.randrange(0, 50)
+        while address < 3000:
+            length = rng.randrange(1, 40)
+            ranges.append((address, address + length - 1))
+            address += length + rng.randrange(1, 200)
+        found, _ = explore(ranges, last=3000)
+        valid = {a for start, end in ranges for a in range(start, end + 1)}
+        assert all(a in valid for start, end in found for a in range(start, end + 1))
+        # 不短于 resolution 的区间都能找到
+        for start, end in ranges:
+            if end - start + 1 >= DEFAULT_RESOLUTION and end <= 3000:
+                assert any(s <= start and end <= e for s, e in found)
+
+
+def test_resolution_trades_requests_for_coverage():
+    short = [(40, 44)]
+    assert explore(short, last=1000)[0] == []
+    assert explore(short, last=1000, resolution=4)[0] == short
+    _, coarse = explore([], last=10000)
+    _, fine = explore([], last=10000, resolution=4)
+    assert coarse.requests == pytest.approx(10000 / DEFAULT_RESOLUTION, rel=0.1)
+    assert fine.requests > 3 * coarse.requests
+    with pytest.raises(ValueError):
+        RegisterExplorer(None, resolution=0)
+
+
+def test_full_windows_need_one_request_each():
+    _, explorer = explore([(0, MAX_ADDRESS)])
+    assert explorer.requests == 1 + -(-MAX_ADDRESS // (MAX_READ_REGISTERS - 1))
+
+
+def test_bit_types_use_the_bit_window():
+    ranges = [(0, 9999), (20000, 20015)]
+    result, explorer = explore(ranges, 'Coil', last=30000)
+    assert result == ranges
+    assert explorer.requests < 2500
+
+
+def test_timeouts_are_treated_as_invalid_and_reopen():
+    debugger = ExploreDebugger(FakeDevice([(0, 500)], timeouts={0}))
+    explorer = RegisterExplorer(debugger)
+    result = explorer.explore(('Holding Register',), last=500).ranges['Holding Register']
+    assert result == [(1, 500)]
+    assert debugger.reopened >= 1 and explorer.errors >= 1
+
+
+def test_stop_event_ends_the_scan():
+    stop = threading.Event()
+    seen = []
+
+    def callback(register_type, address):
+        seen.append(address)
+        if len(seen) == 3:
+            stop.set()
+
+    explorer = RegisterExplorer(ExploreDebugger(FakeDevice([])))
+    explorer.explore(('Holding Register',), stop_event=stop, callback=callback)
+    assert len(seen) == 3
+
+
+def test_register_map_plan_round_trip():
+    register_map = RegisterMap(2)
+    register_map.add('Holding Register', 0, 99)
+    register_map.add('Holding Register', 100, 300)
+    register_map.add('Coil', 5, 5)
+    assert register_map.ranges['Holding Register'] == [(0, 300)]
+    assert RegisterMap.from_dict(register_map.to_dict(), 2).ranges == register_map.ranges
+    counts = [(block.register_type, block.start, block.count) for block in register_map.plan()]
+    assert sorted(counts) == [('Coil', 5, 1), ('Holding Register', 0, 125), ('Holding Register', 125, 125),
+                              ('Holding Register', 250, 51)]
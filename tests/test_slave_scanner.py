@@ -0,0 +1,146 @@
+#大牛大巨婴
+import threading
+import pytest
+from pymodbus.exceptions import ModbusIOException
+from pymodbus.pdu import ExceptionResponse
+from pymodbus.pdu.register_read_message import ReadHoldingRegistersResponse
+from rtu_bus import SerialTiming, READ_REQUEST_LENGTH
+from slave_scanner import AdaptiveTimeout, SlaveScanner, READ_ONE_RESPONSE_LENGTH
+
+
+class FakeClient:
+    """ 按从站地址返回预设的应答: 'ok'、异常码或 None(无应答) """
+    def __init__(self, answers):
+        self.answers = answers
+        self.comm_params = type('CommParams', (), {'timeout_connect': 3.0})()
+
+    def read_holding_registers(self, address, count=1, slave=1):
+        answer = self.answers.get(slave)
+        if answer is None:
+            return ModbusIOException("无应答")
+        if answer == 'ok':
+            return ReadHoldingRegistersResponse([slave], slave=slave)
+        return ExceptionResponse(3, answer, slave=slave)
+
+    def report_slave_id(self, slave=1):
+        return self.read_holding_registers(0, slave=slave)
+
+
+class ScanDebugger:
+    """ SlaveScanner 用到的 ModbusDebugger 接口 """
+    def __init__(self, answers, connection_type='tcp', connection_params=None):
+        self.client = FakeClient(answers)
+        self._connection_type = connection_type
+        self._connection_params = connection_params or {}
+        self.config = None
+        self.log_dir = None
+        self.timeouts = []
+        self.reopened = 0
+        self.last_sent_packet = b''
+        self.last_received_packet = b''
+
+    def set_timeout(self, timeout):
+        self.timeouts.append(timeout)
+        self.client.comm_params.timeout_connect = timeout
+
+    def reopen(self):
+        self.reopened += 1
+        return True
+
+    def _execute(self, call):
+        result = call()
+        received = b'' if isinstance(result, ModbusIOException) else b'\x01\x03'
+        return result, b'\x01\x03', received
+
+
+def test_adaptive_timeout_uses_initial_value_until_first_sample():
+    timeout = AdaptiveTimeout(0.5, 0.01, 1.0)
+    assert timeout.value == 0.5
+    timeout.update(0.02)
+    # 第一个样本: srtt = 0.02，rttvar = 0.01
+    assert timeout.value == pytest.approx(0.06)
+
+
+def test_adaptive_timeout_smoothing_and_clamping():
+    timeout = AdaptiveTimeout(0.5, 0.05, 0.2)
+    timeout.update(0.001)
+    assert timeout.value == 0.05  # 不低于 minimum
+    for _ in range(3):
+        timeout.update(1.0)
+    assert timeout.value == 0.2  # 不高于 maximum
+
+    timeout = AdaptiveTimeout(0.5, 0, 10)
+    timeout.update(0.1)
+    timeout.update(0.3)
+    srtt = 0.875 * 0.1 + 0.125 * 0.3
+    rttvar = 0.75 * 0.05 + 0.25 * abs(0.1 - 0.3)
+    assert timeout.srtt == pytest.approx(srtt)
+    assert timeout.value == pytest.approx(srtt + 4 * rttvar)
+
+
+def test_adaptive_timeout_converges_on_steady_latency():
+    timeout = AdaptiveTimeout(1.0, 0, 10)
+    for _ in range(200):
+        timeout.update(0.03)
+    assert timeout.value == pytest.approx(0.03, rel=1e-3)
+
+
+def test_scan_reports_sorted_results_and_skips_gateway_exceptions():
+    answers = {7: 'ok', 2: 'ok', 5: 0x02, 9: 0x0B, 11: 0x0A}
+    debugger = ScanDebugger(answers)
+    seen = []
+    results = SlaveScanner(debugger, concurrency=1).scan(range(1, 13), callback=lambda s, r: seen.append(s))
+    assert [r.slave_id for r in results] == [2, 5, 7]
+    assert [r.exception_code for r in results] == [None, 0x02, None]
+    assert seen == list(range(1, 13))
+    # 没有应答的地址都重新打开连接，网关异常不需要
+    assert debugger.reopened == 12 - len(answers)
+
+
+def test_scan_restores_the_timeout():
+    debugger = ScanDebugger({1: 'ok'})
+    SlaveScanner(debugger, concurrency=1, initial_timeout=0.1).scan(range(1, 4))
+    assert debugger.timeouts[0] == 0.1
+    assert debugger.client.comm_params.timeout_connect == 3.0
+
+
+def test_scan_adapts_the_timeout_to_answers():
+    debugger = ScanDebugger({slave_id: 'ok' for slave_id in range(1, 20)})
+    scanner = SlaveScanner(debugger, concurrency=1, initial_timeout=0.5, min_timeout=0.001)
+    scanner.scan(range(1, 20))
+    # 最后一次 set_timeout 是恢复原来的超时
+    probe_timeouts = debugger.timeouts[:-1]
+    assert probe_timeouts[0] == 0.5
+    assert probe_timeouts[-1] < 0.01
+
+
+def test_scan_stops_on_event():
+    stop = threading.Event()
+
+    def callback(slave_id, result):
+        if slave_id == 3:
+            stop.set()
+
+    debugger = ScanDebugger({slave_id: 'ok' for slave_id in range(1, 10)})
+    results = SlaveScanner(debugger, concurrency=1).scan(range(1, 10), callback=callback, stop_event=stop)
+    assert [r.slave_id for r in results] == [1, 2, 3]
+
+
+def test_rtu_timeouts_come_from_line_settings():
+    params = {'baud_rate': 9600, 'data_bits': 8, 'parity': 'None', 'stop_bits': 1}
+    scanner = SlaveScanner(ScanDebugger({}, 'rtu', params))
+    timing = SerialTiming.from_params(params)
+    assert scanner.silent_interval == timing.silent_interval
+    assert scanner.timeout.initial == pytest.approx(
+        timing.response_timeout(READ_REQUEST_LENGTH, READ_ONE_RESPONSE_LENGTH))
+    assert scanner.timeout.minimum == pytest.approx(
+        timing.frame_time(READ_REQUEST_LENGTH + READ_ONE_RESPONSE_LENGTH) + timing.silent_interval)
+
+
+def test_scan_requires_connection_and_known_probe():
+    debugger = ScanDebugger({})
+    with pytest.raises(ValueError):
+        SlaveScanner(debugger, probe='ping')
+    debugger.client = None
+    with pytest.raises(ValueError):
+        SlaveScanner(debugger).scan()
@@ -0,0 +1,146 @@
+#大牛大巨婴
+import json
+import random
+import pytest
+from codec import STRUCT_CODES, get_codec
+from read_planner import ReadPlanner, Tag
+from tag_database import CompiledBlock, TagDatabase, load_tags
+
+ORDERS = [('big', 'big'), ('little', 'little'), ('little', 'big'), ('big', 'little')]
+REGISTER_TYPES = ['INT16', 'UINT16', 'INT32', 'UINT32', 'INT64', 'UINT64', 'FLOAT32', 'FLOAT64',
+                  'BOOL', 'BYTE', 'ASCII', 'UNIX_TIMESTAMP']
+
+
+def expected_value(tag, registers):
+    """ 逐个点位用 codec 解码，作为编译后整块解码的参照 """
+    value = get_codec(tag.data_type, tag.byte_order, tag.word_order).decode(registers)
+    if tag.data_type in ('ASCII', 'UNIX_TIMESTAMP') or (tag.data_type in STRUCT_CODES and len(value) == 1):
+        value = value[0]
+    if tag.scale != 1:
+        value = value * tag.scale if not isinstance(value, list) else [v * tag.scale for v in value]
+    return value
+
+
+def decode_block(tags, registers):
+    blocks = ReadPlanner(gap_fill=125).plan(tags)
+    assert len(blocks) == 1
+    block = blocks[0]
+    decoded = CompiledBlock(block).decode(registers[block.start:block.start + block.count])
+    return dict((tag.name, value) for tag, value in decoded)
+
+
+def assert_same(actual, expected):
+    if isinstance(expected, float) and expected != expected:
+        assert actual != actual
+    else:
+        assert actual == expected
+
+
+def test_csv_import_with_chinese_columns(tmp_path):
+    path = tmp_path / 'tags.csv'
+    path.write_text('﻿名称,地址,寄存器类型,数据类型,字节序,字序,比例,单位,从站地址,死区\n'
+                    '温度,10,hr,float32,BA,4321,0.1,℃,2,0.5\n'
+                    '运行,3,coil,,,,,,,\n', encoding='utf-8')
+    temperature, running = load_tags(str(path))
+    assert (temperature.name, temperature.address, temperature.register_type, temperature.data_type) == \
+        ('温度', 10, 'Holding Register', 'FLOAT32')
+    assert (temperature.byte_order, temperature.word_order, temperature.slave_id) == ('little', 'little', 2)
+    assert (temperature.scale, temperature.unit, temperature.deadband, temperature.count) == (0.1, '℃', 0.5, 2)
+    assert (running.register_type, running.data_type, running.slave_id, running.scale) == ('Coil', 'BOOL', None, 1)
+
+
+def test_json_import_accepts_list_or_tags_key(tmp_path):
+    rows = [{'name': 'a', 'address': 1, 'data_type': 'ascii', 'count': 4}]
+    for data in (rows, {'tags': rows}):
+        path = tmp_path / 'tags.json'
+        path.write_text(json.dumps(data), encoding='utf-8')
+        tag, = load_tags(str(path))
+        assert (tag.name, tag.data_type, tag.count) == ('a', 'ASCII', 4)
+
+
+def test_invalid_rows_report_the_line(tmp_path):
+    path = tmp_path / 'tags.csv'
+    path.write_text('name,address\nok,1\nbad,x\n', encoding='utf-8')
+    with pytest.raises(ValueError, match='第 2 个点位'):
+        load_tags(str(path))
+
+
+@pytest.mark.parametrize('byte_order,word_order', ORDERS)
+def test_compiled_decode_matches_codec_for_every_type(byte_order, word_order):
+    rng = random.Random(f'{byte_order}{word_order}')
+    registers = [rng.randrange(0x10000) for _ in range(200)]
+    tags = []
+    address = 0
+    for data_type in REGISTER_TYPES:
+        count = 3 if data_type == 'ASCII' else None
+        tag = Tag(address, data_type=data_type, byte_order=byte_order, word_order=word_order,
+                  name=data_type, count=count)
+        tags.append(tag)
+        address = tag.end + 1  # 留一个寄存器的空洞
+    # 合理的时间戳，避免超出 datetime 的范围
+    timestamp = next(t for t in tags if t.data_type == 'UNIX_TIMESTAMP')
+    registers[timestamp.address:timestamp.end] = get_codec('UINT32', byte_order, word_order).encode([1_700_000_000])
+    decoded = decode_block(tags, registers)
+    for tag in tags:
+        assert_same(decoded[tag.name], expected_value(tag, registers[tag.address:tag.end]))
+
+
+def test_mixed_orders_overlaps_and_scale():
+    rng = random.Random(7)
+    registers = [rng.randrange(0x10000) for _ in range(64)]
+    tags = [
+        Tag(0, data_type='FLOAT32', name='f_big'),
+        Tag(0, data_type='FLOAT32', byte_order='little', word_order='big', name='f_swapped'),
+        Tag(1, data_type='UINT16', name='overlap'),
+        Tag(0, data_type='UINT32', word_order='little', name='u_little'),
+        Tag(4, data_type='INT16', scale=0.5, name='scaled'),
+        Tag(5, data_type='INT32', count=6, name='array'),
+        Tag(6, data_type='UINT16', scale=2, count=2, name='scaled_array'),
+        Tag(20, data_type='FLOAT64', byte_order='little', word_order='little', name='d'),
+    ]
+    decoded = decode_block(tags, registers)
+    assert len(decoded) == len(tags)
+    for tag in tags:
+        assert_same(decoded[tag.name], expected_value(tag, registers[tag.address:tag.end]))
+
+
+def test_bit_block_slices_per_tag():
+    bits = [i % 3 == 0 for i in range(40)]
+    tags = [Tag(2, 'Coil', name='a'), Tag(3, 'Coil', name='b', count=5), Tag(30, 'Coil', name='c')]
+    block, = ReadPlanner().plan(tags)
+    decoded = dict((tag.name, value) for tag, value in CompiledBlock(block).decode(bits[block.start:]))
+    assert decoded == {'a': [bits[2]], 'b': bits[3:8], 'c': [bits[30]]}
+
+
+def test_poll_uses_one_request_per_block(debugger):
+    debugger.registers[('Holding Register', 0)] = 0x3F80
+    debugger.registers[('Holding Register', 1)] = 0
+    database = TagDatabase([Tag(0, data_type='FLOAT32', name='f'), Tag(2, name='u'), Tag(100, name='far'),
+                            Tag(4, 'Coil', name='coil'), Tag(1, 'Input Register', slave_id=3, name='ir')])
+    values, packets = database.poll(debugger)
+    assert values == {'f': 1.0, 'u': 2, 'far': 100, 'coil': [False], 'ir': 1}
+    assert sorted(debugger.requests) == [(1, 4, 1, None), (3, 0, 3, None), (3, 100, 1, None), (4, 1, 1, 3)]
+    assert len(packets) == 4
+    # 编译一次，后续周期直接复用
+    blocks = database.blocks
+    database.poll(debugger)
+    assert database.blocks is blocks
+
+
+def test_failed_block_yields_none_without_affecting_others(debugger):
+    debugger.fail_starts.add(100)
+    database = TagDatabase([Tag(0, name='a'), Tag(100, name='b'), Tag(101, data_type='INT32', name='c')])
+    values, _ = database.poll(debugger)
+    assert values == {'a': 0, 'b': None, 'c': None}
+
+
+def test_duplicate_names_and_unknown_register_types_are_rejected():
+    database = TagDatabase([Tag(0, name='a')])
+    with pytest.raises(ValueError, match='重复'):
+        database.add(Tag(1, name='a'))
+    with pytest.raises(ValueError):
+        Tag(0, 'Holding Registers')
+    # 添加点位后重新编译
+    database.compile()
+    database.add(Tag(1, name='b'))
+    assert database.blocks is None
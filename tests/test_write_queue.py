@@ -0,0 +1,173 @@
+#大牛大巨婴
+import pytest
+from codec import get_codec
+from write_queue import MAX_WRITE_COILS, MAX_WRITE_REGISTERS, WriteQueue, parse_write_value
+
+
+def spans(blocks):
+    return [(block.function_code, block.slave_id, block.start, block.values) for block in blocks]
+
+
+def test_adjacent_and_overlapping_writes_merge_last_write_wins():
+    queue = WriteQueue()
+    queue.add_registers(10, [1, 2, 3])
+    queue.add_registers(13, [4])
+    queue.add_registers(11, [20, 30])
+    queue.add_registers(10, [100])
+    assert spans(queue.plan()) == [(16, None, 10, [100, 20, 30, 4])]
+    assert len(queue) == 4
+
+
+def test_gaps_are_never_filled():
+    queue = WriteQueue()
+    queue.add_registers(0, [1])
+    queue.add_registers(2, [3])
+    queue.add_coils(0, [True])
+    queue.add_coils(2, [False])
+    assert spans(queue.plan()) == [(15, None, 0, [True]), (15, None, 2, [False]),
+                                   (16, None, 0, [1]), (16, None, 2, [3])]
+
+
+def test_blocks_split_at_pdu_limits():
+    queue = WriteQueue()
+    queue.add_registers(0, range(300))
+    queue.add_coils(0, [True] * 4000)
+    blocks = queue.plan()
+    coils = [(block.start, block.count) for block in blocks if block.function_code == 15]
+    registers = [(block.start, block.count) for block in blocks if block.function_code == 16]
+    assert coils == [(0, MAX_WRITE_COILS), (MAX_WRITE_COILS, MAX_WRITE_COILS), (2 * MAX_WRITE_COILS, 64)]
+    assert registers == [(0, MAX_WRITE_REGISTERS), (MAX_WRITE_REGISTERS, MAX_WRITE_REGISTERS),
+                         (2 * MAX_WRITE_REGISTERS, 54)]
+    assert blocks[-1].values == list(range(2 * MAX_WRITE_REGISTERS, 300))
+
+
+@pytest.mark.parametrize('data_type,width', [('FLOAT32', 2), ('INT64', 4), ('UINT16', 1)])
+def test_multi_register_values_are_never_split(data_type, width):
+    queue = WriteQueue()
+    queue.add_values(100, list(range(250)), data_type)
+    blocks = queue.plan()
+    assert all((block.start - 100) % width == 0 and block.count % width == 0 for block in blocks)
+    assert all(block.count <= MAX_WRITE_REGISTERS for block in blocks)
+    assert sum(block.count for block in blocks) == 250 * width
+    if data_type == 'FLOAT32':
+        # 123 个寄存器的上限下每个请求写 61 个值，不再在 222/223 之间拆开一个浮点数
+        assert [(block.start, block.count) for block in blocks][:2] == [(100, 122), (222, 122)]
+
+
+def test_split_falls_back_to_the_last_value_boundary():
+    queue = WriteQueue(max_registers=5)
+    queue.add_registers(0, [1, 2, 3])
+    queue.add_values(3, [1.5, 2.5], 'FLOAT32')
+    assert [(block.start, block.count) for block in queue.plan()] == [(0, 5), (5, 2)]
+    queue = WriteQueue(max_registers=5)
+    queue.add_registers(0, [1, 2])
+    queue.add_values(2, [1, 2], 'UINT64')
+    # 第一个 UINT64 跨过上限，整个移到下一个请求
+    assert [(block.start, block.count) for block in queue.plan()] == [(0, 2), (2, 4), (6, 4)]
+    queue = WriteQueue(max_registers=3)
+    queue.add_values(0, [7], 'UINT64')
+    # 单个值超过上限时无法保持完整
+    assert [(block.start, block.count) for block in queue.plan()] == [(0, 3), (3, 1)]
+
+
+def test_slaves_are_kept_apart():
+    queue = WriteQueue()
+    queue.add_registers(0, [1], slave_id=2)
+    queue.add_registers(1, [2], slave_id=1)
+    queue.add_registers(0, [3], slave_id=1)
+    assert spans(queue.plan()) == [(16, 1, 0, [3, 2]), (16, 2, 0, [1])]
+
+
+def test_add_values_encodes_with_byte_and_word_order():
+    queue = WriteQueue()
+    queue.add_values(0, [1.5, -2.0], 'FLOAT32', 'little', 'little')
+    block, = queue.plan()
+    assert block.values == get_codec('FLOAT32', 'little', 'little').encode([1.5, -2.0])
+    assert get_codec('FLOAT32', 'little', 'little').decode(block.values) == [1.5, -2.0]
+
+
+def test_invalid_writes_are_rejected():
+    queue = WriteQueue()
+    with pytest.raises(ValueError):
+        queue.add_registers(0, [0x10000])
+    with pytest.raises(ValueError):
+        queue.add_registers(0, [-1])
+    with pytest.raises(ValueError):
+        queue.add_registers(0xFFFF, [1, 2])
+    queue.add_registers(5, [])
+    assert len(queue) == 0
+
+
+def test_flush_writes_everything_and_empties_the_queue(debugger):
+    queue = WriteQueue()
+    queue.add_registers(0, [7, 8])
+    queue.add_coils(3, [True, False])
+    results = queue.flush(debugger)
+    assert [(block.function_code, success) for block, success, _, _ in results] == [(15, True), (16, True)]
+    assert debugger.requests == [(15, 3, 2, None), (16, 0, 2, None)]
+    assert debugger.registers[('Holding Register', 1)] == 8
+    assert len(queue) == 0
+    assert queue.flush(debugger) == []
+
+
+def test_flush_stops_at_first_failure_and_keeps_the_rest(debugger):
+    queue = WriteQueue()
+    queue.add_registers(0, [1])
+    queue.add_registers(10, [2])
+    queue.add_registers(20, [3])
+    debugger.fail_writes.add(10)
+    results = queue.flush(debugger)
+    assert [success for _, success, _, _ in results] == [True, False]
+    assert spans(queue.plan()) == [(16, None, 10, [2]), (16, None, 20, [3])]
+    debugger.fail_writes.clear()
+    queue.flush(debugger)
+    assert len(queue) == 0
+
+
+def test_values_queued_during_flush_are_kept(debugger):
+    queue = WriteQueue()
+    queue.add_registers(0, [1, 2])
+    write_registers = debugger.write_registers
+
+    def write_and_requeue(address, values, slave_id=None):
+        # 发送期间界面又写了同一地址
+        queue.add_registers(1, [99])
+        return write_registers(address, values, slave_id)
+
+    debugger.write_registers = write_and_requeue
+    queue.flush(debugger)
+    assert spans(queue.plan()) == [(16, None, 1, [99])]
+
+
+def test_parse_write_value():
+    assert parse_write_value(' on ', 'Coil', 'BOOL') is True
+    assert parse_write_value('0', 'Coil', 'BOOL') is False
+    assert parse_write_value('0x1F', 'Holding Register', 'UINT16') == 31
+    assert parse_write_value('-5', 'Holding Register', 'INT16') == -5
+    assert parse_write_value('2.5', 'Holding Register', 'FLOAT32') == 2.5
+    with pytest.raises(ValueError):
+        parse_write_value('maybe', 'Coil', 'BOOL')
+    with pytest.raises(ValueError):
+        parse_write_value('1.5', 'Holding Register', 'UINT16')
+
+
+def test_load_recipe(tmp_path):
+    path = tmp_path / 'recipe.csv'
+    path.write_text('地址,寄存器类型,数据类型,字节序,字序,值,从站地址\n'
+                    '0,hr,float32,big,4321,1.5,\n'
+                    '2,hr,uint16,,,0x10,\n'
+                    '3,hr,ascii,,,Hi,\n'
+                    '10,coil,,,,true,2\n'
+                    '20,hr,unix_timestamp,,,1700000000,\n', encoding='utf-8')
+    queue = WriteQueue()
+    assert queue.load_recipe(str(path)) == 5
+    registers = get_codec('FLOAT32', 'big', 'little').encode([1.5]) + [0x10, 0x4869]
+    assert spans(queue.plan()) == [(16, None, 0, registers), (16, None, 20, [1700000000 >> 16, 1700000000 & 0xFFFF]),
+                                   (15, 2, 10, [True])]
+
+
+def test_recipe_rejects_read_only_types(tmp_path):
+    path = tmp_path / 'recipe.csv'
+    path.write_text('address,register_type,value\n0,ir,1\n', encoding='utf-8')
+    with pytest.raises(ValueError, match='第 1 行'):
+        WriteQueue().load_recipe(str(path))